@@ -2,10 +2,11 @@
 import os
 import logging
 from typing import Optional
-import boto3
 from boto3.dynamodb.conditions import Key
 from fastapi import APIRouter, HTTPException, Query
 
+from app.db import clients
+
 log = logging.getLogger("appt-availability")
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
@@ -14,11 +15,7 @@ DDB_TABLE_SLOTS = os.getenv("DDB_TABLE_SLOTS", "medmitra_appointment_slots")
 DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 def _slots_table():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    ddb = boto3.resource("dynamodb", **kw)
-    return ddb.Table(DDB_TABLE_SLOTS)
+    return clients.table(DDB_TABLE_SLOTS)
 
 @router.get("/availability")
 def availability(
@@ -4,15 +4,16 @@ import uuid
 import logging
 from typing import Optional, Dict, Any
 
-import boto3
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key  # NEW
 
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel, Field, constr
 
+from app.db import aio, clients
 from app.util.datetime import now_utc_iso, now_epoch_ms
 from app.notifications.whatsapp import send_consecutive_appointment_warning  # NEW
+from app.notifications.reminders import reminder_keys
 
 log = logging.getLogger("appt-book")
 router = APIRouter(prefix="/appointments", tags=["appointments"])
@@ -27,16 +28,13 @@ DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+    return clients.dynamodb()
 
 
 ddb = _ddb()
-tbl_appts = ddb.Table(DDB_TABLE_APPTS)
-tbl_slots = ddb.Table(DDB_TABLE_SLOTS)
-s3 = boto3.client("s3", region_name=AWS_REGION) if S3_BUCKET else None
+tbl_appts = aio.table(DDB_TABLE_APPTS)
+tbl_slots = aio.table(DDB_TABLE_SLOTS)
+s3 = aio.s3() if S3_BUCKET else None
 
 
 # -------- Schemas (doctor flow parity with patient portal) --------
@@ -68,7 +66,7 @@ def _slot_key(date_iso: str, time_slot: str) -> str:
     return f"{date_iso}#{time_slot}"
 
 
-def _lock_slot(resource_key: str, slot_key: str, patient_id: str, appointment_id: str):
+async def _lock_slot(resource_key: str, slot_key: str, patient_id: str, appointment_id: str):
     item = {
         "resourceKey": resource_key,
         "slotKey": slot_key,
@@ -76,7 +74,7 @@ def _lock_slot(resource_key: str, slot_key: str, patient_id: str, appointment_id
         "appointmentId": appointment_id,
         "createdAt": now_utc_iso(),
     }
-    tbl_slots.put_item(Item=item, ConditionExpression="attribute_not_exists(slotKey)")
+    await tbl_slots.put_item(Item=item, ConditionExpression="attribute_not_exists(slotKey)")
 
 
 # ---------- NEW: helpers for consecutive warning ----------
@@ -95,7 +93,7 @@ def _get_details_map(it: Dict[str, Any]) -> Dict[str, Any]:
     return {}
 
 
-def _find_existing_same_day_appointment(
+async def _find_existing_same_day_appointment(
     table,
     patient_id: str,
     date_iso: str,
@@ -106,7 +104,7 @@ def _find_existing_same_day_appointment(
     on the same date. Used to trigger the consecutive-booking warning.
     """
     try:
-        resp = table.query(
+        resp = await table.query(
             KeyConditionExpression=Key("patientId").eq(patient_id),
             ScanIndexForward=False,
             Limit=50,
@@ -161,7 +159,7 @@ def _find_existing_same_day_appointment(
 # ---------- Main route ----------
 
 @router.post("/book")
-def book_appointment(payload: BookRequest = Body(...)):
+async def book_appointment(payload: BookRequest = Body(...)):
     appt = payload.appointment_details
     if "T" in appt.dateISO:
         raise HTTPException(status_code=422, detail="dateISO must be 'YYYY-MM-DD'")
@@ -186,7 +184,7 @@ def book_appointment(payload: BookRequest = Body(...)):
         # We only create a PENDING_PAYMENT appointment, and treat the slot
         # as still available until payment / pay-later choice is made.
         if not is_kiosk_walkin:
-            _lock_slot(resource_key, slot_key, payload.patientId, appointment_id)
+            await _lock_slot(resource_key, slot_key, payload.patientId, appointment_id)
     except ClientError as e:
         if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
             raise HTTPException(status_code=409, detail="Selected time slot is no longer available")
@@ -212,10 +210,12 @@ def book_appointment(payload: BookRequest = Body(...)):
         # quick query keys
         "doctorId": appt.doctorId,
         "dateKey": slot_key,
+        # 2h reminder (ReminderIndex)
+        **reminder_keys(appt.dateISO, appt.timeSlot),
     }
 
     try:
-        tbl_appts.put_item(
+        await tbl_appts.put_item(
             Item=item,
             ConditionExpression="attribute_not_exists(patientId) AND attribute_not_exists(appointmentId)"
         )
@@ -223,7 +223,7 @@ def book_appointment(payload: BookRequest = Body(...)):
         # rollback slot on failure (for non-kiosk only – kiosk may not have locked)
         try:
             if not is_kiosk_walkin:
-                tbl_slots.delete_item(Key={"resourceKey": resource_key, "slotKey": slot_key})
+                await tbl_slots.delete_item(Key={"resourceKey": resource_key, "slotKey": slot_key})
         except Exception:
             pass
         log.exception("Dynamo put_item failed")
@@ -236,7 +236,7 @@ def book_appointment(payload: BookRequest = Body(...)):
     if s3 and S3_BUCKET:
         try:
             key = f"{S3_PREFIX_APPTS}/{payload.patientId}/{appointment_id}.json"
-            s3.put_object(
+            await s3.put_object(
                 Bucket=S3_BUCKET,
                 Key=key,
                 Body=json.dumps(item, ensure_ascii=False).encode("utf-8"),
@@ -249,7 +249,7 @@ def book_appointment(payload: BookRequest = Body(...)):
     # 4) NEW: send ONLY consecutive-appointment warning here (kiosk walk-in)
     try:
         if is_kiosk_walkin:
-            existing = _find_existing_same_day_appointment(
+            existing = await _find_existing_same_day_appointment(
                 tbl_appts,
                 payload.patientId,
                 appt.dateISO,
@@ -261,7 +261,8 @@ def book_appointment(payload: BookRequest = Body(...)):
                 phone = (contact.get("phone") or "").strip()
                 patient_name = contact.get("name") or ""
 
-                send_consecutive_appointment_warning(
+                await aio.run_blocking(
+                    send_consecutive_appointment_warning,
                     phone_e164=phone,
                     patient_name=patient_name,
                     date_iso=existing.get("dateISO") or appt.dateISO,
@@ -269,6 +270,7 @@ def book_appointment(payload: BookRequest = Body(...)):
                     new_time=appt.timeSlot,
                     doctor_name=existing.get("doctorName") or appt.doctorName,
                     clinic_name=existing.get("clinicName") or appt.clinicName,
+                    message_id=f"consecutive#{appointment_id}",
                 )
     except Exception:
         log.warning("Failed to send consecutive warning", exc_info=True)
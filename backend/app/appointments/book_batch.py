@@ -2,10 +2,10 @@ import os
 import json
 import uuid
 import logging
+from app.db import clients
 from app.util.datetime import now_utc_iso, now_epoch_ms
 from typing import Optional, Dict, Any, List
 
-import boto3
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel, Field, constr, validator
@@ -23,15 +23,12 @@ DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.client("dynamodb", **kw), boto3.resource("dynamodb", **kw)
+    return clients.dynamodb_client(), clients.dynamodb()
 
 
 dcl, dbr = _ddb()
 tbl_appts = dbr.Table(DDB_TABLE_APPTS)
-s3 = boto3.client("s3", region_name=AWS_REGION) if S3_BUCKET else None
+s3 = clients.s3() if S3_BUCKET else None
 
 TZ = os.getenv("CLINIC_TIME_ZONE", "Asia/Kolkata")
 
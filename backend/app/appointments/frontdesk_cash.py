@@ -5,12 +5,12 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 from zoneinfo import ZoneInfo
 
-import boto3
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel, Field, constr
 from boto3.dynamodb.conditions import Attr
 from botocore.exceptions import ClientError
 
+from app.db import clients
 from app.db.dynamo import appointments_table
 from app.util.datetime import now_utc_iso
 from app.appointments.router import _patient_display_name_from_id  # NEW import
@@ -25,11 +25,7 @@ CLINIC_TZ = os.getenv("CLINIC_TIME_ZONE", "Asia/Kolkata")
 
 
 def _slots_table():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    ddb = boto3.resource("dynamodb", **kw)
-    return ddb.Table(DDB_TABLE_SLOTS)
+    return clients.table(DDB_TABLE_SLOTS)
 
 
 tbl_slots = _slots_table()
@@ -303,7 +299,7 @@ def cancel_cash(req: CashSettleReq = Body(...)):
 
         update_resp = tbl.update_item(
             Key={"patientId": req.patientId, "appointmentId": req.appointmentId},
-            UpdateExpression="SET #s = :s, #p = :p, #k = :k, #u = :u",
+            UpdateExpression="SET #s = :s, #p = :p, #k = :k, #u = :u REMOVE reminderDay, reminderAt",
             ExpressionAttributeNames={
                 "#s": "status",
                 "#p": "payment",
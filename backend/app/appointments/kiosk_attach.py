@@ -3,18 +3,15 @@ import logging
 import json
 from typing import Optional, Any, Dict
 
-import boto3
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel, Field, validator
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key  # NEW
 
 from app.util.datetime import now_utc_iso, now_epoch_ms
-from app.db.dynamo import appointments_table
-from app.notifications.whatsapp import (
-    send_doctor_booking_confirmation,
-    send_consecutive_appointment_warning,
-)
+from app.db import aio
+from app.db.dynamo import DDB_TABLE_APPOINTMENTS
+from app.notifications.whatsapp import send_doctor_booking_confirmation
 
 log = logging.getLogger("appt-kiosk-attach")
 router = APIRouter(prefix="/kiosk/appointments", tags=["kiosk-appointments"])
@@ -25,11 +22,7 @@ DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 
 def _slots_table():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    ddb = boto3.resource("dynamodb", **kw)
-    return ddb.Table(DDB_TABLE_SLOTS)
+    return aio.table(DDB_TABLE_SLOTS)
 
 
 tbl_slots = _slots_table()
@@ -70,7 +63,7 @@ def _get_details_map(it: Dict[str, Any]) -> Dict[str, Any]:
     return {}
 
 
-def _find_existing_same_day_appointment(
+async def _find_existing_same_day_appointment(
     tbl,
     patient_id: str,
     date_iso: str,
@@ -81,7 +74,7 @@ def _find_existing_same_day_appointment(
     on the same date. Used to trigger the consecutive-booking warning.
     """
     try:
-        resp = tbl.query(
+        resp = await tbl.query(
             KeyConditionExpression=Key("patientId").eq(patient_id),
             ScanIndexForward=False,
             Limit=50,
@@ -131,7 +124,7 @@ def _find_existing_same_day_appointment(
     return None
 
 
-def _ensure_slot_locked(
+async def _ensure_slot_locked(
     doctor_id: Any,
     date_iso: str,
     time_slot: str,
@@ -150,9 +143,9 @@ def _ensure_slot_locked(
 
     try:
         # If already locked, nothing to do
-        existing = tbl_slots.get_item(
+        existing = (await tbl_slots.get_item(
             Key={"resourceKey": resource_key, "slotKey": slot_key}
-        ).get("Item")
+        )).get("Item")
         if existing:
             return
 
@@ -163,7 +156,7 @@ def _ensure_slot_locked(
             "appointmentId": appointment_id,
             "createdAt": now_utc_iso(),
         }
-        tbl_slots.put_item(
+        await tbl_slots.put_item(
             Item=item,
             ConditionExpression="attribute_not_exists(slotKey)",
         )
@@ -201,7 +194,7 @@ def _ensure_slot_locked(
 
 
 @router.post("/attach")
-def attach_kiosk_data(payload: KioskPayload = Body(...)):
+async def attach_kiosk_data(payload: KioskPayload = Body(...)):
     """
     Merge/attach kiosk details into the appointment row as a single map field 'kiosk'.
     - Requires existing item (patientId + appointmentId).
@@ -214,7 +207,7 @@ def attach_kiosk_data(payload: KioskPayload = Body(...)):
         * lock the slot in the slots table (so availability hides it)
         * send WhatsApp appointment confirmation.
     """
-    tbl = appointments_table()
+    tbl = aio.table(DDB_TABLE_APPOINTMENTS)
     pid = payload.patientId.strip()
     aid = payload.appointmentId.strip()
 
@@ -226,7 +219,7 @@ def attach_kiosk_data(payload: KioskPayload = Body(...)):
 
     try:
         # Fetch existing item
-        resp = tbl.get_item(Key={"patientId": pid, "appointmentId": aid})
+        resp = await tbl.get_item(Key={"patientId": pid, "appointmentId": aid})
         item = resp.get("Item")
         if not item:
             raise HTTPException(status_code=404, detail="Appointment not found")
@@ -283,7 +276,7 @@ def attach_kiosk_data(payload: KioskPayload = Body(...)):
         patient_name = contact.get("name") or ""
 
         if finalize and is_kiosk_doctor and date_iso:
-            same_day_existing = _find_existing_same_day_appointment(
+            same_day_existing = await _find_existing_same_day_appointment(
                 tbl=tbl,
                 patient_id=pid,
                 date_iso=date_iso,
@@ -318,7 +311,7 @@ def attach_kiosk_data(payload: KioskPayload = Body(...)):
         # --- ensure slot lock on finalization for kiosk doctor appointments ---
         if finalize and is_kiosk_doctor and date_iso and time_slot and doctor_id:
             try:
-                _ensure_slot_locked(
+                await _ensure_slot_locked(
                     doctor_id=doctor_id,
                     date_iso=str(date_iso),
                     time_slot=str(time_slot),
@@ -350,7 +343,7 @@ def attach_kiosk_data(payload: KioskPayload = Body(...)):
             expr_values[":s"] = new_status
             update_expr += ", #s = :s"
 
-        update_resp = tbl.update_item(
+        update_resp = await tbl.update_item(
             Key={"patientId": pid, "appointmentId": aid},
             UpdateExpression=update_expr,
             ExpressionAttributeNames=expr_names,
@@ -373,12 +366,14 @@ def attach_kiosk_data(payload: KioskPayload = Body(...)):
                 except Exception:
                     when_local = dt_mod.now(tz)
 
-                send_doctor_booking_confirmation(
+                await aio.run_blocking(
+                    send_doctor_booking_confirmation,
                     phone_e164=phone,
                     patient_name=patient_name,
                     when_local=when_local,
                     doctor_name=doctor_name,
                     clinic_name=clinic_name,
+                    message_id=f"booking#{aid}",
                 )
 
                 # (Consecutive warning here is commented out in your current code)
@@ -4,11 +4,14 @@ import logging
 import json
 from typing import List, Optional, Dict, Any, Tuple
 
-import boto3
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Query
 
+from app import fakes
+from app.auth import identity_cache, phone_index
+from app.db import clients
+
 log = logging.getLogger("appt-list")
 router = APIRouter(prefix="/appointments", tags=["appointments"])
 
@@ -23,27 +26,18 @@ DDB_TABLE_PATIENTS = os.getenv("DDB_TABLE_PATIENTS", "medmitra_patients")
 DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 # Cognito (to resolve phone -> user sub/patientId and names)
-COGNITO_USER_POOL_ID = (os.getenv("COGNITO_USER_POOL_ID") or "").strip()
+COGNITO_USER_POOL_ID = fakes.secret("COGNITO_USER_POOL_ID", "local_fake_pool")
 if not COGNITO_USER_POOL_ID:
     raise RuntimeError("Missing COGNITO_USER_POOL_ID")
-cognito = boto3.client("cognito-idp", region_name=AWS_REGION)
-
-
-def _ddb_resource():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+cognito = clients.cognito()
 
 
 def _ddb_table():
-    ddb = _ddb_resource()
-    return ddb.Table(DDB_TABLE_APPOINTMENTS)
+    return clients.table(DDB_TABLE_APPOINTMENTS)
 
 
 def _patients_table():
-    ddb = _ddb_resource()
-    return ddb.Table(DDB_TABLE_PATIENTS)
+    return clients.table(DDB_TABLE_PATIENTS)
 
 
 # def _coerce_str(v: Optional[str]) -> str:
@@ -91,11 +85,7 @@ def _best_name_from_attrs(attrs: Dict[str, Any]) -> str:
     return ""
 
 
-def _cognito_identity_from_phone(e164: str) -> Tuple[Optional[str], Optional[str]]:
-    """
-    Return (patientId, patientName) for a phone number using Cognito.
-    patientId is the 'sub' (or Username fallback); patientName is best-effort.
-    """
+def _cognito_user_by_phone(e164: str) -> Optional[Dict[str, Any]]:
     try:
         # exact match first
         resp = cognito.list_users(
@@ -116,22 +106,37 @@ def _cognito_identity_from_phone(e164: str) -> Tuple[Optional[str], Optional[str
                 users = resp2.get("Users", []) or []
             except ClientError:
                 users = []
-        if not users:
-            return None, None
-        user = users[0]
-        attrs = {a["Name"]: a["Value"] for a in user.get("Attributes", [])}
-        sub = attrs.get("sub") or user.get("Username")
-        return sub, _best_name_from_attrs(attrs)
     except ClientError as e:
         msg = e.response["Error"].get("Message", str(e))
         log.exception("Cognito list_users failed: %s", msg)
         raise HTTPException(status_code=500, detail=f"Cognito error: {msg}")
+    return users[0] if users else None
+
+
+def _cognito_identity_from_phone(e164: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Return (patientId, patientName) for a phone number: patients table phone
+    index first, Cognito on a miss.
+    patientId is the 'sub' (or Username fallback); patientName is best-effort.
+    """
+    user = phone_index.resolve_user_sync(e164, _cognito_user_by_phone)
+    if not user:
+        return None, None
+    attrs = {a["Name"]: a["Value"] for a in user.get("Attributes", [])}
+    sub = attrs.get("sub") or user.get("Username")
+    name = _best_name_from_attrs(attrs)
+    if sub:
+        identity_cache.names_by_sub.put(sub, name or None)
+    return sub, name
 
 
 def _cognito_name_from_sub(sub: str) -> Optional[str]:
     """
     Best-effort: resolve a patient's name from Cognito using sub.
     """
+    name = identity_cache.names_by_sub.get(sub)
+    if name is not identity_cache.MISS:
+        return name
     try:
         resp = cognito.list_users(
             UserPoolId=COGNITO_USER_POOL_ID,
@@ -140,9 +145,12 @@ def _cognito_name_from_sub(sub: str) -> Optional[str]:
         )
         users = resp.get("Users", []) or []
         if not users:
+            identity_cache.names_by_sub.put(sub, None)
             return None
         attrs = {a["Name"]: a["Value"] for a in users[0].get("Attributes", [])}
-        return _best_name_from_attrs(attrs) or None
+        name = _best_name_from_attrs(attrs) or None
+        identity_cache.names_by_sub.put(sub, name)
+        return name
     except ClientError as e:
         msg = e.response["Error"].get("Message", str(e))
         log.warning("Cognito list_users by sub failed: %s", msg)
@@ -1,19 +1,21 @@
 import os
 import logging
-import boto3
 from botocore.exceptions import ClientError
 
+from app import fakes
+from app.db import clients
+
 log = logging.getLogger("cognito")
 
 AWS_REGION     = os.getenv("AWS_REGION", "us-west-2")
-USER_POOL_ID   = os.getenv("COGNITO_USER_POOL_ID")
-CLIENT_ID      = os.getenv("COGNITO_CLIENT_ID")
+USER_POOL_ID   = fakes.secret("COGNITO_USER_POOL_ID", "local_fake_pool")
+CLIENT_ID      = fakes.secret("COGNITO_CLIENT_ID", "local-fake-client")
 REQUIRED_GROUP = os.getenv("REQUIRED_GROUP", "Patients")
 
 if not USER_POOL_ID or not CLIENT_ID:
     raise RuntimeError("COGNITO_USER_POOL_ID / COGNITO_CLIENT_ID are required")
 
-cognito = boto3.client("cognito-idp", region_name=AWS_REGION)
+cognito = clients.cognito()
 
 def list_user_by_phone(e164: str):
     try:
@@ -0,0 +1,104 @@
+# backend/app/auth/identity_cache.py
+"""
+Per-process TTL + LRU cache for Cognito identity lookups.
+
+cognito-idp ListUsers is limited to a few calls per second per pool and
+costs ~100-300 ms, yet identify and the appointment list resolve the same
+phones and subs over and over. Two caches are shared by every caller:
+
+    users_by_phone   e164 -> Cognito user dict (first ListUsers match), or None
+    names_by_sub     sub  -> display name, or None
+
+- hits live COGNITO_CACHE_TTL_SEC; "no such user" answers are cached too,
+  for the shorter COGNITO_CACHE_NEG_TTL_SEC, so repeated unknown-phone
+  attempts at the kiosk don't each cost a ListUsers;
+- at most COGNITO_CACHE_SIZE entries per cache, least recently used evicted;
+- errors are never cached;
+- walkin_register calls invalidate() after creating or updating a user, so
+  the new patient is found on the next identify from this worker (other
+  workers see it once their negative entry expires).
+
+    user = identity_cache.users_by_phone.get(e164)
+    if user is identity_cache.MISS:
+        user = ...list_users...
+        identity_cache.users_by_phone.put(e164, user)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from app import metrics
+
+COGNITO_CACHE_TTL_SEC = float(os.getenv("COGNITO_CACHE_TTL_SEC", "300"))
+COGNITO_CACHE_NEG_TTL_SEC = float(os.getenv("COGNITO_CACHE_NEG_TTL_SEC", "30"))
+COGNITO_CACHE_SIZE = int(os.getenv("COGNITO_CACHE_SIZE", "10000"))
+
+MISS = object()
+
+CACHE_LOOKUPS = metrics.register(metrics.Counter(
+    "clinic_identity_cache_total", "Cognito identity cache lookups.", ("cache", "outcome"),
+))
+
+
+class TTLCache:
+    """Thread-safe LRU map whose entries expire; None values use the negative TTL."""
+
+    def __init__(self, name: str, maxsize: int = COGNITO_CACHE_SIZE,
+                 ttl: float = COGNITO_CACHE_TTL_SEC, negative_ttl: float = COGNITO_CACHE_NEG_TTL_SEC):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Any:
+        """Cached value (possibly None = known absent), or MISS."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                outcome = "hit" if entry[1] is not None else "negative_hit"
+                value = entry[1]
+            else:
+                if entry is not None:
+                    del self._data[key]
+                outcome, value = "miss", MISS
+        CACHE_LOOKUPS.inc(self.name, outcome)
+        return value
+
+    def put(self, key: str, value: Any):
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+users_by_phone = TTLCache("users_by_phone")
+names_by_sub = TTLCache("names_by_sub")
+
+
+def invalidate(phone: Optional[str] = None, sub: Optional[str] = None):
+    """Forget what we know about a phone and/or sub (after a Cognito write)."""
+    if phone:
+        users_by_phone.discard(phone)
+    if sub:
+        names_by_sub.discard(sub)
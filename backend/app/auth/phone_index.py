@@ -0,0 +1,143 @@
+# backend/app/auth/phone_index.py
+"""
+Phone -> patient lookups on the patients table (DDB_TABLE_PATIENTS) instead
+of Cognito ListUsers.
+
+Patient items carry the normalized phone and its Cognito verification flag:
+
+    phoneE164     = "+919876543210"   (HASH of the PATIENTS_PHONE_INDEX GSI)
+    phoneVerified = Cognito phone_number_verified
+
+written by walkin_register (_upsert_patient) and, for users created in the
+patient portal, by scripts/backfill_patient_phones.py. A hit is one GSI
+Query (~5 ms, no ListUsers quota) and is returned in Cognito's user shape, so
+callers and app/auth/identity_cache.py treat both sources alike; a miss
+(or an unverified hit where verification is required) falls back to Cognito.
+resolve_user / resolve_user_sync do that fallback and fill
+identity_cache.users_by_phone, so identify and the appointment list cache the
+same answer for a phone.
+
+Family members often share one phone. When the index holds more than one
+patient for a number it can't tell which one is at the kiosk, so the lookup
+reports a miss and Cognito (the portal account registered to that phone)
+decides, as it did before the index existed.
+"""
+import logging
+import os
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from app.auth import identity_cache
+from app.db import aio, clients
+
+log = logging.getLogger("phone-index")
+
+DDB_TABLE_PATIENTS = os.getenv("DDB_TABLE_PATIENTS", "medmitra_patients")
+PATIENTS_PHONE_INDEX = os.getenv("PATIENTS_PHONE_INDEX", "PhoneIndex")
+KIOSK_REQUIRE_VERIFIED = (  # identify only accepts verified phones; unverified index hits ask Cognito
+    os.getenv("KIOSK_REQUIRE_VERIFIED", "false").strip().lower() == "true"
+)
+
+
+def phone_key(e164: str) -> str:
+    """"+<digits>", the form stored in phoneE164 ("" when there are no digits)."""
+    digits = re.sub(r"\D", "", e164 or "")
+    return f"+{digits}" if digits else ""
+
+
+def index_attrs(e164: str, verified: bool) -> Dict[str, Any]:
+    """Attributes that put a patient item in the phone index."""
+    key = phone_key(e164)
+    return {"phoneE164": key, "phoneVerified": bool(verified)} if key else {}
+
+
+def _as_user(item: Dict[str, Any]) -> Dict[str, Any]:
+    attrs = {
+        "sub": item["patientId"],
+        "phone_number": item.get("phoneE164") or "",
+        "phone_number_verified": "true" if item.get("phoneVerified") else "false",
+        "given_name": item.get("firstName") or "",
+        "family_name": item.get("lastName") or "",
+        "name": item.get("fullName") or "",
+    }
+    return {
+        "Username": item["patientId"],
+        "Attributes": [{"Name": k, "Value": v} for k, v in attrs.items() if v],
+        "Source": "patients",
+    }
+
+
+def _query_kwargs(e164: str) -> Dict[str, Any]:
+    return {
+        "IndexName": PATIENTS_PHONE_INDEX,
+        "KeyConditionExpression": Key("phoneE164").eq(phone_key(e164)),
+        "Limit": 2,  # enough to tell a unique phone from a shared one
+    }
+
+
+def _only(e164: str, items: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    if len(items) > 1:
+        log.info("%s is shared by several patients; deferring to Cognito", phone_key(e164))
+        return None
+    return _as_user(items[0]) if items else None
+
+
+def find_user_sync(e164: str) -> Optional[Dict[str, Any]]:
+    """Cognito-shaped user for the phone from the patients index, or None (miss / shared phone / index unavailable)."""
+    if not phone_key(e164):
+        return None
+    try:
+        items = clients.table(DDB_TABLE_PATIENTS).query(**_query_kwargs(e164)).get("Items", [])
+    except ClientError as e:
+        log.warning("patients phone index query failed: %s", e)
+        return None  # e.g. index not created yet: callers fall back to Cognito
+    return _only(e164, items)
+
+
+async def find_user(e164: str) -> Optional[Dict[str, Any]]:
+    """Async find_user_sync."""
+    if not phone_key(e164):
+        return None
+    try:
+        resp = await aio.table(DDB_TABLE_PATIENTS).query(**_query_kwargs(e164))
+    except ClientError as e:
+        log.warning("patients phone index query failed: %s", e)
+        return None
+    return _only(e164, resp.get("Items", []))
+
+
+# -----------------------------------------------------------------------------#
+# Index first, Cognito fallback (cached)                                       #
+# -----------------------------------------------------------------------------#
+def phone_verified(user: Dict[str, Any]) -> bool:
+    attrs = {a["Name"]: a["Value"] for a in user.get("Attributes", [])}
+    return str(attrs.get("phone_number_verified", "")).lower() == "true"
+
+
+def _usable(user: Optional[Dict[str, Any]]) -> bool:
+    return user is not None and (not KIOSK_REQUIRE_VERIFIED or phone_verified(user))
+
+
+def resolve_user_sync(e164: str, cognito_lookup: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """User for the phone: the index when it has a usable hit, else cognito_lookup; cached in users_by_phone."""
+    user = identity_cache.users_by_phone.get(e164)
+    if user is identity_cache.MISS:
+        user = find_user_sync(e164)
+        if not _usable(user):
+            user = cognito_lookup(e164)
+        identity_cache.users_by_phone.put(e164, user)
+    return user
+
+
+async def resolve_user(e164: str, cognito_lookup: Callable[[str], Awaitable[Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+    """Async resolve_user_sync."""
+    user = identity_cache.users_by_phone.get(e164)
+    if user is identity_cache.MISS:
+        user = await find_user(e164)
+        if not _usable(user):
+            user = await cognito_lookup(e164)
+        identity_cache.users_by_phone.put(e164, user)
+    return user
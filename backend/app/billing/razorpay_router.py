@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException, Header, Request
 from pydantic import BaseModel, Field, validator
 import razorpay
 
+from app import fakes, metrics
 from app.db.dynamo import appointments_table
 from app.db.payments import get_by_invoice, put_intent, update_by_invoice
 
@@ -16,16 +17,17 @@ def _now_iso():
     return now_utc_iso()
 
 # --- ENV / Config ---
-RAZORPAY_KEY_ID         = os.getenv("RAZORPAY_KEY_ID", "").strip()
-RAZORPAY_KEY_SECRET     = os.getenv("RAZORPAY_KEY_SECRET", "").strip()
-RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET", "").strip()
+RAZORPAY_KEY_ID         = fakes.secret("RAZORPAY_KEY_ID", "rzp_test_fake")
+RAZORPAY_KEY_SECRET     = fakes.secret("RAZORPAY_KEY_SECRET", "local-fake-razorpay-secret")
+RAZORPAY_WEBHOOK_SECRET = fakes.secret("RAZORPAY_WEBHOOK_SECRET", "local-fake-webhook-secret")
 RAZORPAY_AUTO_CAPTURE   = (os.getenv("RAZORPAY_AUTO_CAPTURE", "true").lower() != "false")
 RAZORPAY_CURRENCY       = os.getenv("RAZORPAY_CURRENCY", "INR").upper()
 
 if not (RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET):
     raise RuntimeError("Set RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET")
 
-client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
+_RazorpayClient = fakes.RazorpayClient if fakes.enabled() else razorpay.Client
+client = _RazorpayClient(session=metrics.razorpay_session(), auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
 
 # --- Models ---
 class CustomerPrefill(BaseModel):
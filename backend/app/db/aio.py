@@ -0,0 +1,115 @@
+# backend/app/db/aio.py
+"""
+Async access layer over the shared clients in app.db.clients.
+
+boto3 itself is blocking, so calls are pushed onto worker threads under a
+dedicated CapacityLimiter (AWS_ASYNC_CONCURRENCY) instead of anyio's default
+40-token limiter that sync `def` routes share. Async routes therefore only
+hold a thread for the duration of the AWS call itself, and the number of
+in-flight kiosk requests is no longer capped by the route threadpool.
+
+Sync routes keep using app.db.clients directly; every async wrapper also
+exposes the underlying object as `.sync`.
+"""
+import functools
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+import anyio
+import anyio.to_thread
+
+from app.db import clients
+
+T = TypeVar("T")
+
+_limiter: Optional[anyio.CapacityLimiter] = None
+
+
+def _get_limiter() -> anyio.CapacityLimiter:
+    global _limiter
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(clients.AWS_ASYNC_CONCURRENCY)
+    return _limiter
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking call (boto3, Twilio, ...) without tying up the route threadpool."""
+    return await anyio.to_thread.run_sync(
+        functools.partial(fn, *args, **kwargs), limiter=_get_limiter()
+    )
+
+
+class AsyncTable:
+    """Awaitable facade over a boto3 DynamoDB Table."""
+
+    def __init__(self, tbl):
+        self.sync = tbl
+        self.name = tbl.name
+
+    async def get_item(self, **kw) -> Dict[str, Any]:
+        return await run_blocking(self.sync.get_item, **kw)
+
+    async def put_item(self, **kw) -> Dict[str, Any]:
+        return await run_blocking(self.sync.put_item, **kw)
+
+    async def update_item(self, **kw) -> Dict[str, Any]:
+        return await run_blocking(self.sync.update_item, **kw)
+
+    async def delete_item(self, **kw) -> Dict[str, Any]:
+        return await run_blocking(self.sync.delete_item, **kw)
+
+    async def query(self, **kw) -> Dict[str, Any]:
+        return await run_blocking(self.sync.query, **kw)
+
+    async def scan(self, **kw) -> Dict[str, Any]:
+        return await run_blocking(self.sync.scan, **kw)
+
+
+class AsyncClient:
+    """Awaitable facade over any boto3 client: `await c.list_users(...)`."""
+
+    def __init__(self, client):
+        self.sync = client
+
+    def __getattr__(self, name: str):
+        fn = getattr(self.sync, name)
+        if not callable(fn):
+            return fn
+
+        async def _call(*args, **kwargs):
+            return await run_blocking(fn, *args, **kwargs)
+
+        return _call
+
+
+_tables: Dict[str, AsyncTable] = {}
+_clients: Dict[str, AsyncClient] = {}
+
+
+def table(name: str) -> AsyncTable:
+    tbl = _tables.get(name)
+    if tbl is None:
+        tbl = _tables.setdefault(name, AsyncTable(clients.table(name)))
+    return tbl
+
+
+def _client(key: str, factory: Callable[[], Any]) -> AsyncClient:
+    c = _clients.get(key)
+    if c is None:
+        c = _clients.setdefault(key, AsyncClient(factory()))
+    return c
+
+
+def dynamodb_client() -> AsyncClient:
+    return _client("dynamodb", clients.dynamodb_client)
+
+
+def cognito() -> AsyncClient:
+    return _client("cognito-idp", clients.cognito)
+
+
+def s3(region: Optional[str] = None) -> AsyncClient:
+    return _client(f"s3:{region or ''}", lambda: clients.s3(region))
+
+
+def sns(region: Optional[str] = None) -> AsyncClient:
+    return _client(f"sns:{region or ''}", lambda: clients.sns(region))
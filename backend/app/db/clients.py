@@ -0,0 +1,195 @@
+# backend/app/db/clients.py
+"""
+Process-wide AWS client registry.
+
+Every router used to build its own boto3.resource("dynamodb") (some on every
+request), which costs a session + endpoint resolution and a cold HTTPS pool
+each time. Here we build one botocore session per process and hand out
+cached clients whose connection pools are sized to the FastAPI worker
+threadpool.
+
+boto3 clients are thread-safe and shared process-wide. Resources and Table
+objects are not, so resource() / table() return process-wide handles that
+resolve to a per-thread boto3 object on each call; every thread's resource
+is wired to the one shared client, so they all use its connection pool.
+"""
+import functools
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+
+from app import fakes, metrics
+
+AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
+
+# Max concurrent AWS calls issued from async routes (see app.db.aio).
+AWS_ASYNC_CONCURRENCY = int(os.getenv("AWS_ASYNC_CONCURRENCY", "128"))
+
+# anyio runs sync routes on a 40-thread pool by default and async routes
+# offload up to AWS_ASYNC_CONCURRENCY calls; one pooled connection per
+# concurrent caller avoids "connection pool is full" churn.
+AWS_MAX_POOL_CONNECTIONS = int(
+    os.getenv("AWS_MAX_POOL_CONNECTIONS", str(max(40, AWS_ASYNC_CONCURRENCY)))
+)
+AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "3"))
+AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "10"))
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+
+_lock = threading.Lock()
+_session: Optional[boto3.session.Session] = None
+_cache: Dict[Tuple[str, str, Optional[str], Optional[str]], Any] = {}
+_tables: Dict[str, "_PerThread"] = {}
+_local = threading.local()  # .objs: per-thread boto3 resources / Tables
+_generation = 0  # bumped by reset(), so threads rebuild rather than reuse their old objects
+
+
+def _config() -> Config:
+    return Config(
+        max_pool_connections=AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=AWS_CONNECT_TIMEOUT,
+        read_timeout=AWS_READ_TIMEOUT,
+        retries={"max_attempts": AWS_MAX_ATTEMPTS, "mode": "standard"},
+        tcp_keepalive=True,
+    )
+
+
+def _boto_session() -> boto3.session.Session:
+    # caller holds _lock
+    global _session
+    if _session is None:
+        _session = boto3.session.Session(region_name=AWS_REGION)
+    return _session
+
+
+class _PerThread:
+    """
+    Process-wide handle for a boto3 resource or Table: attribute access and
+    calls go to this thread's own instance, built on first use by `build`.
+    """
+
+    def __init__(self, key: Tuple[Any, ...], build: Callable[[], Any]):
+        self._key = (_generation,) + key
+        self._build = build
+
+    def _obj(self):
+        objs = getattr(_local, "objs", None)
+        if objs is None:
+            objs = _local.objs = {}
+        obj = objs.get(self._key)
+        if obj is None:
+            obj = objs[self._key] = self._build()
+        return obj
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._obj(), name)
+        if not callable(attr):
+            return attr
+
+        # resolved again at call time: bound methods are handed to worker threads (aio.run_blocking)
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return getattr(self._obj(), name)(*args, **kwargs)
+
+        return call
+
+    def Table(self, name: str):
+        """DynamoDB resources only: the shared per-thread Table handle."""
+        return table(name)
+
+
+def _get(service: str, region: Optional[str], endpoint: Optional[str]):
+    key = ("client", service, region or AWS_REGION, endpoint)
+    obj = _cache.get(key)
+    if obj is not None:
+        return obj
+    with _lock:
+        obj = _cache.get(key)
+        if obj is None and fakes.enabled():
+            # CLINIC_BACKEND=memory: in-process stand-ins, no network
+            obj = _cache[key] = fakes.client(service)
+        if obj is None:
+            kw: Dict[str, Any] = {"region_name": region or AWS_REGION, "config": _config()}
+            if endpoint:
+                kw["endpoint_url"] = endpoint
+            obj = metrics.instrument_boto(_boto_session().client(service, **kw))
+            _cache[key] = obj
+    return obj
+
+
+def _build_resource(service: str, region: Optional[str], endpoint: Optional[str]):
+    """A new boto3 resource for the calling thread, backed by the shared client."""
+    if fakes.enabled():
+        return fakes.resource(service)
+    shared = _get(service, region, endpoint)
+    kw: Dict[str, Any] = {"region_name": region or AWS_REGION, "config": _config()}
+    if endpoint:
+        kw["endpoint_url"] = endpoint
+    with _lock:  # boto3 sessions aren't thread-safe either
+        res = _boto_session().resource(service, **kw)
+    res.meta.client = shared  # Tables made from it use the shared client (and pool) too
+    return res
+
+
+def client(service: str, region: Optional[str] = None, endpoint: Optional[str] = None):
+    return _get(service, region, endpoint)
+
+
+def resource(service: str, region: Optional[str] = None, endpoint: Optional[str] = None):
+    key = ("resource", service, region or AWS_REGION, endpoint)
+    obj = _cache.get(key)
+    if obj is None:
+        with _lock:
+            obj = _cache.get(key)
+            if obj is None:
+                obj = _cache[key] = _PerThread(key, lambda: _build_resource(service, region, endpoint))
+    return obj
+
+
+# ---------- convenience accessors ----------
+
+def dynamodb():
+    """Shared DynamoDB resource (honours DYNAMODB_LOCAL_URL)."""
+    return resource("dynamodb", endpoint=DYNAMODB_ENDPOINT)
+
+
+def dynamodb_client():
+    """Low-level DynamoDB client (transactions, batch writes)."""
+    return client("dynamodb", endpoint=DYNAMODB_ENDPOINT)
+
+
+def table(name: str):
+    """Process-wide Table handle (a per-thread boto3 Table underneath); no network call."""
+    tbl = _tables.get(name)
+    if tbl is None:
+        res = dynamodb()
+        tbl = _tables.setdefault(name, _PerThread(("table", name), lambda: res._obj().Table(name)))
+    return tbl
+
+
+def s3(region: Optional[str] = None):
+    return client("s3", region=region)
+
+
+def sns(region: Optional[str] = None):
+    return client("sns", region=region)
+
+
+def cognito(region: Optional[str] = None):
+    return client("cognito-idp", region=region)
+
+
+def reset():
+    """Drop cached clients (tests / after fork)."""
+    global _session, _generation
+    with _lock:
+        _cache.clear()
+        _tables.clear()
+        _session = None
+        _generation += 1
+    _local.objs = {}
+    if fakes.enabled():
+        fakes.reset()
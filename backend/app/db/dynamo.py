@@ -1,10 +1,11 @@
 import os
-import boto3
+
+from app.db import clients
 
 AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 DDB_TABLE_PATIENTS = os.getenv("DDB_TABLE_PATIENTS", "medmitra_patients")
 
-ddb = boto3.resource("dynamodb", region_name=AWS_REGION)
+ddb = clients.dynamodb()
 patients_table = ddb.Table(DDB_TABLE_PATIENTS)
 
 
@@ -16,10 +17,7 @@ DDB_TABLE_APPOINTMENTS = (
 DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+    return clients.dynamodb()
 
 def appointments_table():
-    return _ddb().Table(DDB_TABLE_APPOINTMENTS)
\ No newline at end of file
+    return clients.table(DDB_TABLE_APPOINTMENTS)
@@ -2,21 +2,19 @@
 import os
 import time
 from typing import Optional, Dict, Any
-import boto3
 from botocore.exceptions import ClientError
 
+from app.db import clients
+
 AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 DDB_TABLE_PAYMENTS = os.getenv("DDB_TABLE_PAYMENTS", "medmitra_payments")
 DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+    return clients.dynamodb()
 
 def payments_table():
-    return _ddb().Table(DDB_TABLE_PAYMENTS)
+    return clients.table(DDB_TABLE_PAYMENTS)
 
 def put_intent(
     invoice_id: str,
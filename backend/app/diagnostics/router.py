@@ -5,12 +5,14 @@ import logging
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 
-import boto3
 from boto3.dynamodb.conditions import Key, Attr
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Header, Query, Body, Depends
 from pydantic import BaseModel, Field, constr
 
+from app import fakes
+from app.db import clients
+
 log = logging.getLogger("diagnostics-partner")
 
 router = APIRouter(prefix="/diagnostics/partner", tags=["diagnostics-partner"])
@@ -20,19 +22,16 @@ DDB_TABLE_APPTS = os.getenv("DDB_TABLE_APPOINTMENTS", "medmitra-appointments")
 DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 S3_BUCKET = (os.getenv("S3_BUCKET") or os.getenv("AWS_BUCKET_NAME") or "").strip() or None
 
-DIAG_PARTNER_API_KEY = os.getenv("DIAG_PARTNER_API_KEY", "").strip()
+DIAG_PARTNER_API_KEY = fakes.secret("DIAG_PARTNER_API_KEY", "local-fake-partner-key")
 if not DIAG_PARTNER_API_KEY:
     raise RuntimeError("DIAG_PARTNER_API_KEY must be set for diagnostics partner API")
 
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+    return clients.dynamodb()
 
 ddb = _ddb()
 tbl_appts = ddb.Table(DDB_TABLE_APPTS)
-s3 = boto3.client("s3", region_name=AWS_REGION) if S3_BUCKET else None
+s3 = clients.s3() if S3_BUCKET else None
 
 
 # ---------- Auth dependency ----------
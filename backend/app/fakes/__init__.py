@@ -0,0 +1,47 @@
+# backend/app/fakes/__init__.py
+"""
+In-process stand-ins for DynamoDB, Cognito, S3, SNS, Twilio and Razorpay.
+
+Enable with CLINIC_BACKEND=memory to boot the whole FastAPI app with no
+network and no secrets (offline load tests, laptop benchmarks). Each fake
+sleeps FAKE_LATENCY_MS (or FAKE_LATENCY_MS_<SERVICE>) per call, +/- up to
+FAKE_LATENCY_JITTER_MS, and counts calls per (service, operation) so load
+tests can report downstream round trips.
+"""
+import os
+
+BACKEND = (os.getenv("CLINIC_BACKEND") or "aws").strip().lower()
+
+
+def enabled() -> bool:
+    return BACKEND == "memory"
+
+
+def secret(name: str, fake_default: str) -> str:
+    """Env value, or a harmless placeholder when running against fakes."""
+    val = (os.getenv(name) or "").strip()
+    if not val and enabled():
+        return fake_default
+    return val
+
+
+from app.fakes.base import stats, reset_stats, set_latency  # noqa: E402
+from app.fakes.registry import client, resource, reset, seed_patients  # noqa: E402
+from app.fakes.twilio import AsyncClient as AsyncTwilioClient, Client as TwilioClient  # noqa: E402
+from app.fakes.razorpay import Client as RazorpayClient  # noqa: E402
+
+__all__ = [
+    "BACKEND",
+    "enabled",
+    "secret",
+    "stats",
+    "reset_stats",
+    "set_latency",
+    "client",
+    "resource",
+    "reset",
+    "seed_patients",
+    "TwilioClient",
+    "AsyncTwilioClient",
+    "RazorpayClient",
+]
@@ -0,0 +1,64 @@
+# backend/app/fakes/base.py
+import os
+import random
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+_lock = threading.Lock()
+_calls: Counter = Counter()
+_latency_override: Dict[str, float] = {}
+
+
+def _env_ms(name: str) -> Optional[float]:
+    raw = (os.getenv(name) or "").strip()
+    return float(raw) if raw else None
+
+
+def latency_ms(service: str) -> float:
+    if service in _latency_override:
+        return _latency_override[service]
+    key = "FAKE_LATENCY_MS_" + service.upper().replace("-", "_")
+    per_service = _env_ms(key)
+    if per_service is not None:
+        return per_service
+    return _env_ms("FAKE_LATENCY_MS") or 0.0
+
+
+def set_latency(service: str, ms: float):
+    """Override per-call latency at runtime (load-test scenarios)."""
+    _latency_override[service] = float(ms)
+
+
+def io(service: str, op: str):
+    """Account for one downstream call and simulate its network latency."""
+    with _lock:
+        _calls[(service, op)] += 1
+    ms = latency_ms(service)
+    jitter = _env_ms("FAKE_LATENCY_JITTER_MS") or 0.0
+    if jitter:
+        ms = max(0.0, ms + random.uniform(-jitter, jitter))
+    if ms > 0:
+        time.sleep(ms / 1000.0)
+    from app import metrics  # late: app.metrics must not depend on the fakes
+
+    metrics.observe_downstream(service, op, ms / 1000.0)
+
+
+def stats() -> Dict[Tuple[str, str], int]:
+    with _lock:
+        return dict(_calls)
+
+
+def reset_stats():
+    with _lock:
+        _calls.clear()
+
+
+def client_error(code: str, message: str, op: str, **extra) -> ClientError:
+    resp = {"Error": {"Code": code, "Message": message}}
+    resp.update(extra)
+    return ClientError(resp, op)
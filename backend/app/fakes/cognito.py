@@ -0,0 +1,109 @@
+# backend/app/fakes/cognito.py
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from app.fakes.base import client_error, io
+
+_FILTER_RE = re.compile(r'^\s*([A-Za-z_:]+)\s*(\^?=)\s*"(.*)"\s*$')
+
+
+class FakeCognito:
+    """The handful of cognito-idp admin calls the kiosk uses, over one shared user pool."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._users: Dict[str, Dict[str, Any]] = {}          # Username -> user
+        self._groups: Dict[str, set] = {}                     # Username -> groups
+
+    # ---- helpers ----
+    @staticmethod
+    def _attr(user: Dict[str, Any], name: str) -> Optional[str]:
+        if name == "username":
+            return user["Username"]
+        for a in user["Attributes"]:
+            if a["Name"] == name:
+                return a["Value"]
+        return None
+
+    def _find(self, username: str) -> Dict[str, Any]:
+        u = self._users.get(username)
+        if u is None:
+            for cand in self._users.values():
+                if self._attr(cand, "sub") == username:
+                    return cand
+            raise client_error("UserNotFoundException", "User does not exist.", "AdminGetUser")
+        return u
+
+    def add_user(self, username: str, attributes: List[Dict[str, str]]) -> Dict[str, Any]:
+        with self._lock:
+            if username in self._users:
+                raise client_error("UsernameExistsException", "An account with the given email already exists.", "AdminCreateUser")
+            attrs = [a for a in attributes if a["Name"] != "sub"]
+            attrs.insert(0, {"Name": "sub", "Value": str(uuid.uuid4())})
+            now = datetime.now(timezone.utc)
+            user = {
+                "Username": username,
+                "Attributes": attrs,
+                "UserCreateDate": now,
+                "UserLastModifiedDate": now,
+                "Enabled": True,
+                "UserStatus": "FORCE_CHANGE_PASSWORD",
+            }
+            self._users[username] = user
+            return user
+
+    # ---- boto3 surface ----
+    def list_users(self, UserPoolId, Filter=None, Limit=60, PaginationToken=None, **kw):
+        io("cognito-idp", "ListUsers")
+        with self._lock:
+            users = list(self._users.values())
+        if Filter:
+            m = _FILTER_RE.match(Filter)
+            if not m:
+                raise client_error("InvalidParameterException", f"Error while parsing filter: {Filter}", "ListUsers")
+            name, op, val = m.groups()
+            if op == "=":
+                users = [u for u in users if self._attr(u, name) == val]
+            else:
+                users = [u for u in users if (self._attr(u, name) or "").startswith(val)]
+        start = int(PaginationToken or 0)
+        page = users[start:start + int(Limit or 60)]
+        out: Dict[str, Any] = {"Users": [dict(u, Attributes=list(u["Attributes"])) for u in page]}
+        if start + len(page) < len(users):
+            out["PaginationToken"] = str(start + len(page))
+        return out
+
+    def admin_create_user(self, UserPoolId, Username, UserAttributes=None, MessageAction=None, **kw):
+        io("cognito-idp", "AdminCreateUser")
+        user = self.add_user(Username, list(UserAttributes or []))
+        return {"User": dict(user, Attributes=list(user["Attributes"]))}
+
+    def admin_get_user(self, UserPoolId, Username, **kw):
+        io("cognito-idp", "AdminGetUser")
+        with self._lock:
+            u = self._find(Username)
+        return {
+            "Username": u["Username"],
+            "UserAttributes": list(u["Attributes"]),
+            "UserCreateDate": u["UserCreateDate"],
+            "UserLastModifiedDate": u["UserLastModifiedDate"],
+            "Enabled": True,
+            "UserStatus": u["UserStatus"],
+        }
+
+    def admin_list_groups_for_user(self, UserPoolId, Username, **kw):
+        io("cognito-idp", "AdminListGroupsForUser")
+        with self._lock:
+            self._find(Username)
+            groups = sorted(self._groups.get(Username, set()))
+        return {"Groups": [{"GroupName": g, "UserPoolId": UserPoolId} for g in groups]}
+
+    def admin_add_user_to_group(self, UserPoolId, Username, GroupName, **kw):
+        io("cognito-idp", "AdminAddUserToGroup")
+        with self._lock:
+            self._find(Username)
+            self._groups.setdefault(Username, set()).add(GroupName)
+        return {}
@@ -0,0 +1,501 @@
+# backend/app/fakes/dynamodb.py
+"""
+In-memory DynamoDB: resource (Table) and low-level client APIs over a shared
+store, with the key schemas and GSIs the routers rely on. Query honours
+DynamoDB's Limit-before-Filter semantics and pagination so index bugs show
+up here the same way they would in AWS.
+"""
+import copy
+import os
+import threading
+import zlib
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from app.fakes.base import client_error, io
+from app.fakes.expressions import (
+    MISSING,
+    ExpressionError,
+    apply_update,
+    evaluate,
+    key_equals,
+    parse_condition,
+    parse_update,
+)
+
+_ser = TypeSerializer()
+_deser = TypeDeserializer()
+
+
+class TableSchema:
+    def __init__(self, hash_key: str, range_key: Optional[str] = None,
+                 indexes: Optional[Dict[str, Tuple[str, Optional[str]]]] = None):
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes or {}
+
+    def key_attrs(self) -> List[str]:
+        return [self.hash_key] + ([self.range_key] if self.range_key else [])
+
+
+def default_schemas() -> Dict[str, TableSchema]:
+    env = os.getenv
+    return {
+        env("DDB_TABLE_APPOINTMENTS", "medmitra-appointments"): TableSchema(
+            "patientId", "appointmentId", indexes={"ReminderIndex": ("reminderDay", "reminderAt")}
+        ),
+        env("DDB_TABLE_SLOTS", "medmitra_appointment_slots"): TableSchema("resourceKey", "slotKey"),
+        env("DDB_TABLE_TOKENS", "medmitra_tokens"): TableSchema(
+            "tokenId",
+            indexes={
+                "GSI1": ("GSI1PK", "GSI1SK"),
+                "GSI2": ("GSI2PK", "GSI2SK"),
+                "GSI3": ("GSI3PK", "GSI3SK"),
+                env("QUEUE_ACTIVE_INDEX", "ActiveIndex"): ("activePK", "activeSK"),
+            },
+        ),
+        env("DDB_TABLE_COUNTERS", "medmitra_counters"): TableSchema("counterId"),
+        env("DDB_TABLE_KIOSK_OTP", "kiosk_otp"): TableSchema(
+            "phone", "sessionId", indexes={"GSI1": ("phone", "createdAt")}
+        ),
+        env("DDB_TABLE_PATIENTS", "medmitra_patients"): TableSchema(
+            "patientId", indexes={"PhoneIndex": ("phoneE164", None)}
+        ),
+        env("PROFILES_TABLE", "patient_profiles"): TableSchema("patientId"),
+        env("DDB_TABLE_PAYMENTS", "medmitra_payments"): TableSchema("invoice_id"),
+        env("DDB_TABLE_OUTBOX", "medmitra_outbox"): TableSchema(
+            "messageId", indexes={env("OUTBOX_INDEX", "StatusDue"): ("status", "dueAt")}
+        ),
+        env("DDB_TABLE_PHARM_ORDERS", "medmitra_medication_orders"): TableSchema(
+            "orderId", indexes={"PatientOrdersIndex": ("patientId", "createdAt")}
+        ),
+    }
+
+
+def _normalize_value(v: Any) -> Any:
+    """Round-trip through boto3's serializer: ints -> Decimal, floats rejected, etc."""
+    return _deser.deserialize(_ser.serialize(v))
+
+
+def _normalize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _normalize_value(v) for k, v in item.items()}
+
+
+def _sort_key(v: Any):
+    if isinstance(v, Decimal):
+        return (0, v, "")
+    return (1, Decimal(0), v)
+
+
+class _Table:
+    def __init__(self, name: str, schema: TableSchema):
+        self.name = name
+        self.schema = schema
+        self.items: Dict[Tuple, Dict[str, Any]] = {}
+
+    def pk(self, key: Dict[str, Any], op: str) -> Tuple:
+        try:
+            return tuple(key[a] for a in self.schema.key_attrs())
+        except KeyError:
+            raise client_error(
+                "ValidationException",
+                "The provided key element does not match the schema",
+                op,
+            )
+
+    def key_of(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return {a: item[a] for a in self.schema.key_attrs()}
+
+
+class Store:
+    """All tables for one fake 'account'. Thread-safe; one lock per store."""
+
+    def __init__(self, schemas: Optional[Dict[str, TableSchema]] = None):
+        self.lock = threading.RLock()
+        self.tables: Dict[str, _Table] = {}
+        for name, sch in (schemas or default_schemas()).items():
+            self.tables[name] = _Table(name, sch)
+
+    def table(self, name: str, op: str) -> _Table:
+        t = self.tables.get(name)
+        if t is None:
+            raise client_error("ResourceNotFoundException", f"Requested resource not found: Table: {name} not found", op)
+        return t
+
+    def define(self, name: str, schema: TableSchema):
+        with self.lock:
+            self.tables[name] = _Table(name, schema)
+
+    # ------------------------------------------------------------------ core
+    def _check(self, cond, names, values, item: Optional[Dict[str, Any]], op: str, return_old: str = "NONE"):
+        if not cond:
+            return
+        try:
+            node = parse_condition(cond, names, values)
+            ok = evaluate(node, item or {})
+        except ExpressionError as e:
+            raise client_error("ValidationException", str(e), op)
+        if not ok:
+            extra = {}
+            if return_old == "ALL_OLD" and item:
+                extra["Item"] = {k: _ser.serialize(v) for k, v in item.items()}
+            raise client_error("ConditionalCheckFailedException", "The conditional request failed", op, **extra)
+
+    def get_item(self, name: str, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            t = self.table(name, "GetItem")
+            it = t.items.get(t.pk(key, "GetItem"))
+            return copy.deepcopy(it) if it else None
+
+    def put_item(self, name: str, item: Dict[str, Any], cond=None, names=None, values=None,
+                 return_values: str = "NONE", return_old_on_fail: str = "NONE", op: str = "PutItem"):
+        item = _normalize_item(item)
+        values = _normalize_item(values or {})
+        with self.lock:
+            t = self.table(name, op)
+            pk = t.pk(item, op)
+            old = t.items.get(pk)
+            self._check(cond, names, values, old, op, return_old_on_fail)
+            t.items[pk] = item
+            return copy.deepcopy(old) if (old and return_values == "ALL_OLD") else None
+
+    def delete_item(self, name: str, key: Dict[str, Any], cond=None, names=None, values=None,
+                    return_values: str = "NONE", return_old_on_fail: str = "NONE", op: str = "DeleteItem"):
+        values = _normalize_item(values or {})
+        with self.lock:
+            t = self.table(name, op)
+            pk = t.pk(key, op)
+            old = t.items.get(pk)
+            self._check(cond, names, values, old, op, return_old_on_fail)
+            t.items.pop(pk, None)
+            return copy.deepcopy(old) if (old and return_values == "ALL_OLD") else None
+
+    def update_item(self, name: str, key: Dict[str, Any], update: str, cond=None, names=None, values=None,
+                    return_values: str = "NONE", return_old_on_fail: str = "NONE", op: str = "UpdateItem"):
+        key = _normalize_item(key)
+        values = _normalize_item(values or {})
+        with self.lock:
+            t = self.table(name, op)
+            pk = t.pk(key, op)
+            old = t.items.get(pk)
+            self._check(cond, names, values, old, op, return_old_on_fail)
+            new = copy.deepcopy(old) if old else dict(key)
+            try:
+                touched = apply_update(new, parse_update(update, names, values))
+            except (ExpressionError, TypeError) as e:
+                raise client_error("ValidationException", str(e), op)
+            for a in t.schema.key_attrs():
+                if new.get(a) != key[a]:
+                    raise client_error("ValidationException", f"Cannot update attribute {a}. This attribute is part of the key", op)
+            t.items[pk] = new
+        rv = (return_values or "NONE").upper()
+        if rv == "ALL_NEW":
+            return copy.deepcopy(new)
+        if rv == "ALL_OLD":
+            return copy.deepcopy(old) if old else None
+        if rv == "UPDATED_NEW":
+            return {k: copy.deepcopy(new[k]) for k in touched if k in new}
+        if rv == "UPDATED_OLD":
+            return {k: copy.deepcopy(old[k]) for k in touched if old and k in old}
+        return None
+
+    def _page(self, rows: List[Dict[str, Any]], key_fn, start_key, limit, filt):
+        if start_key:
+            sk = key_fn(_normalize_item(start_key))
+            for i, r in enumerate(rows):
+                if key_fn(r) == sk:
+                    rows = rows[i + 1:]
+                    break
+        last_key = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last_key = rows[-1]
+        scanned = len(rows)
+        if filt is not None:
+            rows = [r for r in rows if evaluate(filt, r)]
+        return rows, scanned, last_key
+
+    def query(self, name: str, key_cond, index: Optional[str] = None, filt=None, names=None, values=None,
+              limit: Optional[int] = None, forward: bool = True, start_key=None, select: Optional[str] = None):
+        values = _normalize_item(values or {})
+        with self.lock:
+            t = self.table(name, "Query")
+            if index:
+                if index not in t.schema.indexes:
+                    raise client_error("ValidationException", f"The table does not have the specified index: {index}", "Query")
+                hk, rk = t.schema.indexes[index]
+            else:
+                hk, rk = t.schema.hash_key, t.schema.range_key
+            try:
+                knode = parse_condition(key_cond, names, values, is_key=True)
+                fnode = parse_condition(filt, names, values) if filt is not None else None
+            except ExpressionError as e:
+                raise client_error("ValidationException", str(e), "Query")
+            hval = key_equals(knode, hk)
+            if hval is MISSING:
+                raise client_error("ValidationException", "Query condition missed key schema element", "Query")
+            rows = [
+                it for it in t.items.values()
+                if it.get(hk) == hval and (rk is None or rk in it) and evaluate(knode, it)
+            ]
+            rows.sort(key=lambda it: (_sort_key(it.get(rk)) if rk else (0, Decimal(0), ""),
+                                      tuple(_sort_key(it[a]) for a in t.schema.key_attrs())),
+                      reverse=not forward)
+
+            def key_fn(it):
+                attrs = t.schema.key_attrs() + ([hk] + ([rk] if rk else []) if index else [])
+                return tuple(it.get(a) for a in attrs)
+
+            page, scanned, last = self._page(rows, key_fn, start_key, limit, fnode)
+            out: Dict[str, Any] = {"Count": len(page), "ScannedCount": scanned}
+            if select != "COUNT":
+                out["Items"] = copy.deepcopy(page)
+            if last is not None:
+                lk = t.key_of(last)
+                if index:
+                    lk[hk] = last[hk]
+                    if rk:
+                        lk[rk] = last[rk]
+                out["LastEvaluatedKey"] = lk
+            return out
+
+    def scan(self, name: str, index: Optional[str] = None, filt=None, names=None, values=None,
+             limit: Optional[int] = None, start_key=None, select: Optional[str] = None,
+             segment: Optional[int] = None, total_segments: Optional[int] = None):
+        values = _normalize_item(values or {})
+        with self.lock:
+            t = self.table(name, "Scan")
+            try:
+                fnode = parse_condition(filt, names, values) if filt is not None else None
+            except ExpressionError as e:
+                raise client_error("ValidationException", str(e), "Scan")
+            rows = list(t.items.values())
+            if index:
+                hk, rk = t.schema.indexes[index]
+                rows = [r for r in rows if hk in r and (rk is None or rk in r)]
+            if total_segments:
+                # parallel scan: stable partition of items by primary key
+                rows = [r for r in rows
+                        if zlib.crc32(repr(t.pk(r, "Scan")).encode()) % total_segments == segment]
+            page, scanned, last = self._page(rows, lambda it: tuple(it.get(a) for a in t.schema.key_attrs()),
+                                             start_key, limit, fnode)
+            out: Dict[str, Any] = {"Count": len(page), "ScannedCount": scanned}
+            if select != "COUNT":
+                out["Items"] = copy.deepcopy(page)
+            if last is not None:
+                out["LastEvaluatedKey"] = t.key_of(last)
+            return out
+
+
+# ----------------------------------------------------------------------------
+# Resource-level API
+# ----------------------------------------------------------------------------
+
+class _BatchWriter:
+    def __init__(self, table: "FakeTable"):
+        self._t = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self._t.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self._t.delete_item(Key=Key)
+
+
+class FakeTable:
+    def __init__(self, store: Store, name: str):
+        self._store = store
+        self.name = name
+        self.table_name = name
+
+    def get_item(self, Key, **kw):
+        io("dynamodb", "GetItem")
+        it = self._store.get_item(self.name, Key)
+        return {"Item": it} if it else {}
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues="NONE",
+                 ReturnValuesOnConditionCheckFailure="NONE", **kw):
+        io("dynamodb", "PutItem")
+        old = self._store.put_item(self.name, Item, ConditionExpression, ExpressionAttributeNames,
+                                   ExpressionAttributeValues, ReturnValues, ReturnValuesOnConditionCheckFailure)
+        return {"Attributes": old} if old else {}
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE",
+                    ReturnValuesOnConditionCheckFailure="NONE", **kw):
+        io("dynamodb", "UpdateItem")
+        attrs = self._store.update_item(self.name, Key, UpdateExpression, ConditionExpression,
+                                        ExpressionAttributeNames, ExpressionAttributeValues,
+                                        ReturnValues, ReturnValuesOnConditionCheckFailure)
+        return {"Attributes": attrs} if attrs is not None else {}
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues="NONE",
+                    ReturnValuesOnConditionCheckFailure="NONE", **kw):
+        io("dynamodb", "DeleteItem")
+        old = self._store.delete_item(self.name, Key, ConditionExpression, ExpressionAttributeNames,
+                                      ExpressionAttributeValues, ReturnValues, ReturnValuesOnConditionCheckFailure)
+        return {"Attributes": old} if old else {}
+
+    def query(self, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ExpressionAttributeNames=None, ExpressionAttributeValues=None, Limit=None,
+              ScanIndexForward=True, ExclusiveStartKey=None, Select=None, **kw):
+        io("dynamodb", "Query")
+        return self._store.query(self.name, KeyConditionExpression, IndexName, FilterExpression,
+                                 ExpressionAttributeNames, ExpressionAttributeValues, Limit,
+                                 ScanIndexForward, ExclusiveStartKey, Select)
+
+    def scan(self, FilterExpression=None, IndexName=None, ExpressionAttributeNames=None,
+             ExpressionAttributeValues=None, Limit=None, ExclusiveStartKey=None, Select=None,
+             Segment=None, TotalSegments=None, **kw):
+        io("dynamodb", "Scan")
+        return self._store.scan(self.name, IndexName, FilterExpression, ExpressionAttributeNames,
+                                ExpressionAttributeValues, Limit, ExclusiveStartKey, Select,
+                                Segment, TotalSegments)
+
+    def batch_writer(self, **kw):
+        return _BatchWriter(self)
+
+
+class FakeDynamoResource:
+    def __init__(self, store: Store):
+        self._store = store
+        self.meta = type("Meta", (), {"client": FakeDynamoClient(store)})()
+
+    def Table(self, name: str) -> FakeTable:
+        return FakeTable(self._store, name)
+
+    def batch_get_item(self, RequestItems, **kw):
+        io("dynamodb", "BatchGetItem")
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        for name, spec in RequestItems.items():
+            rows = [self._store.get_item(name, k) for k in spec.get("Keys", [])]
+            out[name] = [r for r in rows if r]
+        return {"Responses": out, "UnprocessedKeys": {}}
+
+    def batch_write_item(self, RequestItems, **kw):
+        io("dynamodb", "BatchWriteItem")
+        _batch_write(self._store, RequestItems, typed=False)
+        return {"UnprocessedItems": {}}
+
+
+# ----------------------------------------------------------------------------
+# Low-level client API (typed attribute values)
+# ----------------------------------------------------------------------------
+
+def _untype(d: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: _deser.deserialize(v) for k, v in (d or {}).items()}
+
+
+def _type(d: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: _ser.serialize(v) for k, v in (d or {}).items()}
+
+
+def _batch_write(store: Store, request_items, typed: bool):
+    conv = _untype if typed else (lambda x: x)
+    if sum(len(v) for v in request_items.values()) > 25:
+        raise client_error("ValidationException", "Too many items requested for the BatchWriteItem call", "BatchWriteItem")
+    with store.lock:
+        for name, reqs in request_items.items():
+            for r in reqs:
+                if "PutRequest" in r:
+                    store.put_item(name, conv(r["PutRequest"]["Item"]), op="BatchWriteItem")
+                elif "DeleteRequest" in r:
+                    store.delete_item(name, conv(r["DeleteRequest"]["Key"]), op="BatchWriteItem")
+
+
+class FakeDynamoClient:
+    def __init__(self, store: Store):
+        self._store = store
+
+    def get_item(self, TableName, Key, **kw):
+        io("dynamodb", "GetItem")
+        it = self._store.get_item(TableName, _untype(Key))
+        return {"Item": _type(it)} if it else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kw):
+        io("dynamodb", "PutItem")
+        self._store.put_item(TableName, _untype(Item), ConditionExpression, ExpressionAttributeNames,
+                             _untype(ExpressionAttributeValues))
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ConditionExpression=None,
+                    ExpressionAttributeNames=None, ExpressionAttributeValues=None, ReturnValues="NONE", **kw):
+        io("dynamodb", "UpdateItem")
+        attrs = self._store.update_item(TableName, _untype(Key), UpdateExpression, ConditionExpression,
+                                        ExpressionAttributeNames, _untype(ExpressionAttributeValues), ReturnValues)
+        return {"Attributes": _type(attrs)} if attrs is not None else {}
+
+    def batch_get_item(self, RequestItems, **kw):
+        io("dynamodb", "BatchGetItem")
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        for name, spec in RequestItems.items():
+            rows = [self._store.get_item(name, _untype(k)) for k in spec.get("Keys", [])]
+            out[name] = [_type(r) for r in rows if r]
+        return {"Responses": out, "UnprocessedKeys": {}}
+
+    def batch_write_item(self, RequestItems, **kw):
+        io("dynamodb", "BatchWriteItem")
+        _batch_write(self._store, RequestItems, typed=True)
+        return {"UnprocessedItems": {}}
+
+    def transact_write_items(self, TransactItems, **kw):
+        io("dynamodb", "TransactWriteItems")
+        store = self._store
+        with store.lock:
+            # validate every condition first, then apply: all-or-nothing
+            reasons: List[Dict[str, Any]] = []
+            failed = False
+            for ti in TransactItems:
+                (kind, spec), = ti.items()
+                t = store.table(spec["TableName"], "TransactWriteItems")
+                names = spec.get("ExpressionAttributeNames")
+                values = _untype(spec.get("ExpressionAttributeValues"))
+                key = _untype(spec["Item"]) if kind == "Put" else _untype(spec["Key"])
+                current = t.items.get(t.pk(key, "TransactWriteItems"))
+                cond = spec.get("ConditionExpression")
+                ok = True
+                if cond:
+                    try:
+                        ok = evaluate(parse_condition(cond, names, _normalize_item(values)), current or {})
+                    except ExpressionError as e:
+                        raise client_error("ValidationException", str(e), "TransactWriteItems")
+                if ok:
+                    reasons.append({"Code": "None"})
+                else:
+                    failed = True
+                    r: Dict[str, Any] = {"Code": "ConditionalCheckFailed", "Message": "The conditional request failed"}
+                    if spec.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD" and current:
+                        r["Item"] = _type(current)
+                    reasons.append(r)
+            if failed:
+                raise client_error(
+                    "TransactionCanceledException",
+                    "Transaction cancelled, please refer cancellation reasons for specific reasons ["
+                    + ", ".join(r["Code"] for r in reasons) + "]",
+                    "TransactWriteItems",
+                    CancellationReasons=reasons,
+                )
+            for ti in TransactItems:
+                (kind, spec), = ti.items()
+                name = spec["TableName"]
+                names = spec.get("ExpressionAttributeNames")
+                values = _untype(spec.get("ExpressionAttributeValues"))
+                if kind == "Put":
+                    store.put_item(name, _untype(spec["Item"]), op="TransactWriteItems")
+                elif kind == "Update":
+                    store.update_item(name, _untype(spec["Key"]), spec["UpdateExpression"], None, names, values,
+                                      op="TransactWriteItems")
+                elif kind == "Delete":
+                    store.delete_item(name, _untype(spec["Key"]), op="TransactWriteItems")
+        return {}
@@ -0,0 +1,431 @@
+# backend/app/fakes/expressions.py
+"""
+Just enough of the DynamoDB expression language for the in-memory fake:
+condition/filter/key-condition expressions (comparators, BETWEEN, IN,
+AND/OR/NOT, attribute_exists, attribute_not_exists, begins_with, contains,
+size) and update expressions (SET with +/-, if_not_exists, list_append;
+REMOVE; ADD; DELETE). boto3 condition objects (Key/Attr) are compiled to
+strings with boto3's own builder so both styles go through one evaluator.
+"""
+import re
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:(<>|<=|>=|[=<>(),.\[\]+-])|(:[A-Za-z0-9_]+)|(#?[A-Za-z_][A-Za-z0-9_]*)|(\d+))"
+)
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "REMOVE", "ADD", "DELETE"}
+_MISSING = object()
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+def _tokenize(expr: str) -> List[Tuple[str, str]]:
+    out: List[Tuple[str, str]] = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN_RE.match(expr, pos)
+        if not m or m.end() == pos:
+            raise ExpressionError(f"Invalid expression near {expr[pos:pos + 20]!r}")
+        op, val, name, num = m.groups()
+        if op:
+            out.append(("op", op))
+        elif val:
+            out.append(("val", val))
+        elif name:
+            if name.upper() in _KEYWORDS:
+                out.append(("kw", name.upper()))
+            else:
+                out.append(("name", name))
+        else:
+            out.append(("num", num))
+        pos = m.end()
+        while pos < len(expr) and expr[pos].isspace():
+            pos += 1
+    return out
+
+
+class _Parser:
+    def __init__(self, expr: str, names: Optional[Dict[str, str]], values: Optional[Dict[str, Any]]):
+        self.toks = _tokenize(expr)
+        self.i = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    # ---- token helpers ----
+    def peek(self, k: int = 0) -> Tuple[str, str]:
+        j = self.i + k
+        return self.toks[j] if j < len(self.toks) else ("eof", "")
+
+    def take(self) -> Tuple[str, str]:
+        t = self.peek()
+        self.i += 1
+        return t
+
+    def expect(self, kind: str, text: Optional[str] = None) -> Tuple[str, str]:
+        t = self.take()
+        if t[0] != kind or (text is not None and t[1] != text):
+            raise ExpressionError(f"Expected {text or kind}, got {t[1]!r}")
+        return t
+
+    def at(self, kind: str, text: Optional[str] = None) -> bool:
+        t = self.peek()
+        return t[0] == kind and (text is None or t[1] == text)
+
+    def done(self) -> bool:
+        return self.i >= len(self.toks)
+
+    # ---- operands ----
+    def name(self, tok: str) -> str:
+        if tok.startswith("#"):
+            if tok not in self.names:
+                raise ExpressionError(f"Undefined attribute name {tok}")
+            return self.names[tok]
+        return tok
+
+    def path(self) -> Tuple:
+        segs: List[Any] = [self.name(self.expect("name")[1])]
+        while True:
+            if self.at("op", "."):
+                self.take()
+                segs.append(self.name(self.expect("name")[1]))
+            elif self.at("op", "["):
+                self.take()
+                segs.append(int(self.expect("num")[1]))
+                self.expect("op", "]")
+            else:
+                return ("path", segs)
+
+    def value(self) -> Tuple:
+        tok = self.expect("val")[1]
+        if tok not in self.values:
+            raise ExpressionError(f"Undefined attribute value {tok}")
+        return ("val", self.values[tok])
+
+    def operand(self) -> Tuple:
+        if self.at("val"):
+            return self.value()
+        if self.at("name") and self.peek()[1] == "size" and self.peek(1) == ("op", "("):
+            self.take()
+            self.expect("op", "(")
+            p = self.path()
+            self.expect("op", ")")
+            return ("size", p)
+        return self.path()
+
+    # ---- conditions ----
+    def condition(self) -> Tuple:
+        node = self.conj()
+        while self.at("kw", "OR"):
+            self.take()
+            node = ("or", node, self.conj())
+        return node
+
+    def conj(self) -> Tuple:
+        node = self.neg()
+        while self.at("kw", "AND"):
+            self.take()
+            node = ("and", node, self.neg())
+        return node
+
+    def neg(self) -> Tuple:
+        if self.at("kw", "NOT"):
+            self.take()
+            return ("not", self.neg())
+        return self.primary()
+
+    def primary(self) -> Tuple:
+        if self.at("op", "("):
+            self.take()
+            node = self.condition()
+            self.expect("op", ")")
+            return node
+        t0, t1 = self.peek(), self.peek(1)
+        if t0[0] == "name" and t1 == ("op", "(") and t0[1] in (
+            "attribute_exists", "attribute_not_exists", "begins_with", "contains", "attribute_type",
+        ):
+            fn = self.take()[1]
+            self.expect("op", "(")
+            args = [self.operand()]
+            while self.at("op", ","):
+                self.take()
+                args.append(self.operand())
+            self.expect("op", ")")
+            return ("fn", fn, args)
+        lhs = self.operand()
+        if self.at("kw", "BETWEEN"):
+            self.take()
+            lo = self.operand()
+            self.expect("kw", "AND")
+            hi = self.operand()
+            return ("between", lhs, lo, hi)
+        if self.at("kw", "IN"):
+            self.take()
+            self.expect("op", "(")
+            opts = [self.operand()]
+            while self.at("op", ","):
+                self.take()
+                opts.append(self.operand())
+            self.expect("op", ")")
+            return ("in", lhs, opts)
+        op = self.expect("op")[1]
+        if op not in ("=", "<>", "<", "<=", ">", ">="):
+            raise ExpressionError(f"Unexpected operator {op!r}")
+        return ("cmp", op, lhs, self.operand())
+
+    # ---- updates ----
+    def set_operand(self) -> Tuple:
+        t0, t1 = self.peek(), self.peek(1)
+        if t0[0] == "name" and t1 == ("op", "(") and t0[1] in ("if_not_exists", "list_append"):
+            fn = self.take()[1]
+            self.expect("op", "(")
+            a = self.path() if fn == "if_not_exists" else self.set_operand()
+            self.expect("op", ",")
+            b = self.set_operand()
+            self.expect("op", ")")
+            return (fn, a, b)
+        return self.operand()
+
+    def set_value(self) -> Tuple:
+        lhs = self.set_operand()
+        if self.at("op", "+") or self.at("op", "-"):
+            op = self.take()[1]
+            return ("arith", op, lhs, self.set_operand())
+        return lhs
+
+    def update(self) -> List[Tuple]:
+        actions: List[Tuple] = []
+        while not self.done():
+            clause = self.expect("kw")[1]
+            while True:
+                if clause == "SET":
+                    p = self.path()
+                    self.expect("op", "=")
+                    actions.append(("SET", p, self.set_value()))
+                elif clause == "REMOVE":
+                    actions.append(("REMOVE", self.path()))
+                elif clause in ("ADD", "DELETE"):
+                    p = self.path()
+                    actions.append((clause, p, self.value()))
+                else:
+                    raise ExpressionError(f"Unknown update clause {clause}")
+                if self.at("op", ","):
+                    self.take()
+                    continue
+                break
+        return actions
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+
+def resolve(item: Dict[str, Any], segs: List[Any]) -> Any:
+    cur: Any = item
+    for s in segs:
+        if isinstance(s, int):
+            if not isinstance(cur, list) or s >= len(cur):
+                return _MISSING
+            cur = cur[s]
+        else:
+            if not isinstance(cur, dict) or s not in cur:
+                return _MISSING
+            cur = cur[s]
+    return cur
+
+
+def _eval_operand(item: Dict[str, Any], node: Tuple) -> Any:
+    kind = node[0]
+    if kind == "val":
+        return node[1]
+    if kind == "path":
+        return resolve(item, node[1])
+    if kind == "size":
+        v = resolve(item, node[1][1])
+        if v is _MISSING:
+            return _MISSING
+        return Decimal(len(v))
+    raise ExpressionError(f"Bad operand {node!r}")
+
+
+def _comparable(a: Any, b: Any) -> bool:
+    if a is _MISSING or b is _MISSING:
+        return False
+    num = (int, Decimal)
+    if isinstance(a, num) and isinstance(b, num) and not isinstance(a, bool) and not isinstance(b, bool):
+        return True
+    return type(a) is type(b)
+
+
+def _cmp(op: str, a: Any, b: Any) -> bool:
+    if op == "=":
+        return _comparable(a, b) and a == b
+    if op == "<>":
+        return not (_comparable(a, b) and a == b) if a is not _MISSING else True
+    if not _comparable(a, b) or isinstance(a, (dict, list, bool)):
+        return False
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+def evaluate(node: Tuple, item: Dict[str, Any]) -> bool:
+    kind = node[0]
+    if kind == "and":
+        return evaluate(node[1], item) and evaluate(node[2], item)
+    if kind == "or":
+        return evaluate(node[1], item) or evaluate(node[2], item)
+    if kind == "not":
+        return not evaluate(node[1], item)
+    if kind == "cmp":
+        return _cmp(node[1], _eval_operand(item, node[2]), _eval_operand(item, node[3]))
+    if kind == "between":
+        v = _eval_operand(item, node[1])
+        return _cmp(">=", v, _eval_operand(item, node[2])) and _cmp("<=", v, _eval_operand(item, node[3]))
+    if kind == "in":
+        v = _eval_operand(item, node[1])
+        return any(_cmp("=", v, _eval_operand(item, o)) for o in node[2])
+    if kind == "fn":
+        fn, args = node[1], node[2]
+        if fn == "attribute_exists":
+            return resolve(item, args[0][1]) is not _MISSING
+        if fn == "attribute_not_exists":
+            return resolve(item, args[0][1]) is _MISSING
+        a = _eval_operand(item, args[0])
+        b = _eval_operand(item, args[1])
+        if fn == "begins_with":
+            return isinstance(a, str) and isinstance(b, str) and a.startswith(b)
+        if fn == "contains":
+            if a is _MISSING:
+                return False
+            try:
+                return b in a
+            except TypeError:
+                return False
+        if fn == "attribute_type":
+            return a is not _MISSING
+    raise ExpressionError(f"Bad condition node {node!r}")
+
+
+def _eval_set_value(item: Dict[str, Any], node: Tuple) -> Any:
+    kind = node[0]
+    if kind == "if_not_exists":
+        cur = resolve(item, node[1][1])
+        return _eval_set_value(item, node[2]) if cur is _MISSING else cur
+    if kind == "list_append":
+        a = _eval_set_value(item, node[1])
+        b = _eval_set_value(item, node[2])
+        return list(a if a is not _MISSING else []) + list(b if b is not _MISSING else [])
+    if kind == "arith":
+        a = _eval_set_value(item, node[2])
+        b = _eval_set_value(item, node[3])
+        if a is _MISSING or b is _MISSING:
+            raise ExpressionError("The provided expression refers to an attribute that does not exist in the item")
+        return a + b if node[1] == "+" else a - b
+    v = _eval_operand(item, node)
+    if v is _MISSING:
+        raise ExpressionError("The provided expression refers to an attribute that does not exist in the item")
+    return v
+
+
+def _assign(item: Dict[str, Any], segs: List[Any], value: Any):
+    cur: Any = item
+    for s in segs[:-1]:
+        nxt = cur[s] if (isinstance(cur, list) or s in cur) else _MISSING
+        if nxt is _MISSING:
+            raise ExpressionError("The document path provided in the update expression is invalid for update")
+        cur = nxt
+    last = segs[-1]
+    if isinstance(cur, list):
+        if last < len(cur):
+            cur[last] = value
+        else:
+            cur.append(value)
+    else:
+        cur[last] = value
+
+
+def _remove(item: Dict[str, Any], segs: List[Any]):
+    parent = resolve(item, segs[:-1]) if len(segs) > 1 else item
+    if parent is _MISSING:
+        return
+    last = segs[-1]
+    if isinstance(parent, list):
+        if last < len(parent):
+            parent.pop(last)
+    elif isinstance(parent, dict):
+        parent.pop(last, None)
+
+
+def apply_update(item: Dict[str, Any], actions: List[Tuple]) -> List[str]:
+    """Apply parsed update actions in place; returns top-level attributes touched."""
+    touched: List[str] = []
+    # SET values are computed against the pre-update item, as DynamoDB does
+    snapshot = {k: v for k, v in item.items()}
+    for act in actions:
+        segs = act[1][1]
+        touched.append(segs[0])
+        if act[0] == "SET":
+            _assign(item, segs, _eval_set_value(snapshot, act[2]))
+        elif act[0] == "REMOVE":
+            _remove(item, segs)
+        elif act[0] == "ADD":
+            delta = act[2][1]
+            cur = resolve(item, segs)
+            if isinstance(delta, set):
+                _assign(item, segs, (set() if cur is _MISSING else set(cur)) | delta)
+            else:
+                _assign(item, segs, (Decimal(0) if cur is _MISSING else cur) + delta)
+        elif act[0] == "DELETE":
+            cur = resolve(item, segs)
+            if cur is not _MISSING:
+                remaining = set(cur) - act[2][1]
+                if remaining:
+                    _assign(item, segs, remaining)
+                else:
+                    _remove(item, segs)
+    return touched
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+
+def _normalize(expr: Any, names, values, is_key: bool):
+    if isinstance(expr, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(expr, is_key_condition=is_key)
+        names = {**(names or {}), **built.attribute_name_placeholders}
+        values = {**(values or {}), **built.attribute_value_placeholders}
+        expr = built.condition_expression
+    return expr, names, values
+
+
+def parse_condition(expr: Any, names=None, values=None, is_key: bool = False) -> Tuple:
+    expr, names, values = _normalize(expr, names, values, is_key)
+    p = _Parser(expr, names, values)
+    node = p.condition()
+    if not p.done():
+        raise ExpressionError(f"Unexpected token {p.peek()[1]!r}")
+    return node
+
+
+def parse_update(expr: str, names=None, values=None) -> List[Tuple]:
+    return _Parser(expr, names, values).update()
+
+
+def key_equals(node: Tuple, attr: str) -> Any:
+    """Find `attr = :v` inside an AND-only key condition; _MISSING if absent."""
+    if node[0] == "and":
+        v = key_equals(node[1], attr)
+        return v if v is not _MISSING else key_equals(node[2], attr)
+    if node[0] == "cmp" and node[1] == "=":
+        lhs, rhs = node[2], node[3]
+        if lhs[0] == "path" and lhs[1] == [attr] and rhs[0] == "val":
+            return rhs[1]
+    return _MISSING
+
+
+MISSING = _MISSING
@@ -0,0 +1,65 @@
+# backend/app/fakes/razorpay.py
+import itertools
+import threading
+import time
+from typing import Any, Dict
+
+from app.fakes.base import io
+
+_seq = itertools.count(1)
+_lock = threading.Lock()
+_orders: Dict[str, Dict[str, Any]] = {}
+_payments: Dict[str, Dict[str, Any]] = {}
+
+
+class _Order:
+    def create(self, data: Dict[str, Any]):
+        io("razorpay", "order.create")
+        oid = f"order_fake{next(_seq):010d}"
+        order = {
+            "id": oid,
+            "entity": "order",
+            "amount": int(data["amount"]),
+            "currency": data.get("currency", "INR"),
+            "receipt": data.get("receipt"),
+            "notes": data.get("notes") or {},
+            "status": "created",
+            "created_at": int(time.time()),
+        }
+        with _lock:
+            _orders[oid] = order
+        return dict(order)
+
+
+class _Payment:
+    def fetch(self, payment_id: str):
+        io("razorpay", "payment.fetch")
+        with _lock:
+            pay = _payments.get(payment_id)
+        return dict(pay) if pay else {
+            "id": payment_id,
+            "entity": "payment",
+            "amount": 0,
+            "currency": "INR",
+            "status": "captured",
+            "method": "upi",
+            "fee": 0,
+            "tax": 0,
+        }
+
+    def capture(self, payment_id: str, amount: int, data: Dict[str, Any] = None):
+        io("razorpay", "payment.capture")
+        pay = self.fetch(payment_id)
+        pay.update({"amount": int(amount), "status": "captured"})
+        with _lock:
+            _payments[payment_id] = pay
+        return dict(pay)
+
+
+class Client:
+    """Drop-in for razorpay.Client(auth=(key, secret))."""
+
+    def __init__(self, auth=None, **kwargs):
+        self.auth = auth
+        self.order = _Order()
+        self.payment = _Payment()
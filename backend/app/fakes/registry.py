@@ -0,0 +1,84 @@
+# backend/app/fakes/registry.py
+"""Process-wide fake service instances handed out by app.db.clients."""
+import os
+import threading
+from typing import Any, Dict, List
+
+from app.fakes.cognito import FakeCognito
+from app.fakes.dynamodb import FakeDynamoClient, FakeDynamoResource, Store
+from app.fakes.s3 import FakeS3, FakeSNS
+
+_lock = threading.Lock()
+_state: Dict[str, Any] = {}
+
+
+def _get(name: str, factory):
+    obj = _state.get(name)
+    if obj is None:
+        with _lock:
+            obj = _state.get(name)
+            if obj is None:
+                obj = _state[name] = factory()
+    return obj
+
+
+def store() -> Store:
+    return _get("dynamodb", Store)
+
+
+def client(service: str):
+    if service == "dynamodb":
+        return FakeDynamoClient(store())
+    if service == "cognito-idp":
+        return _get("cognito-idp", FakeCognito)
+    if service == "s3":
+        return _get("s3", FakeS3)
+    if service == "sns":
+        return _get("sns", FakeSNS)
+    raise ValueError(f"No in-memory fake for service {service!r}")
+
+
+def resource(service: str):
+    if service == "dynamodb":
+        return FakeDynamoResource(store())
+    raise ValueError(f"No in-memory fake resource for service {service!r}")
+
+
+def reset():
+    """Forget all fake data (tables, users, objects, messages) in place, so
+    handles already cached by app.db.clients / app.db.aio stay valid."""
+    with _lock:
+        for obj in _state.values():
+            obj.__init__()
+
+
+def seed_patients(n: int, start: int = 0, prefix: str = "+9190000",
+                  phone_index: bool = True) -> List[Dict[str, str]]:
+    """
+    Register n Cognito users with phones prefix + zero-padded index; returns [{phone, sub}].
+    With phone_index, also write their patients-table rows, as
+    scripts/backfill_patient_phones.py does for a live pool.
+    """
+    cg = client("cognito-idp")
+    patients = resource("dynamodb").Table(os.getenv("DDB_TABLE_PATIENTS", "medmitra_patients"))
+    width = 12 - len(prefix.lstrip("+"))
+    out: List[Dict[str, str]] = []
+    for i in range(start, start + n):
+        phone = f"{prefix}{i:0{width}d}"
+        user = cg.add_user(
+            f"{phone.lstrip('+')}@seed.local",
+            [
+                {"Name": "phone_number", "Value": phone},
+                {"Name": "phone_number_verified", "Value": "true"},
+                {"Name": "given_name", "Value": "Patient"},
+                {"Name": "family_name", "Value": str(i)},
+            ],
+        )
+        sub = next(a["Value"] for a in user["Attributes"] if a["Name"] == "sub")
+        if phone_index:
+            patients.put_item(Item={
+                "patientId": sub, "mobile": phone, "firstName": "Patient", "lastName": str(i),
+                "fullName": f"Patient {i}", "source": "cognito", "phoneE164": phone, "phoneVerified": True,
+            })
+        out.append({"phone": phone, "sub": sub})
+    return out
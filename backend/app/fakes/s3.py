@@ -0,0 +1,67 @@
+# backend/app/fakes/s3.py
+import io as _io
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Tuple
+
+from app.fakes.base import client_error, io
+
+
+class FakeS3:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._objects: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def put_object(self, Bucket, Key, Body=b"", ContentType=None, **kw):
+        io("s3", "PutObject")
+        data = Body.read() if hasattr(Body, "read") else (Body.encode("utf-8") if isinstance(Body, str) else bytes(Body))
+        with self._lock:
+            self._objects[(Bucket, Key)] = {
+                "Body": data,
+                "ContentType": ContentType or "binary/octet-stream",
+                "LastModified": datetime.now(timezone.utc),
+            }
+        return {"ETag": f'"{hash(data) & 0xffffffff:08x}"'}
+
+    def get_object(self, Bucket, Key, **kw):
+        io("s3", "GetObject")
+        with self._lock:
+            obj = self._objects.get((Bucket, Key))
+        if obj is None:
+            raise client_error("NoSuchKey", "The specified key does not exist.", "GetObject")
+        return {"Body": _io.BytesIO(obj["Body"]), "ContentType": obj["ContentType"], "ContentLength": len(obj["Body"])}
+
+    def delete_object(self, Bucket, Key, **kw):
+        io("s3", "DeleteObject")
+        with self._lock:
+            self._objects.pop((Bucket, Key), None)
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kw):
+        io("s3", "ListObjectsV2")
+        with self._lock:
+            keys = sorted(k for (b, k) in self._objects if b == Bucket and k.startswith(Prefix))
+            contents = [
+                {"Key": k, "Size": len(self._objects[(Bucket, k)]["Body"]),
+                 "LastModified": self._objects[(Bucket, k)]["LastModified"]}
+                for k in keys
+            ]
+        return {"Contents": contents, "KeyCount": len(contents), "IsTruncated": False}
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kw):
+        # local signing in real boto3 too: no round trip, no latency
+        p = Params or {}
+        return f"http://fake-s3.local/{p.get('Bucket', '')}/{p.get('Key', '')}?expires={ExpiresIn}"
+
+
+class FakeSNS:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.sent = []
+
+    def publish(self, PhoneNumber=None, Message="", MessageAttributes=None, **kw):
+        io("sns", "Publish")
+        with self._lock:
+            self.sent.append({"PhoneNumber": PhoneNumber, "Message": Message})
+            mid = f"fake-sns-{len(self.sent)}"
+        return {"MessageId": mid}
@@ -0,0 +1,47 @@
+# backend/app/fakes/twilio.py
+import asyncio
+import functools
+import itertools
+import threading
+from types import SimpleNamespace
+
+from app.fakes.base import io
+
+_seq = itertools.count(1)
+_lock = threading.Lock()
+sent = []
+
+
+class _Messages:
+    def create(self, to=None, from_=None, body=None, content_sid=None, content_variables=None, **kw):
+        io("twilio", "messages.create")
+        sid = f"SMfake{next(_seq):026d}"
+        with _lock:
+            sent.append({"sid": sid, "to": to, "from": from_, "body": body, "content_sid": content_sid})
+        return SimpleNamespace(sid=sid, status="queued", to=to, from_=from_, body=body)
+
+
+class Client:
+    """Drop-in for twilio.rest.Client(sid, token): only messages.create is used."""
+
+    def __init__(self, *args, **kwargs):
+        self.messages = _Messages()
+
+
+class _AsyncMessages:
+    def __init__(self):
+        self._sync = _Messages()
+
+    async def create(self, **kw):
+        # the simulated latency sleeps; keep it off the event loop like real network I/O
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(self._sync.create, **kw))
+
+
+class AsyncClient:
+    """Drop-in for app.notifications.twilio_async.AsyncTwilio."""
+
+    def __init__(self, *args, **kwargs):
+        self.messages = _AsyncMessages()
+
+    async def close(self):
+        pass
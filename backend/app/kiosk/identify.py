@@ -1,18 +1,17 @@
 import os
 import re
-import time
-import uuid
-import random
 import logging
 from typing import Optional
-from datetime import datetime, timezone
 
-import boto3
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
-from fastapi import APIRouter, HTTPException, Header
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Header
 from pydantic import BaseModel, Field, validator
 
+from app import fakes
+from app.auth import phone_index
+from app.db import aio
+from app.kiosk import otp
+
 log = logging.getLogger("kiosk-identify")
 router = APIRouter(prefix="/kiosk/identify", tags=["kiosk-identify"])
 
@@ -21,55 +20,16 @@ router = APIRouter(prefix="/kiosk/identify", tags=["kiosk-identify"])
 # -----------------------------------------------------------------------------#
 AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
 
-COGNITO_USER_POOL_ID = (os.getenv("COGNITO_USER_POOL_ID") or "").strip()
+COGNITO_USER_POOL_ID = fakes.secret("COGNITO_USER_POOL_ID", "local_fake_pool")
 if not COGNITO_USER_POOL_ID:
     raise RuntimeError("Missing COGNITO_USER_POOL_ID")
 
-DDB_TABLE_OTP = os.getenv("DDB_TABLE_KIOSK_OTP", "kiosk_otp")
-
-# 5 minutes by default
-OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
-
-# Prefer OTP_LENGTH, but fall back to OTP_CODE_LENGTH for backwards compat
-OTP_LENGTH = int(os.getenv("OTP_LENGTH", os.getenv("OTP_CODE_LENGTH", "6")))
-
-# Cooldown between *sending* SMS messages (seconds)
-OTP_RESEND_COOLDOWN = int(os.getenv("OTP_RESEND_COOLDOWN", "45"))
-
-KIOSK_REQUIRE_VERIFIED = (
-    os.getenv("KIOSK_REQUIRE_VERIFIED", "false").strip().lower() == "true"
-)
-
-# Twilio (preferred)
-try:
-    from twilio.rest import Client as TwilioClient  # type: ignore
-except Exception:
-    TwilioClient = None  # if not installed
-
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "").strip()
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "").strip()
-TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "").strip()
-TWILIO_ENABLED = bool(
-    TwilioClient and TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER
-)
-
-# SNS (fallback)
-SMS_PROVIDER = "twilio" if TWILIO_ENABLED else "sns"
-SNS_REGION = os.getenv("SNS_REGION") or AWS_REGION
-SNS_SENDER_ID = os.getenv("SNS_SENDER_ID", "").strip()
-SNS_ENTITY_ID = os.getenv("SNS_ENTITY_ID", "").strip()
-SNS_TEMPLATE_ID = os.getenv("SNS_TEMPLATE_ID", "").strip()
-SNS_ORIGINATION_NUMBER = os.getenv("SNS_ORIGINATION_NUMBER", "").strip()
-SNS_DEFAULT_SMS_TYPE = os.getenv("SNS_DEFAULT_SMS_TYPE", "Transactional")
+KIOSK_REQUIRE_VERIFIED = phone_index.KIOSK_REQUIRE_VERIFIED
 
 # -----------------------------------------------------------------------------#
 # AWS Clients                                                                  #
 # -----------------------------------------------------------------------------#
-cognito = boto3.client("cognito-idp", region_name=AWS_REGION)
-dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION)
-otp_table = dynamodb.Table(DDB_TABLE_OTP)
-sns = boto3.client("sns", region_name=SNS_REGION)
-twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if TWILIO_ENABLED else None
+cognito = aio.cognito()
 
 # -----------------------------------------------------------------------------#
 # Helpers                                                                      #
@@ -90,19 +50,17 @@ def normalize_phone(mobile: str, country_code: str) -> str:
     return f"+{country_code.strip('+')}{digits}"
 
 
-def _gen_code(n: int) -> str:
-    lo = 10 ** (n - 1)
-    hi = (10 ** n) - 1
-    return str(random.randint(lo, hi))
-
-
 def _attrs_map(user: dict) -> dict:
     return {a["Name"]: a["Value"] for a in user.get("Attributes", [])}
 
 
-def _find_cognito_user_by_phone(e164: str) -> Optional[dict]:
+def _phone_verified(user: dict) -> bool:
+    return phone_index.phone_verified(user)
+
+
+async def _list_cognito_user_by_phone(e164: str) -> Optional[dict]:
     try:
-        resp = cognito.list_users(
+        resp = await cognito.list_users(
             UserPoolId=COGNITO_USER_POOL_ID,
             Filter=f'phone_number = "{e164}"',
             Limit=2,
@@ -111,7 +69,7 @@ def _find_cognito_user_by_phone(e164: str) -> Optional[dict]:
         if not users:
             digits = e164.lstrip("+")
             try:
-                resp2 = cognito.list_users(
+                resp2 = await cognito.list_users(
                     UserPoolId=COGNITO_USER_POOL_ID,
                     Filter=f'phone_number ^= "+{digits}"',
                     Limit=5,
@@ -119,115 +77,25 @@ def _find_cognito_user_by_phone(e164: str) -> Optional[dict]:
                 users = resp2.get("Users", []) or []
             except ClientError:
                 pass
-        if not users:
-            return None
-        user = users[0]
-        attrs = _attrs_map(user)
-        if KIOSK_REQUIRE_VERIFIED:
-            verified = str(attrs.get("phone_number_verified", "")).lower() == "true"
-            if not verified:
-                log.info("User found but phone_number_verified=false: %s", e164)
-                return None
-        return user
     except ClientError as e:
         log.exception("Cognito list_users failed")
         raise HTTPException(
             status_code=500,
             detail=f"Cognito error: {e.response['Error'].get('Message', 'unknown')}",
         )
+    return users[0] if users else None
 
 
-def _put_otp_session(phone: str, user_sub: str, code: str) -> str:
-    now_epoch = int(time.time())
-    ttl_epoch = now_epoch + OTP_TTL_SECONDS
-    session_id = str(uuid.uuid4())
-    item = {
-        "phone": phone,
-        "sessionId": session_id,
-        "code": code,  # plaintext for MVP; hash in prod if needed
-        "userSub": user_sub,
-        "createdAt": datetime.now(timezone.utc).isoformat(),
-        "ttl": ttl_epoch,
-        "attempts": 0,
-        "lastSendAt": now_epoch,
-    }
-    otp_table.put_item(Item=item)
-    return session_id
-
-
-def _latest_session_for_phone(phone: str) -> Optional[dict]:
-    try:
-        resp = otp_table.query(
-            IndexName="GSI1",
-            KeyConditionExpression=Key("phone").eq(phone),
-            ScanIndexForward=False,
-            Limit=1,
-        )
-        items = resp.get("Items", [])
-        return items[0] if items else None
-    except Exception:
+async def _find_cognito_user_by_phone(e164: str) -> Optional[dict]:
+    # patients table phone index first; Cognito only for phones it doesn't know
+    # (or doesn't know to be verified yet)
+    user = await phone_index.resolve_user(e164, _list_cognito_user_by_phone)
+    if not user:
         return None
-
-
-def _is_expired(item: dict, now_epoch: Optional[int] = None) -> bool:
-    if not item:
-        return True
-    now_epoch = now_epoch or int(time.time())
-    return now_epoch >= int(item.get("ttl", 0) or 0)
-
-
-def _send_sms_twilio(e164: str, text: str):
-    if not twilio_client or not TWILIO_FROM_NUMBER:
-        raise HTTPException(status_code=500, detail="Twilio not configured")
-    try:
-        twilio_client.messages.create(body=text, from_=TWILIO_FROM_NUMBER, to=e164)
-    except Exception as e:
-        log.exception("Twilio send failed to %s", e164)
-        raise HTTPException(
-            status_code=500, detail=f"Failed to send OTP via Twilio: {str(e)}"
-        )
-
-
-def _send_sms_sns(e164: str, text: str):
-    attrs = {
-        "AWS.SNS.SMS.SMSType": {
-            "DataType": "String",
-            "StringValue": SNS_DEFAULT_SMS_TYPE,
-        }
-    }
-    if SNS_SENDER_ID:
-        attrs["AWS.SNS.SMS.SenderID"] = {
-            "DataType": "String",
-            "StringValue": SNS_SENDER_ID,
-        }
-    if SNS_ORIGINATION_NUMBER:
-        attrs["AWS.SNS.SMS.OriginationNumber"] = {
-            "DataType": "String",
-            "StringValue": SNS_ORIGINATION_NUMBER,
-        }
-    if SNS_ENTITY_ID:
-        attrs["AWS.MM.SMS.EntityId"] = {
-            "DataType": "String",
-            "StringValue": SNS_ENTITY_ID,
-        }
-    if SNS_TEMPLATE_ID:
-        attrs["AWS.MM.SMS.TemplateId"] = {
-            "DataType": "String",
-            "StringValue": SNS_TEMPLATE_ID,
-        }
-    try:
-        sns.publish(PhoneNumber=e164, Message=text, MessageAttributes=attrs)
-    except Exception as e:
-        log.exception("SNS publish failed to %s", e164)
-        raise HTTPException(
-            status_code=500, detail=f"Failed to send OTP via SNS: {str(e)}"
-        )
-
-
-def _send_sms(e164: str, text: str):
-    if SMS_PROVIDER == "twilio":
-        return _send_sms_twilio(e164, text)
-    return _send_sms_sns(e164, text)
+    if KIOSK_REQUIRE_VERIFIED and not _phone_verified(user):
+        log.info("User found but phone_number_verified=false: %s", e164)
+        return None
+    return user
 
 
 # -----------------------------------------------------------------------------#
@@ -266,7 +134,7 @@ class VerifyOTPResp(BaseModel):
 # Routes                                                                        #
 # -----------------------------------------------------------------------------#
 @router.post("/send-otp", response_model=SendOTPResp)
-def send_otp(req: SendOTPReq, x_kiosk_key: Optional[str] = Header(None)):
+async def send_otp(req: SendOTPReq, background: BackgroundTasks, x_kiosk_key: Optional[str] = Header(None)):
     phone = normalize_phone(req.mobile, req.countryCode)
     if not phone:
         raise HTTPException(status_code=400, detail="Invalid phone")
@@ -276,10 +144,10 @@ def send_otp(req: SendOTPReq, x_kiosk_key: Optional[str] = Header(None)):
         phone,
         COGNITO_USER_POOL_ID,
         AWS_REGION,
-        SMS_PROVIDER,
+        otp.SMS_PROVIDER,
     )
 
-    user = _find_cognito_user_by_phone(phone)
+    user = await _find_cognito_user_by_phone(phone)
     if not user:
         raise HTTPException(status_code=404, detail="Mobile number not registered")
 
@@ -288,109 +156,37 @@ def send_otp(req: SendOTPReq, x_kiosk_key: Optional[str] = Header(None)):
     if not user_sub:
         raise HTTPException(status_code=500, detail="Cognito user missing sub")
 
-    now_epoch = int(time.time())
-    existing = _latest_session_for_phone(phone)
-
-    # Case 1: existing session and not expired
-    if existing and not _is_expired(existing, now_epoch):
-        last_send = int(existing.get("lastSendAt", 0) or 0)
-        elapsed = now_epoch - last_send
-
-        # If still in cooldown window, refuse to send a new SMS
-        if elapsed < OTP_RESEND_COOLDOWN:
-            wait = OTP_RESEND_COOLDOWN - elapsed
-            raise HTTPException(
-                status_code=429,
-                detail=f"Please wait {wait} seconds before requesting a new OTP.",
-            )
-
-        # Cooldown has passed, session still valid -> rotate code & extend TTL
-        new_code = _gen_code(OTP_LENGTH)
-        ttl_epoch = now_epoch + OTP_TTL_SECONDS
-        try:
-            otp_table.update_item(
-                Key={"phone": existing["phone"], "sessionId": existing["sessionId"]},
-                UpdateExpression=(
-                    "SET #c = :c, #ls = :ls, #ttl = :ttl, attempts = :z"
-                ),
-                ExpressionAttributeNames={
-                    "#c": "code",
-                    "#ls": "lastSendAt",
-                    "#ttl": "ttl",
-                },
-                ExpressionAttributeValues={
-                    ":c": new_code,
-                    ":ls": now_epoch,
-                    ":ttl": ttl_epoch,
-                    ":z": 0,
-                },
-                ConditionExpression="attribute_exists(phone) AND attribute_exists(sessionId)",
-            )
-        except Exception:
-            log.exception("Failed to update OTP session; falling back to new session")
-            existing = None
-        else:
-            _send_sms(
-                phone,
-                f"{new_code} is your MedMitra verification code. It expires in {OTP_TTL_SECONDS // 60} min.",
-            )
-            return SendOTPResp(
-                otpSessionId=existing["sessionId"],
-                normalizedPhone=phone,
-            )
-
-    # Case 2: no session or expired / failed to update -> create fresh session
-    code = _gen_code(OTP_LENGTH)
-    session_id = _put_otp_session(phone, user_sub, code)
-    _send_sms(
+    session_id, code = await otp.start_session(phone, otp.IDENTIFY, user_sub)
+    # the kiosk shows the code entry screen now; the SMS goes out after the response
+    background.add_task(
+        otp.deliver,
         phone,
-        f"{code} is your MedMitra verification code. It expires in {OTP_TTL_SECONDS // 60} min.",
+        otp.IDENTIFY,
+        session_id,
+        f"{code} is your MedMitra verification code. It expires in {otp.OTP_TTL_SECONDS // 60} min.",
     )
     return SendOTPResp(otpSessionId=session_id, normalizedPhone=phone)
 
 
+_OTP_REJECTED = {
+    otp.NOT_FOUND: (400, "OTP session not found or expired"),
+    otp.EXPIRED: (400, "OTP expired"),
+    otp.TOO_MANY_ATTEMPTS: (429, "Too many attempts"),
+    otp.MISMATCH: (400, "Invalid code"),
+}
+
+
 @router.post("/verify-otp", response_model=VerifyOTPResp)
-def verify_otp(req: VerifyOTPReq, x_kiosk_key: Optional[str] = Header(None)):
+async def verify_otp(req: VerifyOTPReq, x_kiosk_key: Optional[str] = Header(None)):
     phone = normalize_phone(req.mobile, req.countryCode)
     if not phone:
         raise HTTPException(status_code=400, detail="Invalid phone")
 
-    item = None
-    if req.otpSessionId:
-        try:
-            resp = otp_table.get_item(
-                Key={"phone": phone, "sessionId": req.otpSessionId}
-            )
-            item = resp.get("Item")
-        except Exception:
-            item = None
-    if not item:
-        item = _latest_session_for_phone(phone)
-    if not item:
-        raise HTTPException(status_code=400, detail="OTP session not found or expired")
-
-    if int(time.time()) >= int(item.get("ttl", 0)):
-        raise HTTPException(status_code=400, detail="OTP expired")
-
-    attempts = int(item.get("attempts", 0))
-    if attempts >= 5:
-        raise HTTPException(status_code=429, detail="Too many attempts")
-
-    if req.code != str(item.get("code")):
-        try:
-            otp_table.update_item(
-                Key={"phone": item["phone"], "sessionId": item["sessionId"]},
-                UpdateExpression="SET attempts = if_not_exists(attempts, :z) + :one",
-                ExpressionAttributeValues={":z": 0, ":one": 1},
-            )
-        except Exception:
-            pass
-        raise HTTPException(status_code=400, detail="Invalid code")
-
     try:
-        otp_table.delete_item(Key={"phone": item["phone"], "sessionId": item["sessionId"]})
-    except Exception:
-        pass
+        item = await otp.consume(phone, otp.IDENTIFY, req.code, req.otpSessionId)
+    except otp.OTPRejected as e:
+        status, detail = _OTP_REJECTED[e.reason]
+        raise HTTPException(status_code=status, detail=detail)
 
     patient_id = str(item.get("userSub") or "")
     if not patient_id:
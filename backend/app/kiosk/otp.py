@@ -0,0 +1,320 @@
+# backend/app/kiosk/otp.py
+"""
+Kiosk OTP service shared by identify (app/kiosk/identify.py) and walk-in
+registration (app/kiosk/walkins.py).
+
+Sessions live in DDB_TABLE_KIOSK_OTP, one item per phone and flow:
+(phone, "identify") / (phone, "walkin").
+
+- start_session(): one conditional UpdateItem (re)starts the session with a
+  new otpSessionId, code and TTL unless the last code went out less than
+  OTP_RESEND_COOLDOWN seconds ago (429 with the remaining wait).
+- deliver(): run after the response (BackgroundTasks). Sends the SMS and
+  records delivery / provider / providerMessageId / deliveryError on the
+  session; a failed send clears the cooldown so the kiosk can resend.
+- consume(): one conditional DeleteItem checks code, TTL and attempts and
+  consumes the session; see below.
+
+The code itself is never stored; the item holds codeHash =
+HMAC-SHA256(OTP_HASH_KEY, "<flow>:<phone>:<code>"), so a table export or a
+stray log line doesn't hand out live codes.
+
+SMS goes out through Twilio (the pooled transport in
+app/notifications/twilio_async.py) when it is configured, with SNS as the
+failover: SNS is tried at once when Twilio errors, and is started alongside
+when Twilio hasn't answered within OTP_HEDGE_AFTER_MS; the first to accept
+wins and the other is cancelled. Both carry the same code, so the rare
+double delivery is harmless. Without Twilio, SNS alone is used. Every send
+takes an OTP-priority token from the rate limiter (ratelimit.py).
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from fastapi import HTTPException
+
+from app import fakes, metrics
+from app.db import aio, clients
+from app.notifications import ratelimit, twilio_async
+
+log = logging.getLogger("kiosk-otp")
+
+AWS_REGION = os.getenv("AWS_REGION", "us-west-2")
+DDB_TABLE_OTP = os.getenv("DDB_TABLE_KIOSK_OTP", "kiosk_otp")
+
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+# Prefer OTP_LENGTH, but fall back to OTP_CODE_LENGTH for backwards compat
+OTP_LENGTH = int(os.getenv("OTP_LENGTH", os.getenv("OTP_CODE_LENGTH", "6")))
+OTP_RESEND_COOLDOWN = int(os.getenv("OTP_RESEND_COOLDOWN", "45"))  # between SMS sends
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_HEDGE_AFTER_MS = int(os.getenv("OTP_HEDGE_AFTER_MS", "2500"))   # start SNS if Twilio is slower
+OTP_SNS_FAILOVER = os.getenv("OTP_SNS_FAILOVER", "1").strip() != "0"
+
+OTP_HASH_KEY = (
+    fakes.secret("OTP_HASH_KEY", "")
+    or fakes.secret("KIOSK_SESSION_SECRET", "local-fake-kiosk-session-secret")
+).encode("utf-8")
+if not OTP_HASH_KEY:
+    raise RuntimeError("Set OTP_HASH_KEY (or KIOSK_SESSION_SECRET) to a strong random secret")
+
+# Twilio (preferred)
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "").strip()
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "").strip()
+TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "").strip()
+TWILIO_ENABLED = bool(TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER)
+
+# SNS (fallback)
+SNS_REGION = os.getenv("SNS_REGION") or AWS_REGION
+SNS_SENDER_ID = os.getenv("SNS_SENDER_ID", "").strip()
+SNS_ENTITY_ID = os.getenv("SNS_ENTITY_ID", "").strip()
+SNS_TEMPLATE_ID = os.getenv("SNS_TEMPLATE_ID", "").strip()
+SNS_ORIGINATION_NUMBER = os.getenv("SNS_ORIGINATION_NUMBER", "").strip()
+SNS_DEFAULT_SMS_TYPE = os.getenv("SNS_DEFAULT_SMS_TYPE", "Transactional")
+
+SMS_PROVIDERS = (("twilio", "sns") if OTP_SNS_FAILOVER else ("twilio",)) if TWILIO_ENABLED else ("sns",)
+SMS_PROVIDER = SMS_PROVIDERS[0]
+
+# flows (session item sort keys)
+IDENTIFY = "identify"
+WALKIN = "walkin"
+
+# why a verification failed
+NOT_FOUND = "not_found"
+EXPIRED = "expired"
+TOO_MANY_ATTEMPTS = "too_many_attempts"
+MISMATCH = "mismatch"
+
+OTP_SMS = metrics.register(metrics.Counter(
+    "clinic_otp_sms_total", "OTP SMS send attempts by provider and outcome.", ("provider", "outcome"),
+))
+
+_deser = TypeDeserializer()
+
+
+class OTPRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def gen_code(n: int = OTP_LENGTH) -> str:
+    return str(10 ** (n - 1) + secrets.randbelow(9 * 10 ** (n - 1)))
+
+
+def code_hash(flow: str, phone: str, code: str) -> str:
+    msg = f"{flow}:{phone}:{(code or '').strip()}".encode("utf-8")
+    return hmac.new(OTP_HASH_KEY, msg, hashlib.sha256).hexdigest()
+
+
+# --------------------- sessions ---------------------
+
+def start_session_sync(phone: str, flow: str, user_sub: str = "") -> Tuple[str, str]:
+    """
+    (Re)start the phone's session for `flow` in one conditional write; returns
+    (otpSessionId, code). Raises 429 while the previous code is in cooldown.
+    """
+    now_epoch = int(time.time())
+    session_id = str(uuid.uuid4())
+    code = gen_code()
+    try:
+        clients.table(DDB_TABLE_OTP).update_item(
+            Key={"phone": phone, "sessionId": flow},
+            UpdateExpression=(
+                "SET otpSessionId = :sid, codeHash = :h, userSub = :sub, createdAt = :at, #ttl = :ttl, "
+                "attempts = :z, lastSendAt = :now, delivery = :queued, #ctx = :ctx "
+                "REMOVE #c, deliveryError, provider, providerMessageId, deliveredAt"
+            ),
+            ConditionExpression="attribute_not_exists(lastSendAt) OR lastSendAt <= :edge",
+            ExpressionAttributeNames={"#c": "code", "#ttl": "ttl", "#ctx": "context"},
+            ExpressionAttributeValues={
+                ":sid": session_id,
+                ":h": code_hash(flow, phone, code),
+                ":sub": user_sub or "",
+                ":at": datetime.now(timezone.utc).isoformat(),
+                ":ttl": now_epoch + OTP_TTL_SECONDS,
+                ":z": 0,
+                ":now": now_epoch,
+                ":queued": "queued",
+                ":ctx": flow,
+                ":edge": now_epoch - OTP_RESEND_COOLDOWN,
+            },
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        old = e.response.get("Item") or {}  # typed, even through the resource API
+        last = int((old.get("lastSendAt") or {}).get("N", now_epoch))
+        wait = max(1, OTP_RESEND_COOLDOWN - (now_epoch - last))
+        raise HTTPException(
+            status_code=429,
+            detail=f"Please wait {wait} seconds before requesting a new OTP.",
+        )
+    return session_id, code
+
+
+async def start_session(phone: str, flow: str, user_sub: str = "") -> Tuple[str, str]:
+    """Async start_session_sync."""
+    return await aio.run_blocking(start_session_sync, phone, flow, user_sub)
+
+
+def consume_sync(phone: str, flow: str, code: str, otp_session_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Check the code and delete the session in one write (code hash, TTL,
+    attempts and, when given, otpSessionId in the condition), so two taps on
+    "verify" can't both succeed. Returns the consumed item or raises
+    OTPRejected; only a wrong code costs a second write (attempts + 1).
+    """
+    tbl = clients.table(DDB_TABLE_OTP)
+    now = int(time.time())
+    cond = "codeHash = :h AND #ttl > :now AND attempts < :max"
+    values: Dict[str, Any] = {":h": code_hash(flow, phone, code), ":now": now, ":max": OTP_MAX_ATTEMPTS}
+    if otp_session_id:
+        cond += " AND otpSessionId = :sid"
+        values[":sid"] = otp_session_id
+    try:
+        resp = tbl.delete_item(
+            Key={"phone": phone, "sessionId": flow},
+            ConditionExpression=cond,
+            ExpressionAttributeNames={"#ttl": "ttl"},
+            ExpressionAttributeValues=values,
+            ReturnValues="ALL_OLD",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+        )
+        return resp.get("Attributes") or {}
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        typed = e.response.get("Item")  # typed, even through the resource API
+        old = {k: _deser.deserialize(v) for k, v in typed.items()} if typed else None
+
+    if not old or (otp_session_id and old.get("otpSessionId") != otp_session_id):
+        raise OTPRejected(NOT_FOUND)  # never sent, already used, or replaced by a resend
+    if now >= int(old.get("ttl", 0) or 0):
+        raise OTPRejected(EXPIRED)
+    if int(old.get("attempts", 0) or 0) >= OTP_MAX_ATTEMPTS:
+        raise OTPRejected(TOO_MANY_ATTEMPTS)
+    try:
+        tbl.update_item(
+            Key={"phone": phone, "sessionId": flow},
+            UpdateExpression="ADD attempts :one",
+            ConditionExpression="otpSessionId = :sid",
+            ExpressionAttributeValues={":one": 1, ":sid": old.get("otpSessionId")},
+        )
+    except ClientError:
+        pass  # consumed or replaced meanwhile
+    raise OTPRejected(MISMATCH)
+
+
+async def consume(phone: str, flow: str, code: str, otp_session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Async consume_sync."""
+    return await aio.run_blocking(consume_sync, phone, flow, code, otp_session_id)
+
+
+# --------------------- SMS providers ---------------------
+
+async def _send_twilio(e164: str, text: str) -> Optional[str]:
+    # pooled async transport, shared with WhatsApp per account
+    msg = await twilio_async.client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN).messages.create(
+        body=text, from_=TWILIO_FROM_NUMBER, to=e164, priority=ratelimit.Priority.OTP
+    )
+    return msg.sid
+
+
+def _sns_attributes() -> Dict[str, Dict[str, str]]:
+    attrs = {"AWS.SNS.SMS.SMSType": SNS_DEFAULT_SMS_TYPE}
+    if SNS_SENDER_ID:
+        attrs["AWS.SNS.SMS.SenderID"] = SNS_SENDER_ID
+    if SNS_ORIGINATION_NUMBER:
+        attrs["AWS.SNS.SMS.OriginationNumber"] = SNS_ORIGINATION_NUMBER
+    if SNS_ENTITY_ID:
+        attrs["AWS.MM.SMS.EntityId"] = SNS_ENTITY_ID
+    if SNS_TEMPLATE_ID:
+        attrs["AWS.MM.SMS.TemplateId"] = SNS_TEMPLATE_ID
+    return {k: {"DataType": "String", "StringValue": v} for k, v in attrs.items()}
+
+
+async def _send_sns(e164: str, text: str) -> Optional[str]:
+    await ratelimit.acquire("sns", ratelimit.Priority.OTP)
+    resp = await aio.sns(SNS_REGION).publish(PhoneNumber=e164, Message=text, MessageAttributes=_sns_attributes())
+    return resp.get("MessageId")
+
+
+_SENDERS = {"twilio": _send_twilio, "sns": _send_sns}
+
+
+async def _attempt(provider: str, e164: str, text: str) -> Tuple[str, Optional[str]]:
+    try:
+        mid = await _SENDERS[provider](e164, text)
+    except asyncio.CancelledError:
+        OTP_SMS.inc(provider, "cancelled")
+        raise
+    except Exception:
+        OTP_SMS.inc(provider, "failed")
+        log.warning("OTP SMS via %s failed to %s", provider, e164, exc_info=True)
+        raise
+    OTP_SMS.inc(provider, "sent")
+    return provider, mid
+
+
+async def send_sms(e164: str, text: str) -> Tuple[str, Optional[str]]:
+    """
+    Send one SMS; returns (provider, message id). Fails over from Twilio to SNS
+    on error and hedges with SNS after OTP_HEDGE_AFTER_MS. Raises the last
+    provider error when every provider failed.
+    """
+    primary, *rest = SMS_PROVIDERS
+    first = asyncio.ensure_future(_attempt(primary, e164, text))
+    if not rest:
+        return await first
+    done, _ = await asyncio.wait({first}, timeout=OTP_HEDGE_AFTER_MS / 1000.0)
+    if first in done and first.exception() is None:
+        return first.result()
+    pending = {first} if first not in done else set()
+    pending.add(asyncio.ensure_future(_attempt(rest[0], e164, text)))
+    if first not in done:
+        log.info("OTP SMS via %s slower than %d ms; hedging with %s", primary, OTP_HEDGE_AFTER_MS, rest[0])
+    error: Optional[BaseException] = first.exception() if first in done else None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    return t.result()
+                error = t.exception()
+        raise error
+    finally:
+        for t in pending:
+            t.cancel()
+
+
+async def deliver(phone: str, flow: str, session_id: str, text: str):
+    """Background: send the SMS and record the outcome on the session it belongs to."""
+    values: Dict[str, Any] = {":sid": session_id, ":at": int(time.time())}
+    try:
+        values[":p"], mid = await send_sms(phone, text)
+        values[":m"], values[":d"] = mid or "", "sent"
+        expr = "SET delivery = :d, deliveredAt = :at, provider = :p, providerMessageId = :m"
+    except Exception as e:
+        values[":d"], values[":e"], values[":zero"] = "failed", str(e)[:500], 0
+        # nothing reached the phone: let the kiosk resend without waiting out the cooldown
+        expr = "SET delivery = :d, deliveredAt = :at, deliveryError = :e, lastSendAt = :zero"
+    try:
+        await aio.table(DDB_TABLE_OTP).update_item(
+            Key={"phone": phone, "sessionId": flow},
+            UpdateExpression=expr,
+            ConditionExpression="otpSessionId = :sid",  # a resend may have replaced it
+            ExpressionAttributeValues=values,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            log.warning("Could not record OTP delivery for %s: %s", phone, e)
@@ -4,10 +4,12 @@ from typing import Optional
 from fastapi import APIRouter, Response, Request, HTTPException
 from pydantic import BaseModel, Field
 
+from app import fakes
+
 router = APIRouter(prefix="/kiosk/session", tags=["kiosk-session"])
 
 # --- Config via env ---
-SECRET = (os.getenv("KIOSK_SESSION_SECRET") or "").encode("utf-8")
+SECRET = fakes.secret("KIOSK_SESSION_SECRET", "local-fake-kiosk-session-secret").encode("utf-8")
 if not SECRET:
     # Fail fast in dev; set a strong random value in prod (32+ bytes)
     raise RuntimeError("Set KIOSK_SESSION_SECRET to a strong random secret (32+ bytes)")
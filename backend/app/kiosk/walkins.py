@@ -1,18 +1,18 @@
 import os
 import re
 import uuid
-import time
 import logging
 from datetime import datetime, timezone
 from typing import Optional
 
-import boto3
-from boto3.dynamodb.conditions import Key
-from fastapi import APIRouter, Body, Header, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Body, Header, HTTPException
 from botocore.exceptions import ClientError
 
 from app.auth import cognito as cg
+from app.auth import identity_cache, phone_index
+from app.db import clients
 from app.db.dynamo import patients_table
+from app.kiosk import otp
 from app.models.patients import WalkinRegisterRequest, WalkinRegisterResponse
 
 log = logging.getLogger("kiosk-walkins")
@@ -28,53 +28,18 @@ DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 # Patient-portal profiles table (for seeding)
 PROFILES_TABLE = os.getenv("PROFILES_TABLE", "patient_profiles")
 
-# Shared OTP table (same as identify flow)
-DDB_TABLE_OTP = os.getenv("DDB_TABLE_KIOSK_OTP", "kiosk_otp")
-OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
-OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
-
-# Prefer OTP_LENGTH but support OTP_CODE_LENGTH for backwards compat
-OTP_LENGTH = int(os.getenv("OTP_LENGTH", os.getenv("OTP_CODE_LENGTH", "6")))
-
 # Gate to require OTP for walk-in registration (we actually always enforce OTP below)
 WALKIN_REQUIRE_OTP = (
     os.getenv("WALKIN_REQUIRE_OTP", "false").strip().lower() == "true"
 )
 
-# SMS sending (Twilio or SNS), reused style from identify.py
-try:
-    from twilio.rest import Client as TwilioClient  # type: ignore
-except Exception:
-    TwilioClient = None  # if not installed
-
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID", "").strip()
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN", "").strip()
-TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "").strip()
-TWILIO_ENABLED = bool(
-    TwilioClient and TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER
-)
-
-SMS_PROVIDER = "twilio" if TWILIO_ENABLED else "sns"
-SNS_REGION = os.getenv("SNS_REGION") or AWS_REGION
-SNS_SENDER_ID = os.getenv("SNS_SENDER_ID", "").strip()
-SNS_ENTITY_ID = os.getenv("SNS_ENTITY_ID", "").strip()
-SNS_TEMPLATE_ID = os.getenv("SNS_TEMPLATE_ID", "").strip()
-SNS_ORIGINATION_NUMBER = os.getenv("SNS_ORIGINATION_NUMBER", "").strip()
-SNS_DEFAULT_SMS_TYPE = os.getenv("SNS_DEFAULT_SMS_TYPE", "Transactional")
-
 
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+    return clients.dynamodb()
 
 
 ddb = _ddb()
-otp_table = ddb.Table(DDB_TABLE_OTP)
 profiles_table = ddb.Table(PROFILES_TABLE)
-sns = boto3.client("sns", region_name=SNS_REGION)
-twilio_client = TwilioClient(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN) if TWILIO_ENABLED else None
 
 
 # ---------------- Helpers: basic utils ----------------
@@ -106,7 +71,7 @@ def _user_sub(user: dict) -> Optional[str]:
     return uid if uid else None
 
 
-def _upsert_patient(patient_id: str, e164: str, req: WalkinRegisterRequest):
+def _upsert_patient(patient_id: str, e164: str, req: WalkinRegisterRequest, phone_verified: bool = False):
     now = datetime.now(timezone.utc).isoformat()
     first, last = _split_name(req.name)
     item = {
@@ -121,6 +86,8 @@ def _upsert_patient(patient_id: str, e164: str, req: WalkinRegisterRequest):
         "source": "kiosk",
         "updatedAt": now,
         "createdAt": now,
+        # phone -> patient lookups for identify / appointments (app/auth/phone_index.py)
+        **phone_index.index_attrs(e164, phone_verified),
     }
     patients_table.put_item(Item=item)
 
@@ -201,160 +168,23 @@ def _seed_portal_profile(patient_id: str, e164: str, req: WalkinRegisterRequest)
 
 # ---------------- Helpers: OTP for walk-ins ----------------
 
-def _gen_otp_code(n: int = 6) -> str:
-    lo = 10 ** (n - 1)
-    hi = (10 ** n) - 1
-    import random
-    return str(random.randint(lo, hi))
-
-
-def _send_sms_twilio(e164: str, text: str):
-    if not twilio_client or not TWILIO_FROM_NUMBER:
-        raise HTTPException(status_code=500, detail="Twilio not configured")
-    try:
-        twilio_client.messages.create(body=text, from_=TWILIO_FROM_NUMBER, to=e164)
-    except Exception as e:
-        log.exception("Twilio send failed to %s", e164)
-        raise HTTPException(
-            status_code=500, detail=f"Failed to send OTP via Twilio: {str(e)}"
-        )
-
-
-def _send_sms_sns(e164: str, text: str):
-    attrs = {
-        "AWS.SNS.SMS.SMSType": {
-            "DataType": "String",
-            "StringValue": SNS_DEFAULT_SMS_TYPE,
-        }
-    }
-    if SNS_SENDER_ID:
-        attrs["AWS.SNS.SMS.SenderID"] = {
-            "DataType": "String",
-            "StringValue": SNS_SENDER_ID,
-        }
-    if SNS_ORIGINATION_NUMBER:
-        attrs["AWS.SNS.SMS.OriginationNumber"] = {
-            "DataType": "String",
-            "StringValue": SNS_ORIGINATION_NUMBER,
-        }
-    if SNS_ENTITY_ID:
-        attrs["AWS.MM.SMS.EntityId"] = {
-            "DataType": "String",
-            "StringValue": SNS_ENTITY_ID,
-        }
-    if SNS_TEMPLATE_ID:
-        attrs["AWS.MM.SMS.TemplateId"] = {
-            "DataType": "String",
-            "StringValue": SNS_TEMPLATE_ID,
-        }
-    try:
-        sns.publish(PhoneNumber=e164, Message=text, MessageAttributes=attrs)
-    except Exception as e:
-        log.exception("SNS publish failed to %s", e164)
-        raise HTTPException(
-            status_code=500, detail=f"Failed to send OTP via SNS: {str(e)}"
-        )
-
-
-def _send_sms(e164: str, text: str):
-    if SMS_PROVIDER == "twilio":
-        return _send_sms_twilio(e164, text)
-    return _send_sms_sns(e164, text)
-
-
-def _latest_walkin_session_for_phone(phone: str) -> Optional[dict]:
-    try:
-        resp = otp_table.query(
-            IndexName="GSI1",
-            KeyConditionExpression=Key("phone").eq(phone),
-            ScanIndexForward=False,
-            Limit=1,
-        )
-        items = resp.get("Items", [])
-        return items[0] if items else None
-    except Exception:
-        return None
-
-
-def _put_walkin_otp_session(phone: str, code: str) -> str:
-    now_epoch = int(time.time())
-    ttl_epoch = now_epoch + OTP_TTL_SECONDS
-    session_id = str(uuid.uuid4())
-    item = {
-        "phone": phone,
-        "sessionId": session_id,
-        "code": code,
-        "userSub": "",  # not used for walk-ins
-        "createdAt": datetime.now(timezone.utc).isoformat(),
-        "ttl": ttl_epoch,
-        "attempts": 0,
-        "lastSendAt": now_epoch,
-        "context": "walkin",
-    }
-    otp_table.put_item(Item=item)
-    return session_id
-
-
-def _is_expired(item: dict, now_epoch: Optional[int] = None) -> bool:
-    if not item:
-        return True
-    now_epoch = now_epoch or int(time.time())
-    return now_epoch >= int(item.get("ttl", 0) or 0)
-
-
-def _can_resend(existing: dict, now_epoch: Optional[int] = None) -> bool:
-    """
-    True if we are allowed to resend a *new* OTP code (cooldown passed and not expired).
-    """
-    if not existing:
-        return True
-    now_epoch = now_epoch or int(time.time())
-    if _is_expired(existing, now_epoch):
-        return True
-    last = int(existing.get("lastSendAt", 0) or 0)
-    return (now_epoch - last) >= 45  # uses same 45s cooldown as before
+_OTP_REJECTED = {
+    otp.NOT_FOUND: (400, "OTP session not found or expired"),
+    otp.EXPIRED: (400, "OTP expired"),
+    otp.TOO_MANY_ATTEMPTS: (429, "Too many OTP attempts"),
+    otp.MISMATCH: (400, "Invalid OTP"),
+}
 
 
 def _verify_walkin_otp(phone: str, code: str, otp_session_id: Optional[str]) -> None:
     """
     Verify OTP for walk-in registration. Raises HTTPException on failure.
     """
-    item = None
-    if otp_session_id:
-        try:
-            resp = otp_table.get_item(Key={"phone": phone, "sessionId": otp_session_id})
-            item = resp.get("Item")
-        except Exception:
-            item = None
-    if not item:
-        item = _latest_walkin_session_for_phone(phone)
-    if not item:
-        raise HTTPException(status_code=400, detail="OTP session not found or expired")
-
-    now_epoch = int(time.time())
-    if now_epoch >= int(item.get("ttl", 0)):
-        raise HTTPException(status_code=400, detail="OTP expired")
-
-    attempts = int(item.get("attempts", 0))
-    if attempts >= OTP_MAX_ATTEMPTS:
-        raise HTTPException(status_code=429, detail="Too many OTP attempts")
-
-    if code != str(item.get("code")):
-        try:
-            otp_table.update_item(
-                Key={"phone": item["phone"], "sessionId": item["sessionId"]},
-                UpdateExpression="SET attempts = if_not_exists(attempts, :z) + :one",
-                ExpressionAttributeValues={":z": 0, ":one": 1},
-            )
-        except Exception:
-            pass
-        raise HTTPException(status_code=400, detail="Invalid OTP")
-
-    # Success → delete session (best-effort)
     try:
-        otp_table.delete_item(Key={"phone": item["phone"], "sessionId": item["sessionId"]})
-    except Exception:
-        pass
+        otp.consume_sync(phone, otp.WALKIN, code, otp_session_id)
+    except otp.OTPRejected as e:
+        status, detail = _OTP_REJECTED[e.reason]
+        raise HTTPException(status_code=status, detail=detail)
 
 
 # ---------------- Routes: OTP for walk-ins ----------------
@@ -373,64 +203,25 @@ class WalkinSendOtpResponse(BaseModel):
 
 
 @router.post("/walkins/send-otp", response_model=WalkinSendOtpResponse)
-def walkin_send_otp(payload: WalkinSendOtpRequest):
+def walkin_send_otp(payload: WalkinSendOtpRequest, background: BackgroundTasks):
     """
     Send OTP for walk-in registration. Can be used even before a Cognito user exists.
     5-minute TTL, cooldown between sends, and new code on each allowed resend.
+    Returns after the session write; the SMS is sent in the background and its
+    outcome recorded on the session (delivery / providerMessageId / deliveryError).
     """
     phone = _norm_e164(payload.mobile, payload.countryCode or "+91")
     if not phone:
         raise HTTPException(status_code=400, detail="Invalid phone number")
 
-    now_epoch = int(time.time())
-    existing = _latest_walkin_session_for_phone(phone)
-
-    # If we have a non-expired session and cooldown not passed → block resend
-    if existing and not _is_expired(existing, now_epoch):
-        last = int(existing.get("lastSendAt", 0) or 0)
-        elapsed = now_epoch - last
-        if elapsed < 45:  # same cooldown as _can_resend
-            wait = 45 - elapsed
-            raise HTTPException(
-                status_code=429,
-                detail=f"Please wait {wait} seconds before requesting a new OTP.",
-            )
-
-    # Decide whether to rotate existing session or create a new one
-    if existing and not _is_expired(existing, now_epoch) and _can_resend(existing, now_epoch):
-        code = _gen_otp_code(OTP_LENGTH)
-        ttl_epoch = now_epoch + OTP_TTL_SECONDS
-        try:
-            otp_table.update_item(
-                Key={"phone": existing["phone"], "sessionId": existing["sessionId"]},
-                UpdateExpression=(
-                    "SET #c = :c, #ls = :ls, #ttl = :ttl, attempts = :z"
-                ),
-                ExpressionAttributeNames={
-                    "#c": "code",
-                    "#ls": "lastSendAt",
-                    "#ttl": "ttl",
-                },
-                ExpressionAttributeValues={
-                    ":c": code,
-                    ":ls": now_epoch,
-                    ":ttl": ttl_epoch,
-                    ":z": 0,
-                },
-                ConditionExpression="attribute_exists(phone) AND attribute_exists(sessionId)",
-            )
-            session_id = existing["sessionId"]
-        except Exception:
-            log.exception("Walkin OTP update failed; creating new session")
-            code = _gen_otp_code(OTP_LENGTH)
-            session_id = _put_walkin_otp_session(phone, code)
-    else:
-        code = _gen_otp_code(OTP_LENGTH)
-        session_id = _put_walkin_otp_session(phone, code)
-
-    _send_sms(
+    session_id, code = otp.start_session_sync(phone, otp.WALKIN)
+    # the kiosk shows the code entry screen now; the SMS goes out after the response
+    background.add_task(
+        otp.deliver,
         phone,
-        f"{code} is your MedMitra verification code for walk-in registration. It expires in {OTP_TTL_SECONDS // 60} min.",
+        otp.WALKIN,
+        session_id,
+        f"{code} is your MedMitra verification code for walk-in registration. It expires in {otp.OTP_TTL_SECONDS // 60} min.",
     )
 
     return WalkinSendOtpResponse(otpSessionId=session_id, normalizedPhone=phone)
@@ -495,11 +286,18 @@ def walkin_register(
         raise HTTPException(status_code=500, detail="Could not determine patientId (sub)")
 
     try:
-        _upsert_patient(patient_id, e164, payload)
+        verified = any(
+            a.get("Name") == "phone_number_verified" and str(a.get("Value")).lower() == "true"
+            for a in user.get("Attributes") or user.get("UserAttributes") or []  # list_users / admin_get_user
+        )
+        _upsert_patient(patient_id, e164, payload, phone_verified=verified)
     except ClientError as e:
         msg = e.response["Error"].get("Message", str(e))
         raise HTTPException(status_code=500, detail=f"DynamoDB error: {msg}")
 
+    # identify / appointment lists may hold "unknown phone" or an old name for this patient
+    identity_cache.invalidate(phone=e164, sub=patient_id)
+
     # Best-effort: seed a minimal patient-portal profile for this walk-in
     _seed_portal_profile(patient_id, e164, payload)
 
@@ -4,11 +4,11 @@ import logging
 import uuid
 from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
-import boto3
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Query, Body
 from pydantic import BaseModel, Field, constr
+from app.db import clients
 from app.notifications.whatsapp import send_lab_booking_confirmation
 from zoneinfo import ZoneInfo
 
@@ -22,10 +22,7 @@ DDB_TABLE_APPTS = os.getenv("DDB_TABLE_APPOINTMENTS", "medmitra-appointments")
 DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    return boto3.resource("dynamodb", **kw)
+    return clients.dynamodb()
 
 tbl_appts = _ddb().Table(DDB_TABLE_APPTS)
 
@@ -127,10 +124,10 @@ def list_lab_bookings_for_patient(
         status = str(payment.get("status") or "").lower()
         paid = status in ("paid", "captured", "success")
 
-        # Existing token best-effort: if you already store it on the row
-        # under kiosk.tokenNo or similar, read it. For now we keep this simple.
+        # Existing token: check-in writes tokenNo back onto the appointment row
+        # (older rows may carry it under kiosk.tokenNo).
         kiosk = it.get("kiosk") or {}
-        existing_token = kiosk.get("tokenNo") or kiosk.get("token") or None
+        existing_token = it.get("tokenNo") or kiosk.get("tokenNo") or kiosk.get("token") or None
 
         out.append(
             LabBookingSummary(
@@ -228,6 +225,7 @@ def create_walkin_lab_booking(payload: WalkinLabBookingRequest = Body(...)):
                 patient_name="",   # unknown here; fine to leave blank
                 when_local=now_local,
                 site_id=site_id,
+                message_id=f"lab-booking#{appointment_id}",
             )
     except Exception:
         log.warning("Failed to send WhatsApp lab booking confirmation", exc_info=True)
@@ -2,10 +2,13 @@ import os
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from app import metrics  # noqa: E402  (reads METRICS_* from .env)
+
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("clinic-os")
 
@@ -48,6 +51,9 @@ else:
     )
     log.warning("CORS permissive (demo mode): allow_origin_regex='.*', credentials=FALSE")
 
+# Outermost, so latency includes CORS handling; served at /metrics below.
+app.add_middleware(metrics.MetricsMiddleware)
+
 # -------------------------
 # Health & root
 # -------------------------
@@ -59,6 +65,10 @@ def root():
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
@@ -81,6 +91,8 @@ _mount("app.kiosk.walkins:router", "/api", "kiosk walkins")
 _mount("app.kiosk.identify:router", "/api", "kiosk identify")
 _mount("app.kiosk.session:router", "/api", "kiosk session")
 _mount("app.queue.router:router", "/api", "queue & tokens")
+_mount("app.queue.push:router", "/api", "queue push (SSE/WebSocket)")
+_mount("app.queue.lifecycle:router", "/api", "queue lifecycle")
 
 # appointments
 _mount("app.appointments.availability:router", "/api", "appointments availability")
@@ -109,6 +121,33 @@ def _log_routes():
         path = getattr(r, "path", "")
         log.info("ROUTE %-12s %s", methods, path)
 
+# -------------------------
+# Notification outbox: drain in the background (app/notifications/outbox.py)
+# -------------------------
+@app.on_event("startup")
+async def _start_outbox():
+    from app.notifications import outbox, whatsapp  # noqa: F401  (registers the handlers)
+    await outbox.dispatcher.start()
+
+@app.on_event("shutdown")
+async def _stop_outbox():
+    from app.notifications import outbox, twilio_async
+    await outbox.dispatcher.stop()
+    await twilio_async.close_all()
+
+# -------------------------
+# 2h reminders: one worker holds the scheduler lease (app/notifications/reminders.py)
+# -------------------------
+@app.on_event("startup")
+async def _start_reminders():
+    from app.notifications import reminders
+    await reminders.scheduler.start()
+
+@app.on_event("shutdown")
+async def _stop_reminders():
+    from app.notifications import reminders
+    await reminders.scheduler.stop()
+
 # -------------------------
 # Entrypoint
 # -------------------------
@@ -0,0 +1,316 @@
+# backend/app/metrics.py
+"""
+Prometheus text-format metrics without an extra dependency.
+
+- MetricsMiddleware: per-route latency histogram + in-flight gauge.
+- instrument_boto(): botocore event hooks timing every AWS call and, for
+  DynamoDB, asking for ReturnConsumedCapacity=TOTAL and counting the units.
+- twilio_http_client() / razorpay_session(): timed transports for the two
+  non-AWS vendors.
+
+Everything here is process-local; with several uvicorn workers each worker
+exposes its own /metrics and Prometheus sums them.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Tuple
+
+METRICS_ENABLED = (os.getenv("METRICS_ENABLED", "1").strip() != "0")
+# Ask DynamoDB for consumed capacity on every call (a few bytes per response).
+METRICS_DDB_CAPACITY = (os.getenv("METRICS_DDB_CAPACITY", "1").strip() != "0")
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DOWNSTREAM_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+LabelKey = Tuple[str, ...]
+
+
+def _fmt_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    parts = []
+    for n, v in zip(names, values):
+        v = str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{n}="{v}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[LabelKey, float] = {}
+
+    def add(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set(self, *labels: str, value: float):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_fmt_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_: str, labels: Tuple[str, ...] = (), buckets=HTTP_BUCKETS):
+        super().__init__(name, help_, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, *labels: str, value: float):
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                row = self._values[labels] = [0.0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+            row[-2] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        out = self.header()
+        names = self.labels + ("le",)
+        for k, row in items:
+            for i, b in enumerate(self.buckets):
+                out.append(f"{self.name}_bucket{_fmt_labels(names, k + (repr(b),))} {row[i]}")
+            out.append(f"{self.name}_bucket{_fmt_labels(names, k + ('+Inf',))} {row[-2]}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {row[-2]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {row[-1]}")
+        return out
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+HTTP_LATENCY = Histogram(
+    "clinic_http_request_duration_seconds", "HTTP request latency by route.",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge(
+    "clinic_http_requests_in_flight", "Requests currently being served.", ("method",),
+)
+DOWNSTREAM_LATENCY = Histogram(
+    "clinic_downstream_call_duration_seconds",
+    "Latency of calls to AWS / Twilio / Razorpay by service and operation.",
+    ("service", "operation", "outcome"), buckets=DOWNSTREAM_BUCKETS,
+)
+DDB_CAPACITY = Counter(
+    "clinic_dynamodb_consumed_capacity_units_total",
+    "DynamoDB capacity units reported via ReturnConsumedCapacity.",
+    ("table", "operation"),
+)
+
+_ALL = [HTTP_LATENCY, HTTP_IN_FLIGHT, DOWNSTREAM_LATENCY, DDB_CAPACITY]
+
+
+def register(metric: _Metric) -> _Metric:
+    """Expose an additional metric (queue depth, cache hits, ...) on /metrics."""
+    if metric not in _ALL:
+        _ALL.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _ALL:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+def observe_downstream(service: str, operation: str, seconds: float, outcome: str = "ok"):
+    if METRICS_ENABLED:
+        DOWNSTREAM_LATENCY.observe(service, operation, outcome, value=seconds)
+
+
+# ---------------------------------------------------------------------------
+# HTTP middleware (pure ASGI so streaming responses are timed to completion)
+# ---------------------------------------------------------------------------
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[Any, str] = {}
+
+    def _route_label(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            app = scope.get("app")
+            for r in getattr(app, "routes", []):
+                if getattr(r, "endpoint", None) is endpoint:
+                    path = r.path
+                    break
+            path = self._route_paths.setdefault(endpoint, path or "unmatched")
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope.get("method", "")
+        status = {"code": 500}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.add(method, amount=1)
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_IN_FLIGHT.add(method, amount=-1)
+            HTTP_LATENCY.observe(
+                method, self._route_label(scope), str(status["code"]),
+                value=time.perf_counter() - t0,
+            )
+
+
+# ---------------------------------------------------------------------------
+# botocore hooks
+# ---------------------------------------------------------------------------
+def _record_capacity(op: str, parsed: Dict[str, Any]):
+    cc = parsed.get("ConsumedCapacity") if isinstance(parsed, dict) else None
+    if not cc:
+        return
+    for entry in (cc if isinstance(cc, list) else [cc]):
+        units = entry.get("CapacityUnits")
+        if units:
+            DDB_CAPACITY.inc(entry.get("TableName", ""), op, amount=float(units))
+
+
+def _before_call(model, context, **kw):
+    context["_metrics"] = (time.perf_counter(), model.service_model.service_name, model.name)
+
+
+def _after_call(parsed, context, **kw):
+    started = context.pop("_metrics", None)
+    if started is None:
+        return
+    t0, service, op = started
+    err = parsed.get("Error", {}).get("Code") if isinstance(parsed, dict) else None
+    observe_downstream(service, op, time.perf_counter() - t0, err or "ok")
+    if service == "dynamodb":
+        _record_capacity(op, parsed)
+
+
+def _after_call_error(context, exception=None, **kw):
+    # network / timeout failures: no parsed response, no model
+    started = context.pop("_metrics", None)
+    if started is not None:
+        t0, service, op = started
+        observe_downstream(service, op, time.perf_counter() - t0,
+                           type(exception).__name__ if exception else "error")
+
+
+def _ask_capacity(params, model, **kw):
+    if "ReturnConsumedCapacity" in model.input_shape.members:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def instrument_boto(obj):
+    """Attach timing hooks to a boto3 client or resource (idempotent)."""
+    if not METRICS_ENABLED:
+        return obj
+    client = getattr(getattr(obj, "meta", None), "client", None) or obj
+    events = client.meta.events
+    service = client.meta.service_model.service_name
+    events.register("before-call.*.*", _before_call, unique_id="clinic-metrics-before")
+    events.register("after-call.*.*", _after_call, unique_id="clinic-metrics-after")
+    events.register("after-call-error.*.*", _after_call_error, unique_id="clinic-metrics-error")
+    if service == "dynamodb" and METRICS_DDB_CAPACITY:
+        events.register("provide-client-params.dynamodb.*", _ask_capacity,
+                        unique_id="clinic-metrics-capacity")
+    return obj
+
+
+# ---------------------------------------------------------------------------
+# Twilio / Razorpay transports
+# ---------------------------------------------------------------------------
+def _op_from_url(method: str, url: str) -> str:
+    path = url.split("?", 1)[0].rstrip("/")
+    last = path.rsplit("/", 1)[-1]
+    if last.endswith(".json"):
+        last = last[:-5]
+    # ids (SM..., pay_...) are high-cardinality; keep the collection name
+    if any(c.isdigit() for c in last):
+        last = path.rsplit("/", 2)[-2] if path.count("/") >= 2 else last
+    return f"{method.upper()} {last}"
+
+
+def twilio_http_client(**kw):
+    """TwilioHttpClient that reports each request to DOWNSTREAM_LATENCY."""
+    from twilio.http.http_client import TwilioHttpClient
+
+    class _TimedTwilioHttpClient(TwilioHttpClient):
+        def request(self, method, url, *a, **kwargs):
+            t0 = time.perf_counter()
+            outcome = "error"
+            try:
+                resp = super().request(method, url, *a, **kwargs)
+                outcome = "ok" if resp.status_code < 400 else str(resp.status_code)
+                return resp
+            finally:
+                observe_downstream("twilio", _op_from_url(method, url), time.perf_counter() - t0, outcome)
+
+    return _TimedTwilioHttpClient(**kw)
+
+
+def razorpay_session():
+    """requests.Session whose responses are timed as downstream razorpay calls."""
+    import requests
+
+    session = requests.Session()
+
+    def _hook(resp, *a, **kw):
+        outcome = "ok" if resp.status_code < 400 else str(resp.status_code)
+        observe_downstream(
+            "razorpay", _op_from_url(resp.request.method, resp.request.url),
+            resp.elapsed.total_seconds(), outcome,
+        )
+
+    session.hooks["response"].append(_hook)
+    return session
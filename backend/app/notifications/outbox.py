@@ -0,0 +1,383 @@
+# backend/app/notifications/outbox.py
+"""
+Durable outbox for patient notifications.
+
+Request handlers no longer talk to Twilio: `enqueue()` writes one item to the
+outbox table (a few ms, conditional on the messageId so a retried request
+never queues the same message twice) and returns. A per-worker Dispatcher
+drains the table in the background:
+
+- newly enqueued items are handed to the local workers at once; a poll of the
+  sparse StatusDue index (status HASH, dueAt RANGE) every OUTBOX_POLL_SEC picks
+  up retries, items enqueued by other workers and anything a crashed worker
+  left behind;
+- a worker claims an item with one conditional update (status pending and
+  due) that pushes dueAt out by OUTBOX_LEASE_SEC, so two workers never send
+  the same message at once and a crash mid-send just lets the lease lapse;
+- the handler runs (async handlers on the loop, sync ones on a worker
+  thread); True -> sent, False -> skipped (no
+  phone, WhatsApp disabled), an exception -> retried after
+  OUTBOX_BACKOFF_SEC * 2^(attempt-1) (+ jitter), or dead-lettered after
+  OUTBOX_MAX_ATTEMPTS or on PermanentError.
+
+Sent / skipped items drop out of the index and expire via the expireAt TTL;
+dead items stay in it under status "dead" for scripts/outbox_redrive.py.
+Delivery is at-least-once: a worker that dies between Twilio accepting a
+message and recording it will send that message again after the lease.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from app import metrics
+from app.db import aio, clients
+from app.notifications import ratelimit
+from app.util.datetime import now_utc_iso
+
+log = logging.getLogger("outbox")
+
+DDB_TABLE_OUTBOX = os.getenv("DDB_TABLE_OUTBOX", "medmitra_outbox")
+OUTBOX_INDEX = os.getenv("OUTBOX_INDEX", "StatusDue")
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))            # per uvicorn worker; 0 = don't drain here
+OUTBOX_POLL_SEC = float(os.getenv("OUTBOX_POLL_SEC", "5"))
+OUTBOX_LEASE_SEC = int(os.getenv("OUTBOX_LEASE_SEC", "60"))       # claim length; > slowest send
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_SEC = int(os.getenv("OUTBOX_BACKOFF_SEC", "5"))    # doubles per attempt
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+
+PENDING, SENT, SKIPPED, DEAD = "pending", "sent", "skipped", "dead"
+RETRY = "retry"  # outcome only; the item stays pending
+
+OUTBOX_MESSAGES = metrics.register(metrics.Counter(
+    "clinic_outbox_messages_total", "Outbox deliveries by kind and outcome.", ("kind", "outcome"),
+))
+OUTBOX_LAG = metrics.register(metrics.Histogram(
+    "clinic_outbox_delivery_lag_seconds", "Enqueue to final delivery attempt.", ("kind",),
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0),
+))
+
+
+class PermanentError(Exception):
+    """Raised by a handler when retrying cannot help (bad number, rejected template)."""
+
+
+_handlers: Dict[str, Callable[..., bool]] = {}
+_priorities: Dict[str, ratelimit.Priority] = {}
+
+
+def handler(kind: str, priority: ratelimit.Priority = ratelimit.Priority.BOOKING):
+    """
+    Register `fn(**kwargs) -> bool` (sync, or async on the event loop) as the
+    sender for `kind`; its sends take provider tokens at `priority`.
+    """
+    def deco(fn):
+        _handlers[kind] = fn
+        _priorities[kind] = priority
+        return fn
+    return deco
+
+
+# --------------------- args encoding ---------------------
+
+def _default(v: Any):
+    if isinstance(v, datetime):
+        return {"$dt": v.isoformat()}
+    raise TypeError(f"not JSON serializable: {type(v).__name__}")
+
+
+def _hook(d: Dict[str, Any]):
+    if set(d) == {"$dt"}:
+        return datetime.fromisoformat(d["$dt"])
+    return d
+
+
+def _dumps(kwargs: Dict[str, Any]) -> str:
+    return json.dumps(kwargs, default=_default, separators=(",", ":"), ensure_ascii=False)
+
+
+def _loads(raw: str) -> Dict[str, Any]:
+    return json.loads(raw or "{}", object_hook=_hook)
+
+
+# --------------------- enqueue ---------------------
+
+def enqueue(kind: str, kwargs: Dict[str, Any], message_id: Optional[str] = None, delay_sec: int = 0) -> bool:
+    """
+    Durably queue `kind(**kwargs)`; blocking (one PutItem), call via aio.run_blocking
+    from async code. A repeated `message_id` is a no-op that still returns True.
+    If the outbox can't be written the message is sent inline instead.
+    """
+    if kind not in _handlers:
+        raise KeyError(f"no outbox handler for {kind!r}")
+    now = int(time.time())
+    item = {
+        "messageId": message_id or f"{kind}#{os.urandom(8).hex()}",
+        "kind": kind,
+        "args": _dumps(kwargs),
+        "status": PENDING,
+        "dueAt": now + max(0, int(delay_sec)),
+        "attempts": 0,
+        "createdAt": now_utc_iso(),
+        "enqueuedAt": now,
+        "expireAt": now + OUTBOX_RETENTION_DAYS * 86400,
+    }
+    try:
+        clients.table(DDB_TABLE_OUTBOX).put_item(
+            Item=item, ConditionExpression="attribute_not_exists(messageId)",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            log.info("outbox: %s already queued", item["messageId"])
+            return True
+        # outbox unavailable: keep the old behaviour rather than drop the message
+        log.warning("outbox put failed for %s; sending inline", item["messageId"], exc_info=True)
+        return _call_inline(kind, kwargs)
+    if not delay_sec:
+        dispatcher.notify(item["messageId"])
+    return True
+
+
+_inline: Set[asyncio.Task] = set()  # fallback sends started on the loop thread
+
+
+async def _send_inline(kind: str, kwargs: Dict[str, Any]) -> bool:
+    try:
+        return bool(await _call(kind, _handlers[kind], kwargs))
+    except Exception:
+        log.exception("inline send failed for %s", kind)
+        return False
+
+
+def _call_inline(kind: str, kwargs: Dict[str, Any]) -> bool:
+    """
+    enqueue()'s fallback: send now, on the app's event loop, where the
+    rate-limit buckets and pooled Twilio sessions live.
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None:
+        # called on the loop thread itself: blocking on the loop would deadlock, so send in the background
+        task = running.create_task(_send_inline(kind, kwargs))
+        _inline.add(task)
+        task.add_done_callback(_inline.discard)
+        return True
+    loop = dispatcher.loop
+    if loop is not None and loop.is_running():
+        try:
+            return asyncio.run_coroutine_threadsafe(_send_inline(kind, kwargs), loop).result(OUTBOX_LEASE_SEC)
+        except Exception:
+            log.exception("inline send failed for %s", kind)
+            return False
+    # no app loop in this process (scripts): a private one is the only loop there is
+    return asyncio.run(_send_inline(kind, kwargs))
+
+
+async def _call(kind: str, fn: Callable[..., Any], kwargs: Dict[str, Any]) -> Any:
+    with ratelimit.priority(_priorities.get(kind, ratelimit.Priority.BOOKING)):
+        if asyncio.iscoroutinefunction(fn):
+            return await fn(**kwargs)
+        return await aio.run_blocking(fn, **kwargs)
+
+
+# --------------------- delivery ---------------------
+
+def _backoff(attempts: int) -> int:
+    base = OUTBOX_BACKOFF_SEC * (2 ** max(0, attempts - 1))
+    return int(base + random.uniform(0, base / 2))
+
+
+async def _claim(tbl: aio.AsyncTable, message_id: str) -> Optional[Dict[str, Any]]:
+    now = int(time.time())
+    try:
+        resp = await tbl.update_item(
+            Key={"messageId": message_id},
+            UpdateExpression="SET dueAt = :lease ADD attempts :one",
+            ConditionExpression="#s = :pending AND dueAt <= :now",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":lease": now + OUTBOX_LEASE_SEC, ":one": 1, ":pending": PENDING, ":now": now,
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return None  # another worker has it, or it is no longer due
+        raise
+    return resp.get("Attributes")
+
+
+async def _finish(tbl: aio.AsyncTable, item: Dict[str, Any], status: str, error: Optional[str] = None,
+                  retry_in: Optional[int] = None):
+    """Record the outcome; conditioned on our lease so a lapsed claim can't overwrite a newer one."""
+    kw: Dict[str, Any] = {}
+    values: Dict[str, Any] = {":lease": item["dueAt"], ":at": now_utc_iso()}
+    if retry_in is not None:
+        expr = "SET dueAt = :due, lastError = :err, lastAttemptAt = :at"
+        values.update({":due": int(time.time()) + retry_in, ":err": (error or "")[:500]})
+    elif status == DEAD:
+        # keeps dueAt: dead letters stay queryable on the index under status "dead"
+        expr = "SET #s = :st, lastError = :err, lastAttemptAt = :at"
+        values.update({":st": status, ":err": (error or "")[:500]})
+        kw["ExpressionAttributeNames"] = {"#s": "status"}
+    else:
+        expr = "SET #s = :st, lastAttemptAt = :at REMOVE dueAt"
+        values[":st"] = status
+        kw["ExpressionAttributeNames"] = {"#s": "status"}
+    try:
+        await tbl.update_item(
+            Key={"messageId": item["messageId"]},
+            UpdateExpression=expr,
+            ConditionExpression="dueAt = :lease",
+            ExpressionAttributeValues=values,
+            **kw,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        log.warning("outbox: lease on %s lapsed before it was recorded", item["messageId"])
+
+
+async def deliver(message_id: str) -> Optional[str]:
+    """Claim and send one message; returns the outcome, or None if it wasn't ours to send."""
+    tbl = aio.table(DDB_TABLE_OUTBOX)
+    item = await _claim(tbl, message_id)
+    if item is None:
+        return None
+    kind = item.get("kind", "")
+    attempts = int(item.get("attempts", 1))
+    fn = _handlers.get(kind)
+    retry_in = None
+    error = None
+    try:
+        if fn is None:
+            raise PermanentError(f"no handler for {kind!r}")
+        outcome = SENT if await _call(kind, fn, _loads(item.get("args"))) else SKIPPED
+    except PermanentError as e:
+        outcome, error = DEAD, str(e)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            outcome = DEAD
+        else:
+            outcome, retry_in = RETRY, _backoff(attempts)
+    if outcome == DEAD:
+        log.error("outbox: %s dead after %d attempt(s): %s", message_id, attempts, error)
+    elif retry_in is not None:
+        log.warning("outbox: %s attempt %d failed (%s); retry in %ds", message_id, attempts, error, retry_in)
+    await _finish(tbl, item, outcome, error, retry_in)
+    OUTBOX_MESSAGES.inc(kind, outcome)
+    if outcome != RETRY and item.get("enqueuedAt") is not None:
+        OUTBOX_LAG.observe(kind, value=max(0.0, time.time() - float(item["enqueuedAt"])))
+    return outcome
+
+
+async def due_ids(limit: int = 100) -> List[str]:
+    """messageIds of pending items whose dueAt has passed (one StatusDue query)."""
+    resp = await aio.table(DDB_TABLE_OUTBOX).query(
+        IndexName=OUTBOX_INDEX,
+        KeyConditionExpression=Key("status").eq(PENDING) & Key("dueAt").lte(int(time.time())),
+        Limit=limit,
+    )
+    return [it["messageId"] for it in resp.get("Items", [])]
+
+
+class Dispatcher:
+    """Background drain: OUTBOX_WORKERS senders fed by enqueue() and a periodic poll."""
+
+    def __init__(self, workers: int = OUTBOX_WORKERS):
+        self.workers = workers
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self, message_id: str):
+        """Hand a fresh item to the local workers; safe from any thread, no-op when not running."""
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._offer, message_id)
+        except RuntimeError:
+            pass  # loop shutting down; the poll of the next worker picks it up
+
+    def _offer(self, message_id: str):
+        if self._queue is None or message_id in self._queued:
+            return
+        self._queued.add(message_id)
+        self._queue.put_nowait(message_id)
+
+    async def _worker(self):
+        while True:
+            message_id = await self._queue.get()
+            try:
+                await deliver(message_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("outbox: delivering %s failed", message_id, exc_info=True)
+            finally:
+                self._queued.discard(message_id)
+
+    async def _poll(self):
+        while True:
+            try:
+                for message_id in await due_ids():
+                    self._offer(message_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("outbox poll failed", exc_info=True)
+            await asyncio.sleep(OUTBOX_POLL_SEC)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self.loop = asyncio.get_running_loop()  # also where enqueue()'s inline fallback sends
+        if self.workers <= 0:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [self.loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(self.loop.create_task(self._poll()))
+        log.info("outbox dispatcher: %d workers on %s", self.workers, DDB_TABLE_OUTBOX)
+
+    async def stop(self):
+        """Stop draining; claimed-but-unfinished items are retried by any worker once their lease lapses."""
+        tasks, self._tasks = self._tasks, []
+        self.loop = None
+        for t in tasks:
+            t.cancel()
+        for t in tasks:
+            try:
+                await t
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def drain(self) -> Dict[str, int]:
+        """Deliver everything due now in this task (scripts, budgets); returns outcome counts."""
+        out: Dict[str, int] = {}
+        while True:
+            ids = await due_ids()
+            if not ids:
+                return out
+            claimed = False
+            for message_id in ids:
+                outcome = await deliver(message_id)
+                if outcome:
+                    out[outcome] = out.get(outcome, 0) + 1
+                    claimed = True
+            if not claimed:
+                return out
+
+
+dispatcher = Dispatcher()
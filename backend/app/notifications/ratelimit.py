@@ -0,0 +1,148 @@
+# backend/app/notifications/ratelimit.py
+"""
+Outbound message rate limiter: one token bucket per provider sender, with
+priorities.
+
+Twilio queues (and eventually rejects) anything above a sender's MPS, and
+SNS throttles SMS per account, so a burst of reminders could push a
+patient's OTP seconds back in the provider's queue. Every outbound send
+(twilio_async.client() messages, SNS OTP publishes) first takes a token here:
+
+- buckets refill at the provider rate (MSG_RATE_*), up to one second's
+  worth of burst;
+- waiters are served strictly by priority (OTP > check-in > booking >
+  reminder), FIFO within a priority;
+- booking confirmations and reminders may not take the last MSG_RATE_RESERVE
+  of a bucket, so an OTP arriving during a reminder burst normally gets a
+  token at once instead of waiting for a refill.
+
+The priority comes from the `priority=` argument or, when omitted, from the
+surrounding `with priority(...)` (the outbox sets it per message kind).
+Limits are per process: with several uvicorn workers, divide the provider's
+limit by the worker count.
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+
+from app import metrics
+
+MSG_RATE_TWILIO_SMS = float(os.getenv("MSG_RATE_TWILIO_SMS", "10"))            # msgs/sec per sender number
+MSG_RATE_TWILIO_WHATSAPP = float(os.getenv("MSG_RATE_TWILIO_WHATSAPP", "20"))  # msgs/sec per WhatsApp sender
+MSG_RATE_SNS_SMS = float(os.getenv("MSG_RATE_SNS_SMS", "20"))                  # SNS SMS TPS for the account
+MSG_RATE_RESERVE = float(os.getenv("MSG_RATE_RESERVE", "0.2"))                 # bucket share kept for OTP / check-in
+
+
+class Priority(IntEnum):
+    OTP = 0
+    CHECKIN = 1
+    BOOKING = 2
+    REMINDER = 3
+
+
+_current: contextvars.ContextVar[Priority] = contextvars.ContextVar("msg_priority", default=Priority.BOOKING)
+
+RATE_WAIT = metrics.register(metrics.Histogram(
+    "clinic_outbound_rate_wait_seconds", "Time outbound messages waited for a provider token.",
+    ("provider", "priority"), buckets=metrics.DOWNSTREAM_BUCKETS,
+))
+
+
+@contextlib.contextmanager
+def priority(p: Priority):
+    """Default priority for sends made inside this block (and tasks/threads it starts)."""
+    tok = _current.set(Priority(p))
+    try:
+        yield
+    finally:
+        _current.reset(tok)
+
+
+class Bucket:
+    def __init__(self, rate: float, burst: Optional[float] = None, reserve: float = MSG_RATE_RESERVE):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self.reserve = self.burst * reserve
+        self.tokens = self.burst
+        self._stamp = time.monotonic()
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _floor(self, p: int) -> float:
+        return 0.0 if p <= Priority.CHECKIN else self.reserve
+
+    def _take(self, p: int) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        if self.tokens - self._floor(p) >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def _wake(self):
+        """Grant tokens to waiters in priority order, then arm a timer for the next one."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            p, _, fut = self._waiters[0]
+            if fut.done():  # cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if not self._take(p):
+                break
+            heapq.heappop(self._waiters)
+            fut.set_result(None)
+        if self._waiters:
+            p = self._waiters[0][0]
+            delay = (1.0 + self._floor(p) - self.tokens) / self.rate
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.001), self._wake)
+
+    async def acquire(self, p: Priority) -> float:
+        """Wait for a token; returns seconds waited."""
+        if not self._waiters and self._take(p):
+            return 0.0
+        t0 = time.monotonic()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(p), next(self._seq), fut))
+        self._wake()
+        await fut
+        return time.monotonic() - t0
+
+
+_buckets: Dict[str, Bucket] = {}
+
+
+def _rate_for(provider: str) -> float:
+    if provider.startswith("twilio-whatsapp"):
+        return MSG_RATE_TWILIO_WHATSAPP
+    if provider.startswith("twilio"):
+        return MSG_RATE_TWILIO_SMS
+    return MSG_RATE_SNS_SMS
+
+
+def provider_key(service: str, sender: Optional[str] = None) -> str:
+    """Bucket name: "twilio-sms:+1...", "twilio-whatsapp:whatsapp:+91...", "sns"."""
+    if service == "twilio":
+        kind = "twilio-whatsapp" if (sender or "").startswith("whatsapp:") else "twilio-sms"
+        return f"{kind}:{sender or ''}"
+    return service
+
+
+async def acquire(provider: str, p: Optional[Priority] = None) -> float:
+    """Take one send token for `provider` at priority `p` (default: the current priority())."""
+    p = Priority(p if p is not None else _current.get())
+    b = _buckets.get(provider)
+    if b is None:
+        b = _buckets.setdefault(provider, Bucket(_rate_for(provider)))
+    waited = await b.acquire(p)
+    RATE_WAIT.observe(provider.split(":", 1)[0], p.name.lower(), value=waited)
+    return waited
@@ -0,0 +1,414 @@
+# backend/app/notifications/reminders.py
+"""
+Two-hour WhatsApp reminders for doctor and lab appointments.
+
+Bookings with a concrete date and HH:mm slot carry two extra attributes,
+written by the booking routes (reminder_keys()):
+
+    reminderDay = "YYYY-MM-DD"   (HASH of the sparse ReminderIndex GSI)
+    reminderAt  = epoch seconds of the appointment (RANGE)
+
+so the scheduler reads one index partition per day instead of scanning
+medmitra-appointments; cancelling an appointment removes both attributes.
+
+One worker at a time is the scheduler (a lease on the counters table, renewed
+every REMINDER_LEASE_SEC / 3). While it holds the lease it:
+
+- every REMINDER_LOAD_EVERY_SEC, queries today's and tomorrow's partitions
+  and (re)places each reminder at reminderAt - REMINDER_LEAD_MIN in a
+  hierarchical timing wheel (1 s ticks; 64 slots per level, 3 levels ~ 3 days),
+  so adding, moving and firing a reminder is O(1) however many are pending;
+- each second, takes the reminders that came due and, REMINDER_BATCH at a
+  time, re-reads their appointments with one BatchGetItem (skipping
+  cancelled, already checked-in or moved ones) and queues the messages in
+  the outbox (app/notifications/outbox.py).
+
+Nothing but the lease is persisted: after a restart or a lease handover the
+new scheduler reloads the index, firing reminders whose time passed less
+than REMINDER_GRACE_MIN ago. Each reminder's outbox messageId is
+"reminder2h#<appointmentId>#<reminderAt>", so a reminder that was already
+queued before the restart is not queued again. Within one leadership the
+scheduler remembers what it fired over the grace window, so the periodic
+reloads don't place those reminders again.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+import anyio
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+from app import metrics
+from app.db import aio, clients
+from app.db.dynamo import DDB_TABLE_APPOINTMENTS
+from app.notifications.whatsapp import send_doctor_reminder_2h, send_lab_reminder_2h
+
+log = logging.getLogger("reminders")
+
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "1").strip() != "0"
+REMINDER_INDEX = os.getenv("REMINDER_INDEX", "ReminderIndex")
+REMINDER_LEAD_MIN = int(os.getenv("REMINDER_LEAD_MIN", "120"))
+REMINDER_GRACE_MIN = int(os.getenv("REMINDER_GRACE_MIN", "30"))        # late reminders still worth sending
+REMINDER_LOAD_EVERY_SEC = int(os.getenv("REMINDER_LOAD_EVERY_SEC", "600"))
+REMINDER_BATCH = int(os.getenv("REMINDER_BATCH", "100"))               # BatchGetItem limit
+REMINDER_LEASE_SEC = int(os.getenv("REMINDER_LEASE_SEC", "60"))
+REMINDER_BATCH_RETRIES = int(os.getenv("REMINDER_BATCH_RETRIES", "8"))  # UnprocessedKeys rounds
+COUNTERS_TABLE_NAME = os.getenv("DDB_TABLE_COUNTERS", "medmitra_counters")
+CLINIC_TZ = ZoneInfo(os.getenv("CLINIC_TIME_ZONE", "Asia/Kolkata"))
+
+LEASE_ID = "scheduler#reminders"
+
+REMINDERS = metrics.register(metrics.Counter(
+    "clinic_reminders_total", "2h reminders by outcome.", ("outcome",),
+))
+REMINDERS_PENDING = metrics.register(metrics.Gauge(
+    "clinic_reminders_pending", "Reminders waiting in this worker's timing wheel.",
+))
+
+
+def reminder_keys(date_iso: Optional[str], time_slot: Optional[str]) -> Dict[str, Any]:
+    """reminderDay / reminderAt for a booking, or {} when it has no concrete slot ("Walk-in")."""
+    try:
+        y, m, d = [int(x) for x in str(date_iso).split("-", 2)]
+        hh, mm = [int(x) for x in str(time_slot).split(":", 1)]
+        at = datetime(y, m, d, hh, mm, tzinfo=CLINIC_TZ)
+    except (TypeError, ValueError):
+        return {}
+    return {"reminderDay": at.date().isoformat(), "reminderAt": int(at.timestamp())}
+
+
+# --------------------- timing wheel ---------------------
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel keyed by id. Level l has `slots` buckets of
+    slots**l ticks each; an entry sits at the coarsest level that still
+    separates it from now and cascades down as its bucket comes round.
+    Re-adding a key moves it; stale bucket references are skipped.
+    """
+
+    def __init__(self, now: float, tick: float = 1.0, slots: int = 64, levels: int = 3):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.current = int(now // tick)  # next tick to process
+        self._wheels: List[List[List[Tuple[str, int]]]] = [
+            [[] for _ in range(slots)] for _ in range(levels)
+        ]
+        self._overflow: List[Tuple[str, int]] = []
+        self._entries: Dict[str, Tuple[int, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def _place(self, key: str, due: int):
+        delta = due - self.current
+        for lvl in range(self.levels):
+            if delta < self.slots ** (lvl + 1):
+                self._wheels[lvl][(due // self.slots ** lvl) % self.slots].append((key, due))
+                return
+        self._overflow.append((key, due))
+
+    def add(self, key: str, at: float, payload: Any):
+        due = max(int(at // self.tick), self.current)
+        old = self._entries.get(key)
+        self._entries[key] = (due, payload)
+        if old is None or old[0] != due:
+            self._place(key, due)
+
+    def discard(self, key: str):
+        self._entries.pop(key, None)
+
+    def _live(self, key: str, due: int) -> bool:
+        e = self._entries.get(key)
+        return e is not None and e[0] == due
+
+    def advance(self, now: float) -> List[Tuple[str, Any]]:
+        """Entries due up to `now`, in due order."""
+        target = int(now // self.tick)
+        out: List[Tuple[str, Any]] = []
+        if target - self.current > self.slots ** self.levels:
+            # stalled for longer than the wheel spans: rebuild rather than step every tick
+            entries, self._entries = self._entries, {}
+            self.__init__(now, self.tick, self.slots, self.levels)
+            for key, (due, payload) in sorted(entries.items(), key=lambda kv: kv[1][0]):
+                if due <= target:
+                    out.append((key, payload))
+                else:
+                    self.add(key, due * self.tick, payload)
+            return out
+        while self.current <= target:
+            t = self.current
+            for lvl in range(1, self.levels):
+                span = self.slots ** lvl
+                if t % span:
+                    break
+                bucket = self._wheels[lvl][(t // span) % self.slots]
+                self._wheels[lvl][(t // span) % self.slots] = []
+                for key, due in bucket:
+                    if self._live(key, due):
+                        self._place(key, due)
+            if self._overflow and t % self.slots ** (self.levels - 1) == 0:
+                overflow, self._overflow = self._overflow, []
+                for key, due in overflow:
+                    if self._live(key, due):
+                        self._place(key, due)
+            bucket = self._wheels[0][t % self.slots]
+            self._wheels[0][t % self.slots] = []
+            for key, due in bucket:
+                if self._live(key, due):
+                    out.append((key, self._entries.pop(key)[1]))
+            self.current += 1
+        return out
+
+
+# --------------------- scheduler ---------------------
+
+def _when_local(appt: Dict[str, Any]) -> datetime:
+    return datetime.fromtimestamp(int(appt["reminderAt"]), CLINIC_TZ)
+
+
+def _details(appt: Dict[str, Any]) -> Dict[str, Any]:
+    raw = appt.get("appointment_details")
+    if isinstance(raw, dict):
+        return raw
+    if isinstance(raw, str):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return {}
+    return {}
+
+
+def _skip_reason(appt: Optional[Dict[str, Any]], reminder_at: int) -> Optional[str]:
+    if appt is None:
+        return "missing"
+    if str(appt.get("status") or "").upper() in ("CANCELLED", "CANCELED", "COMPLETED", "NO_SHOW"):
+        return "cancelled"
+    if appt.get("tokenId"):
+        return "checked_in"  # already at the clinic
+    if int(appt.get("reminderAt") or 0) != reminder_at:
+        return "moved"  # rescheduled; the next load places the new time
+    contact = appt.get("contact") or {}
+    if not (contact.get("phone") or contact.get("phoneNumber")):
+        return "no_phone"
+    return None
+
+
+def _send(appt: Dict[str, Any]) -> bool:
+    """Queue one reminder in the outbox (blocking PutItem)."""
+    contact = appt.get("contact") or {}
+    phone = (contact.get("phone") or contact.get("phoneNumber") or "").strip()
+    message_id = f"reminder2h#{appt['appointmentId']}#{int(appt['reminderAt'])}"
+    if (appt.get("recordType") or "doctor").lower() == "lab":
+        return send_lab_reminder_2h(
+            phone_e164=phone,
+            patient_name=contact.get("name") or "",
+            when_local=_when_local(appt),
+            site_id=(appt.get("collection") or {}).get("siteId") or "main",
+            message_id=message_id,
+        )
+    details = _details(appt)
+    return send_doctor_reminder_2h(
+        phone_e164=phone,
+        patient_name=contact.get("name") or "",
+        when_local=_when_local(appt),
+        doctor_name=details.get("doctorName") or appt.get("doctorName") or "Doctor",
+        clinic_name=details.get("clinicName") or appt.get("clinicName") or "Clinic",
+        message_id=message_id,
+    )
+
+
+class ReminderScheduler:
+    def __init__(self):
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.wheel: Optional[TimingWheel] = None
+        self.leader = False
+        self._task: Optional[asyncio.Task] = None
+        self._lease_until = 0.0
+        self._loaded_at = 0.0
+        self._fired: Dict[str, int] = {}  # appointmentId -> reminderAt fired by this leadership
+
+    # ---------- leadership ----------
+    async def _renew(self, now: float) -> bool:
+        try:
+            await aio.table(COUNTERS_TABLE_NAME).update_item(
+                Key={"counterId": LEASE_ID},
+                UpdateExpression="SET #o = :me, leaseUntil = :until",
+                ConditionExpression="attribute_not_exists(leaseUntil) OR leaseUntil < :now OR #o = :me",
+                ExpressionAttributeNames={"#o": "owner"},
+                ExpressionAttributeValues={
+                    ":me": self.owner, ":until": int(now) + REMINDER_LEASE_SEC, ":now": int(now),
+                },
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+        self._lease_until = now + REMINDER_LEASE_SEC
+        return True
+
+    async def _release(self):
+        try:
+            await aio.table(COUNTERS_TABLE_NAME).update_item(
+                Key={"counterId": LEASE_ID},
+                UpdateExpression="SET leaseUntil = :zero",
+                ConditionExpression="#o = :me",
+                ExpressionAttributeNames={"#o": "owner"},
+                ExpressionAttributeValues={":me": self.owner, ":zero": 0},
+            )
+        except ClientError:
+            pass
+
+    # ---------- loading ----------
+    async def load(self, now: float) -> int:
+        """(Re)place today's and tomorrow's reminders from the index; returns how many were seen."""
+        tbl = aio.table(DDB_TABLE_APPOINTMENTS)
+        lead = REMINDER_LEAD_MIN * 60
+        since = int(now) - REMINDER_GRACE_MIN * 60 + lead
+        today = datetime.fromtimestamp(now, CLINIC_TZ).date()
+        self._fired = {k: at for k, at in self._fired.items() if at >= since}
+        n = 0
+        for day in (today, today + timedelta(days=1)):
+            kw: Dict[str, Any] = {
+                "IndexName": REMINDER_INDEX,
+                "KeyConditionExpression": Key("reminderDay").eq(day.isoformat()) & Key("reminderAt").gte(since),
+            }
+            while True:
+                resp = await tbl.query(**kw)
+                for it in resp.get("Items", []):
+                    at = int(it["reminderAt"])
+                    if self._fired.get(it["appointmentId"]) == at:
+                        continue  # fired since the last load; a moved booking has a new reminderAt
+                    self.wheel.add(it["appointmentId"], at - lead, {
+                        "patientId": it["patientId"], "appointmentId": it["appointmentId"], "reminderAt": at,
+                    })
+                    n += 1
+                if not resp.get("LastEvaluatedKey"):
+                    break
+                kw["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+        self._loaded_at = now
+        REMINDERS_PENDING.set(value=len(self.wheel))
+        log.info("reminders: %d pending after loading %s..%s", len(self.wheel), today, today + timedelta(days=1))
+        return n
+
+    # ---------- firing ----------
+    async def _batch_get(self, keys: List[Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+        ddb = clients.dynamodb()
+        req = {DDB_TABLE_APPOINTMENTS: {"Keys": keys}}
+        out: Dict[str, Dict[str, Any]] = {}
+        for attempt in range(REMINDER_BATCH_RETRIES):
+            if attempt:
+                # throttled: back off before asking for the rest
+                await asyncio.sleep(min(5.0, 0.05 * 2 ** attempt) * random.uniform(0.5, 1.0))
+            resp = await aio.run_blocking(ddb.batch_get_item, RequestItems=req)
+            for it in resp.get("Responses", {}).get(DDB_TABLE_APPOINTMENTS, []):
+                out[it["appointmentId"]] = it
+            req = resp.get("UnprocessedKeys") or {}
+            if not req:
+                return out
+        raise RuntimeError(f"appointments still unprocessed after {REMINDER_BATCH_RETRIES} BatchGetItem rounds")
+
+    async def fire(self, due: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Check and queue due reminders, REMINDER_BATCH per BatchGetItem."""
+        due = list(due)
+        counts: Dict[str, int] = {}
+        for i in range(0, len(due), REMINDER_BATCH):
+            chunk = due[i:i + REMINDER_BATCH]
+            appts = await self._batch_get([
+                {"patientId": r["patientId"], "appointmentId": r["appointmentId"]} for r in chunk
+            ])
+            ready = []
+            for r in chunk:
+                appt = appts.get(r["appointmentId"])
+                reason = _skip_reason(appt, r["reminderAt"])
+                if reason:
+                    counts[reason] = counts.get(reason, 0) + 1
+                else:
+                    ready.append(appt)
+
+            async def _one(appt: Dict[str, Any]):
+                try:
+                    ok = await aio.run_blocking(_send, appt)
+                except Exception:
+                    log.warning("reminder for %s not queued", appt["appointmentId"], exc_info=True)
+                    ok = None
+                outcome = "queued" if ok else ("error" if ok is None else "disabled")
+                counts[outcome] = counts.get(outcome, 0) + 1
+
+            async with anyio.create_task_group() as tg:
+                for appt in ready:
+                    tg.start_soon(_one, appt)
+            for r in chunk:
+                self._fired[r["appointmentId"]] = r["reminderAt"]
+        for outcome, n in counts.items():
+            REMINDERS.inc(outcome, amount=n)
+        return counts
+
+    # ---------- loop ----------
+    async def _run(self):
+        renew_every = max(1.0, REMINDER_LEASE_SEC / 3)
+        next_renew = 0.0
+        while True:
+            now = time.time()
+            try:
+                if now >= next_renew:
+                    was_leader = self.leader
+                    self.leader = await self._renew(now)
+                    next_renew = now + renew_every
+                    if self.leader and not was_leader:
+                        log.info("reminders: %s is the scheduler", self.owner)
+                        self.wheel = TimingWheel(now)
+                        self._fired = {}
+                        await self.load(now)
+                    elif was_leader and not self.leader:
+                        log.warning("reminders: lost the scheduler lease")
+                        self.wheel = None
+                if self.leader and now >= self._lease_until:
+                    self.leader = False  # renewals failing: stop before another worker takes over
+                    self.wheel = None
+                if self.leader:
+                    if now - self._loaded_at >= REMINDER_LOAD_EVERY_SEC:
+                        await self.load(now)
+                    fired = self.wheel.advance(now)
+                    if fired:
+                        counts = await self.fire(p for _, p in fired)
+                        log.info("reminders: fired %d: %s", len(fired), counts)
+                        REMINDERS_PENDING.set(value=len(self.wheel))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("reminder scheduler iteration failed", exc_info=True)
+            await asyncio.sleep(1.0 - (time.time() % 1.0))
+
+    async def start(self):
+        if not REMINDERS_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        if self.leader:
+            await self._release()
+            self.leader = False
+
+
+scheduler = ReminderScheduler()
@@ -0,0 +1,163 @@
+# backend/app/notifications/twilio_async.py
+"""
+Async Twilio Messages transport on a persistent aiohttp pool.
+
+The twilio SDK's sync client makes one blocking HTTPS call per message and,
+run through aio.run_blocking, holds a worker thread for the whole round trip.
+This sends the same POST /2010-04-01/Accounts/{sid}/Messages.json straight
+from the event loop:
+
+- one ClientSession per account and event loop, with a keep-alive
+  TCPConnector of TWILIO_HTTP_POOL connections, so TLS is set up once per
+  connection instead of once per message;
+- the connector limit is also the concurrency bound: extra sends wait for a
+  free connection instead of opening more;
+- client() puts the per-sender rate limiter (ratelimit.py) in front of
+  every send; `priority=` picks the queue position;
+- errors raise twilio's own TwilioRestException (status, code, message), so
+  callers classify failures exactly as they did with the SDK;
+- each request is timed into DOWNSTREAM_LATENCY like metrics.twilio_http_client().
+
+TWILIO_API_BASE points the transport at a stand-in (loadtest/bench_twilio.py).
+With CLINIC_BACKEND=memory and no TWILIO_API_BASE, client() returns the
+in-process fake instead.
+
+    msg = await twilio_async.client(sid, token).messages.create(to=..., from_=..., body=...)
+"""
+import asyncio
+import os
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple
+
+import aiohttp
+from twilio.base.exceptions import TwilioRestException
+
+from app import fakes, metrics
+from app.notifications import ratelimit
+
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE", "").strip().rstrip("/")
+TWILIO_HTTP_POOL = int(os.getenv("TWILIO_HTTP_POOL", "20"))              # connections = concurrent sends
+TWILIO_HTTP_KEEPALIVE_SEC = float(os.getenv("TWILIO_HTTP_KEEPALIVE_SEC", "60"))
+TWILIO_HTTP_TIMEOUT_SEC = float(os.getenv("TWILIO_HTTP_TIMEOUT_SEC", "10"))
+
+
+class AsyncTwilio:
+    """Minimal Twilio REST client: `await c.messages.create(...)`."""
+
+    def __init__(self, account_sid: str, auth_token: str, base_url: Optional[str] = None,
+                 pool: int = TWILIO_HTTP_POOL):
+        self.account_sid = account_sid
+        self.base_url = (base_url or TWILIO_API_BASE or "https://api.twilio.com").rstrip("/")
+        self.pool = pool
+        self._auth = aiohttp.BasicAuth(account_sid, auth_token)
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.messages = _Messages(self)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            # sessions are bound to the loop that made them (one per process in the app;
+            # scripts and benchmarks may run several loops in turn)
+            connector = aiohttp.TCPConnector(
+                limit=self.pool, limit_per_host=self.pool,
+                keepalive_timeout=TWILIO_HTTP_KEEPALIVE_SEC, ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, auth=self._auth,
+                timeout=aiohttp.ClientTimeout(total=TWILIO_HTTP_TIMEOUT_SEC),
+            )
+            self._loop = loop
+        return self._session
+
+    async def request(self, method: str, path: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        url = self.base_url + path
+        t0 = time.perf_counter()
+        outcome = "error"
+        try:
+            async with self._get_session().request(method, url, data=data) as resp:
+                try:
+                    payload = await resp.json(content_type=None)
+                except ValueError:
+                    payload = {}
+                outcome = "ok" if resp.status < 400 else str(resp.status)
+                if resp.status >= 400:
+                    raise TwilioRestException(
+                        resp.status, url, msg=(payload or {}).get("message", ""),
+                        code=(payload or {}).get("code"), method=method,
+                    )
+                return payload or {}
+        finally:
+            metrics.observe_downstream("twilio", metrics._op_from_url(method, url), time.perf_counter() - t0, outcome)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class _Messages:
+    def __init__(self, c: AsyncTwilio):
+        self._c = c
+
+    async def create(self, to: str, from_: Optional[str] = None, body: Optional[str] = None,
+                     content_sid: Optional[str] = None, content_variables: Optional[str] = None,
+                     **extra: Any) -> SimpleNamespace:
+        data = {"To": to}
+        if from_:
+            data["From"] = from_
+        if body is not None:
+            data["Body"] = body
+        if content_sid:
+            data["ContentSid"] = content_sid
+        if content_variables:
+            data["ContentVariables"] = content_variables
+        for k, v in extra.items():  # status_callback -> StatusCallback, ...
+            if v is not None:
+                data["".join(p.capitalize() for p in k.split("_"))] = str(v)
+        j = await self._c.request("POST", f"/2010-04-01/Accounts/{self._c.account_sid}/Messages.json", data)
+        return SimpleNamespace(sid=j.get("sid"), status=j.get("status"), to=j.get("to", to), body=j.get("body", body))
+
+
+class _Limited:
+    """Transport whose sends first take a token from the sender's rate-limit bucket."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.messages = _LimitedMessages(inner.messages)
+
+    async def close(self):
+        await self.inner.close()
+
+
+class _LimitedMessages:
+    def __init__(self, inner):
+        self._inner = inner
+
+    async def create(self, to: str, from_: Optional[str] = None,
+                     priority: Optional[ratelimit.Priority] = None, **kw: Any):
+        await ratelimit.acquire(ratelimit.provider_key("twilio", from_), priority)
+        return await self._inner.create(to=to, from_=from_, **kw)
+
+
+_clients: Dict[Tuple[str, str], _Limited] = {}
+
+
+def client(account_sid: str, auth_token: str) -> _Limited:
+    """Shared, rate-limited transport for one account (the fake when running in memory mode)."""
+    key = (account_sid, auth_token)
+    c = _clients.get(key)
+    if c is None:
+        if fakes.enabled() and not TWILIO_API_BASE:
+            inner = fakes.AsyncTwilioClient(account_sid, auth_token)
+        else:
+            inner = AsyncTwilio(account_sid, auth_token)
+        c = _clients.setdefault(key, _Limited(inner))
+    return c
+
+
+async def close_all():
+    """Close pooled connections (app shutdown)."""
+    for c in list(_clients.values()):
+        await c.close()
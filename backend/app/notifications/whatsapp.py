@@ -1,12 +1,18 @@
 import os
 import json
 import logging
+import functools
+import inspect
 from datetime import datetime
 from typing import Optional, Dict
 
-from twilio.rest import Client
+from twilio.base.exceptions import TwilioRestException
 from zoneinfo import ZoneInfo
 
+from app import fakes
+from app.notifications import outbox, twilio_async
+from app.notifications.ratelimit import Priority
+
 log = logging.getLogger("whatsapp")
 
 # ----------------------------
@@ -16,20 +22,18 @@ log = logging.getLogger("whatsapp")
 # Account SID / token – support both generic and *_WHATSAPP variants
 TWILIO_ACCOUNT_SID = (
     os.getenv("TWILIO_ACCOUNT_SID_WHATSAPP")
-    or os.getenv("TWILIO_ACCOUNT_SID")
-    or ""
+    or fakes.secret("TWILIO_ACCOUNT_SID", "ACfake")
 )
 TWILIO_AUTH_TOKEN = (
     os.getenv("TWILIO_AUTH_TOKEN_WHATSAPP")
-    or os.getenv("TWILIO_AUTH_TOKEN")
-    or ""
+    or fakes.secret("TWILIO_AUTH_TOKEN", "fake-token")
 )
 
 # FROM number – support both TWILIO_WHATSAPP_FROM and TWILIO_FROM_PHONE_NUMBER_WHATSAPP
 _raw_from = (
     os.getenv("TWILIO_WHATSAPP_FROM")
     or os.getenv("TWILIO_FROM_PHONE_NUMBER_WHATSAPP")
-    or ""
+    or fakes.secret("TWILIO_WHATSAPP_FROM", "whatsapp:+10000000000")
 ).strip()
 
 # Normalize FROM to "whatsapp:+<digits>" if needed
@@ -49,10 +53,10 @@ WHATSAPP_ENABLED = bool(
     TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN and TWILIO_FROM_WHATSAPP
 )
 
-_client: Optional[Client] = None
+_client = None  # twilio_async.client(): pooled, rate-limited
 if WHATSAPP_ENABLED:
     try:
-        _client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
+        _client = twilio_async.client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
         log.info(
             "WhatsApp notifications enabled (Twilio). FROM=%s",
             TWILIO_FROM_WHATSAPP,
@@ -116,9 +120,11 @@ def _format_whatsapp_to(e164: str) -> Optional[str]:
     return f"whatsapp:{val}"
 
 
-def _send_whatsapp_text(to_phone_e164: str, body: str) -> bool:
+async def _send_whatsapp_text(to_phone_e164: str, body: str) -> bool:
     """
     Fallback freeform text send (only valid within 24h session window).
+    Raises on failure so the outbox retries; Twilio 4xx (other than 429)
+    is a PermanentError and goes straight to the dead letters.
     """
     if not WHATSAPP_ENABLED or not _client:
         log.info("WhatsApp disabled; skipping send to %s", to_phone_e164)
@@ -130,7 +136,7 @@ def _send_whatsapp_text(to_phone_e164: str, body: str) -> bool:
         return False
 
     try:
-        msg = _client.messages.create(
+        msg = await _client.messages.create(
             body=body,
             from_=TWILIO_FROM_WHATSAPP,
             to=to,
@@ -142,12 +148,13 @@ def _send_whatsapp_text(to_phone_e164: str, body: str) -> bool:
             getattr(msg, "status", ""),
         )
         return True
-    except Exception as e:
-        log.exception("Failed to send WhatsApp to %s", to)
-        return False
+    except TwilioRestException as e:
+        if 400 <= (e.status or 0) < 500 and e.status != 429:
+            raise outbox.PermanentError(f"Twilio {e.status} ({e.code}): {e.msg}") from e
+        raise
 
 
-def _send_whatsapp_template(
+async def _send_whatsapp_template(
     to_phone_e164: str,
     template_sid: str,
     variables: Dict[str, str],
@@ -155,6 +162,10 @@ def _send_whatsapp_template(
     """
     Send a WhatsApp template (via Twilio Content / template SID).
     variables should be a dict of { '1': 'value1', '2': 'value2', ... }.
+    Returns False when the template can't be used (not configured, or
+    rejected with a Twilio 4xx) so the caller falls back to freeform text;
+    transient failures (429, 5xx, network) raise so the outbox retries the
+    template later.
     """
     if not WHATSAPP_ENABLED or not _client:
         return False
@@ -168,7 +179,7 @@ def _send_whatsapp_template(
         return False
 
     try:
-        msg = _client.messages.create(
+        msg = await _client.messages.create(
             from_=TWILIO_FROM_WHATSAPP,
             to=to,
             content_sid=template_sid,
@@ -182,9 +193,11 @@ def _send_whatsapp_template(
             getattr(msg, "status", ""),
         )
         return True
-    except Exception as e:
-        log.exception("Failed to send WhatsApp template %s to %s", template_sid, to)
-        return False
+    except TwilioRestException as e:
+        if 400 <= (e.status or 0) < 500 and e.status != 429:
+            log.warning("WhatsApp template %s rejected for %s: %s (%s)", template_sid, to, e.status, e.code)
+            return False
+        raise
 
 
 # -------------------------------------------------------------------
@@ -203,7 +216,32 @@ def _fmt_time(dt: datetime) -> str:
 # High-level helpers used by the rest of the app
 # -------------------------------------------------------------------
 
-def send_doctor_booking_confirmation(
+def _outboxed(priority: Priority):
+    """
+    Calling the helper queues the message in the durable outbox (one PutItem)
+    and returns; the function body runs later in the outbox dispatcher,
+    sending at `priority`. Extra keyword `message_id` makes the enqueue
+    idempotent, `delay_sec` defers it.
+    """
+    def deco(fn):
+        kind = f"whatsapp.{fn.__name__}"
+        outbox.handler(kind, priority)(fn)
+        sig = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def send(*args, message_id: Optional[str] = None, delay_sec: int = 0, **kwargs) -> bool:
+            call = sig.bind(*args, **kwargs).arguments
+            if not WHATSAPP_ENABLED or not _client or not call.get("phone_e164"):
+                return False
+            return outbox.enqueue(kind, dict(call), message_id=message_id, delay_sec=delay_sec)
+
+        send.deliver = fn
+        return send
+    return deco
+
+
+@_outboxed(Priority.BOOKING)
+async def send_doctor_booking_confirmation(
     phone_e164: str,
     patient_name: str,
     when_local: datetime,
@@ -227,7 +265,7 @@ def send_doctor_booking_confirmation(
     }
 
     # Try template first, then freeform fallback
-    if _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_CONFIRMATION, vars_tpl):
+    if await _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_CONFIRMATION, vars_tpl):
         return True
 
     body = (
@@ -238,10 +276,11 @@ def send_doctor_booking_confirmation(
         f"🏥 Clinic: {clinic_name}\n\n"
         f"Please arrive 10–15 minutes early for your visit."
     )
-    return _send_whatsapp_text(phone_e164, body)
+    return await _send_whatsapp_text(phone_e164, body)
 
 
-def send_doctor_checkin_confirmation(
+@_outboxed(Priority.CHECKIN)
+async def send_doctor_checkin_confirmation(
     phone_e164: str,
     patient_name: str,
     when_local: datetime,
@@ -267,7 +306,7 @@ def send_doctor_checkin_confirmation(
         "6": token_str,
     }
 
-    if _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_CHECKIN, vars_tpl):
+    if await _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_CHECKIN, vars_tpl):
         return True
 
     token_line = f"\n🎟 Token: {token_str}" if token_str else ""
@@ -279,10 +318,11 @@ def send_doctor_checkin_confirmation(
         f"{token_line}\n\n"
         f"We’ll call you when it’s your turn."
     )
-    return _send_whatsapp_text(phone_e164, body)
+    return await _send_whatsapp_text(phone_e164, body)
 
 
-def send_doctor_reminder_2h(
+@_outboxed(Priority.REMINDER)
+async def send_doctor_reminder_2h(
     phone_e164: str,
     patient_name: str,
     when_local: datetime,
@@ -305,7 +345,7 @@ def send_doctor_reminder_2h(
         "5": clinic_name,
     }
 
-    if _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_REMINDER_2H, vars_tpl):
+    if await _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_REMINDER_2H, vars_tpl):
         return True
 
     body = (
@@ -316,10 +356,11 @@ def send_doctor_reminder_2h(
         f"🏥 Clinic: {clinic_name}\n\n"
         f"Please arrive a little early. Reply here if you need to reschedule."
     )
-    return _send_whatsapp_text(phone_e164, body)
+    return await _send_whatsapp_text(phone_e164, body)
 
 
-def send_lab_booking_confirmation(
+@_outboxed(Priority.BOOKING)
+async def send_lab_booking_confirmation(
     phone_e164: str,
     patient_name: str,
     when_local: datetime,
@@ -342,7 +383,7 @@ def send_lab_booking_confirmation(
         "5": title,
     }
 
-    if _send_whatsapp_template(phone_e164, TPL_LAB_BOOKING_CONFIRMATION, vars_tpl):
+    if await _send_whatsapp_template(phone_e164, TPL_LAB_BOOKING_CONFIRMATION, vars_tpl):
         return True
 
     body = (
@@ -352,10 +393,11 @@ def send_lab_booking_confirmation(
         f"📍 Location: {location}\n\n"
         f"Please bring your prescription and arrive 10–15 minutes early."
     )
-    return _send_whatsapp_text(phone_e164, body)
+    return await _send_whatsapp_text(phone_e164, body)
 
 
-def send_lab_reminder_2h(
+@_outboxed(Priority.REMINDER)
+async def send_lab_reminder_2h(
     phone_e164: str,
     patient_name: str,
     when_local: datetime,
@@ -379,7 +421,7 @@ def send_lab_reminder_2h(
         "5": location,
     }
 
-    if _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_REMINDER_2H, vars_tpl):
+    if await _send_whatsapp_template(phone_e164, TPL_APPOINTMENT_REMINDER_2H, vars_tpl):
         return True
 
     body = (
@@ -389,9 +431,11 @@ def send_lab_reminder_2h(
         f"📍 Location: {location}\n\n"
         f"Please be on time and follow any fasting instructions given."
     )
-    return _send_whatsapp_text(phone_e164, body)
+    return await _send_whatsapp_text(phone_e164, body)
+
 
-def send_consecutive_appointment_warning(
+@_outboxed(Priority.BOOKING)
+async def send_consecutive_appointment_warning(
     phone_e164: str,
     patient_name: str,
     date_iso: str,
@@ -428,7 +472,7 @@ def send_consecutive_appointment_warning(
         "6": new_time,
     }
 
-    if _send_whatsapp_template(phone_e164, TPL_CONSECUTIVE_APPT_WARNING, vars_tpl):
+    if await _send_whatsapp_template(phone_e164, TPL_CONSECUTIVE_APPT_WARNING, vars_tpl):
         return True
 
     body = (
@@ -438,7 +482,7 @@ def send_consecutive_appointment_warning(
         f"If this was intentional, no action is needed. "
         f"If it was a mistake, please visit the kiosk or front desk to cancel the extra booking."
     )
-    return _send_whatsapp_text(phone_e164, body)
+    return await _send_whatsapp_text(phone_e164, body)
 
 
 # -------------------------------------------------------------------
@@ -3,11 +3,12 @@ import os
 import logging
 from typing import List, Optional, Dict, Any
 
-import boto3
 from boto3.dynamodb.conditions import Key
 from botocore.exceptions import ClientError
 from fastapi import APIRouter, HTTPException, Query
 
+from app.db import clients
+
 log = logging.getLogger("pharmacy")
 router = APIRouter(prefix="/pharmacy", tags=["pharmacy"])
 
@@ -17,10 +18,7 @@ DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
 
 
 def _ddb():
-  kw = {"region_name": AWS_REGION}
-  if DYNAMODB_ENDPOINT:
-      kw["endpoint_url"] = DYNAMODB_ENDPOINT
-  return boto3.resource("dynamodb", **kw)
+  return clients.dynamodb()
 
 
 orders_table = _ddb().Table(DDB_TABLE_PHARM_ORDERS)
@@ -0,0 +1,279 @@
+# backend/app/queue/engine.py
+"""
+In-process queue state per (day, lane).
+
+Each lane is hydrated once from GSI2 (one paginated query) and then kept
+current by the token writes this worker makes, so position / now-next are
+answered from memory: position is a bisect over the sorted seqs of active
+tokens, O(log n), with no DynamoDB read per poll.
+
+Hydration reads the sparse active index (QUEUE_ACTIVE_INDEX: activePK =
+day#lane, activeSK = seq), which only holds waiting / called / roomed
+tokens, so its cost tracks the live queue rather than the whole day.
+Finished tokens are looked up on demand (GSI1 / GSI3) by the router.
+
+Other workers (and the front desk) also write tokens, so a lane is
+re-hydrated after QUEUE_ENGINE_TTL_SEC; local writes made while a refresh is
+in flight are re-applied on top of the fresh snapshot.
+
+Lanes of earlier days are dropped when the first lane of a new day is
+created; callers validate client-supplied days and lanes before asking
+(router._queue_day, LANES).
+"""
+import bisect
+import itertools
+import logging
+import os
+import re
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+log = logging.getLogger("queue-engine")
+
+QUEUE_ENGINE_TTL_SEC = float(os.getenv("QUEUE_ENGINE_TTL_SEC", "30"))
+QUEUE_ACTIVE_INDEX = os.getenv("QUEUE_ACTIVE_INDEX", "ActiveIndex")
+
+# statuses that still occupy a place in the line (same set _count_ahead used)
+ACTIVE_STATUSES = ("waiting", "called", "roomed")
+
+_TOKEN_RE = re.compile(r"^([A-Za-z]+)(\d+)$")
+
+# process-wide, so a (day, lane) evicted and rebuilt never reuses a version
+_versions = itertools.count(1)
+
+
+def active_keys(day: str, lane: str, seq: int) -> Dict[str, Any]:
+    """Sparse-index attributes; present only while the token is in ACTIVE_STATUSES."""
+    return {"activePK": f"{day}#{lane}", "activeSK": int(seq)}
+
+
+def token_key(day: str, token_no: str) -> str:
+    """Day-scoped token id ('2025-01-31#A12'): the tokens table key and what slips / QR codes carry."""
+    return f"{day}#{token_no}"
+
+
+def parse_token_key(key: str) -> Optional[Tuple[str, str]]:
+    """'2025-01-31#A12' -> ('2025-01-31', 'A12'); None for other ids (legacy uuid tokens)."""
+    day, sep, token_no = (key or "").strip().partition("#")
+    if not sep or len(day) != 10 or parse_token_no(token_no) is None:
+        return None
+    return day, token_no
+
+
+def parse_token_no(token_no: str) -> Optional[Tuple[str, int]]:
+    """'A12' -> ('A', 12); None if it is not lane letters + seq."""
+    m = _TOKEN_RE.match((token_no or "").strip())
+    return (m.group(1), int(m.group(2))) if m else None
+
+
+class LaneState:
+    """Tokens of one (day, lane), indexed by seq, tokenNo, appointment and status."""
+
+    def __init__(self, day: str, lane: str):
+        self.day = day
+        self.lane = lane
+        self.version = next(_versions)
+        self.loaded_at = 0.0  # monotonic; 0 = never hydrated
+        self.by_seq: Dict[int, Dict[str, Any]] = {}
+        self.by_token: Dict[str, int] = {}
+        self.by_appt: Dict[str, int] = {}
+        self.active: List[int] = []   # sorted seqs in ACTIVE_STATUSES
+        self.waiting: List[int] = []  # sorted seqs with status == waiting
+        self._touched: Dict[int, float] = {}  # seq -> monotonic time of last local write
+        self.last_seq = 0  # highest seq seen; the lane counter is at least this
+        self.lock = anyio.Lock()
+        self.issue_lock = anyio.Lock()  # serializes this worker's counter bumps for the lane
+        self.on_change: Optional[Callable[["LaneState"], None]] = None
+
+    # ---------- reads ----------
+    def position(self, seq: int) -> int:
+        """Active tokens ahead of `seq` (tokens with a smaller seq still in line)."""
+        return bisect.bisect_left(self.active, seq)
+
+    def token(self, token_no: str) -> Optional[Dict[str, Any]]:
+        seq = self.by_token.get(token_no)
+        return self.by_seq.get(seq) if seq is not None else None
+
+    def for_appointment(self, appointment_id: str) -> Optional[Dict[str, Any]]:
+        seq = self.by_appt.get(appointment_id)
+        return self.by_seq.get(seq) if seq is not None else None
+
+    def waiting_tokens(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        seqs = self.waiting if limit is None else self.waiting[:limit]
+        return [self.by_seq[s] for s in seqs]
+
+    def called_tokens(self) -> List[Dict[str, Any]]:
+        """Tokens currently called to a room, in seq order."""
+        return [t for t in (self.by_seq[s] for s in self.active) if t.get("status") == "called"]
+
+    def stale(self, now: Optional[float] = None) -> bool:
+        return (now or time.monotonic()) - self.loaded_at > QUEUE_ENGINE_TTL_SEC
+
+    # ---------- writes ----------
+    @staticmethod
+    def _discard(arr: List[int], seq: int):
+        i = bisect.bisect_left(arr, seq)
+        if i < len(arr) and arr[i] == seq:
+            del arr[i]
+
+    @staticmethod
+    def _add(arr: List[int], seq: int):
+        i = bisect.bisect_left(arr, seq)
+        if i == len(arr) or arr[i] != seq:
+            arr.insert(i, seq)
+
+    def _index(self, item: Dict[str, Any]):
+        seq = int(item["seq"])
+        old = self.by_seq.get(seq)
+        if old is not None and old.get("tokenNo") != item.get("tokenNo"):
+            self.by_token.pop(old.get("tokenNo"), None)
+        self.by_seq[seq] = item
+        self.last_seq = max(self.last_seq, seq)
+        if item.get("tokenNo"):
+            self.by_token[item["tokenNo"]] = seq
+        if item.get("appointmentId"):
+            self.by_appt[item["appointmentId"]] = seq
+        status = item.get("status") or "waiting"
+        (self._add if status in ACTIVE_STATUSES else self._discard)(self.active, seq)
+        (self._add if status == "waiting" else self._discard)(self.waiting, seq)
+
+    def upsert(self, item: Dict[str, Any]):
+        """Apply a token this worker just wrote (new token or status change)."""
+        self._index(item)
+        self._touched[int(item["seq"])] = time.monotonic()
+        self.version = next(_versions)
+        if self.on_change:
+            self.on_change(self)
+
+    def remember(self, item: Dict[str, Any]):
+        """
+        Cache a token read from the table (status polls). Unlike upsert() it is
+        not a local write: no _touched entry, and the version only moves (and
+        listeners only hear of it) when the token is or was in the line, so
+        looking up finished tokens doesn't invalidate wallboard ETags or wake
+        push channels.
+        """
+        seq = int(item["seq"])
+        old = self.by_seq.get(seq)
+        if old == item:
+            return
+        was_active = old is not None and (old.get("status") or "waiting") in ACTIVE_STATUSES
+        self._index(item)
+        if was_active or (item.get("status") or "waiting") in ACTIVE_STATUSES:
+            self.version = next(_versions)
+            if self.on_change:
+                self.on_change(self)
+
+    def load(self, items: List[Dict[str, Any]], started: float):
+        """Swap in a GSI2 snapshot taken at `started`, keeping newer local writes."""
+        keep = [self.by_seq[s] for s, t in self._touched.items() if t >= started and s in self.by_seq]
+        self.by_seq, self.by_token, self.by_appt = {}, {}, {}
+        self.active, self.waiting = [], []
+        for it in sorted(items, key=lambda x: int(x.get("seq", 0))):
+            if "seq" in it:
+                self._index(it)
+        for it in keep:
+            self._index(it)
+        self._touched = {s: t for s, t in self._touched.items() if t >= started}
+        self.loaded_at = started
+        self.version = next(_versions)
+        if self.on_change:
+            self.on_change(self)
+
+
+class QueueEngine:
+    """Lane states for this worker, hydrated lazily from the tokens table."""
+
+    def __init__(self, tokens_table):
+        self.tbl = tokens_table  # app.db.aio.AsyncTable
+        self._lanes: Dict[Tuple[str, str], LaneState] = {}
+        self._today = ""  # local day of the last rollover check
+        # called with the LaneState after every upsert / refresh (push fan-out)
+        self.listeners: List[Callable[[LaneState], None]] = []
+
+    def _changed(self, st: LaneState):
+        for fn in self.listeners:
+            try:
+                fn(st)
+            except Exception:
+                log.exception("queue listener failed for %s#%s", st.day, st.lane)
+
+    def get(self, day: str, lane: str) -> Optional[LaneState]:
+        """Lane state as last seen (possibly stale), or None if never requested."""
+        return self._lanes.get((day, lane))
+
+    async def lane(self, day: str, lane: str) -> LaneState:
+        st = self._lanes.get((day, lane))
+        if st is None:
+            self._rollover()
+            st = self._lanes.setdefault((day, lane), LaneState(day, lane))
+            st.on_change = self._changed
+        if st.loaded_at and not st.stale():
+            return st
+        async with st.lock:
+            # single flight: concurrent pollers wait for one hydration
+            if not st.loaded_at or st.stale():
+                await self._hydrate(st)
+        return st
+
+    async def refresh(self, day: str, lane: str) -> LaneState:
+        """Re-read a lane now regardless of TTL (push channels keep watched lanes fresh)."""
+        st = await self.lane(day, lane)
+        async with st.lock:
+            await self._hydrate(st)
+        return st
+
+    async def _hydrate(self, st: LaneState):
+        started = time.monotonic()
+        try:
+            items = await self._query_all({
+                "IndexName": QUEUE_ACTIVE_INDEX,
+                "KeyConditionExpression": Key("activePK").eq(f"{st.day}#{st.lane}"),
+            })
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ValidationException":
+                raise
+            # index not created yet on this table: read the whole day partition
+            log.warning("%s missing on tokens table; hydrating %s#%s from GSI2",
+                        QUEUE_ACTIVE_INDEX, st.day, st.lane)
+            items = await self._query_all({
+                "IndexName": "GSI2",
+                "KeyConditionExpression": Key("GSI2PK").eq(f"{st.day}#{st.lane}"),
+                "FilterExpression": Attr("status").is_in(list(ACTIVE_STATUSES)),
+            })
+        st.load(items, started)
+        log.debug("Hydrated lane %s#%s: %d active tokens", st.day, st.lane, len(items))
+
+    async def _query_all(self, kw: Dict[str, Any]) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        while True:
+            resp = await self.tbl.query(**kw)
+            items.extend(resp.get("Items", []))
+            lek = resp.get("LastEvaluatedKey")
+            if not lek:
+                break
+            kw["ExclusiveStartKey"] = lek
+        return items
+
+    async def apply(self, item: Dict[str, Any]) -> LaneState:
+        """Record a token write; hydrates the lane first if this worker has not seen it."""
+        st = await self.lane(item["date"], item["lane"])
+        st.upsert(item)
+        return st
+
+    def _rollover(self):
+        """On the first new lane of a new local day, drop the previous days' lanes."""
+        today = datetime.now().date().isoformat()
+        if today != self._today:
+            self._today = today
+            self.evict_before(today)
+
+    def evict_before(self, day: str):
+        """Drop lanes of days before `day` (ISO dates sort lexicographically)."""
+        for key in [k for k in self._lanes if k[0] < day]:
+            self._lanes.pop(key, None)
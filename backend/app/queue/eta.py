@@ -0,0 +1,188 @@
+# backend/app/queue/eta.py
+"""
+Learned ETA bands from token timings.
+
+Tokens carry issuedAt / calledAt / roomedAt / doneAt (UTC ISO). From finished
+tokens we keep consult durations (roomedAt -> doneAt) per (doctor, local
+hour). Summary statistics are recomputed in one pass, at most every
+ETA_RECOMPUTE_SEC and only after new samples arrived; requests only read
+the cached summaries.
+
+A wait of n tokens ahead is modelled as the sum of n consult durations:
+mean n*mu, spread sqrt(n)*sigma, widened by a calibration factor. When a
+token is called, its actual wait is checked against the band it was given
+at issue; the running hit rate is the reported confidence and nudges the
+factor so bands cover ETA_TARGET_COVERAGE of real waits.
+"""
+import logging
+import math
+import os
+import statistics
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from boto3.dynamodb.conditions import Key
+
+log = logging.getLogger("queue-eta")
+
+CONSULT_AVG_MIN = int(os.getenv("CONSULT_AVG_MIN", "10"))
+ETA_MAX_SAMPLES = int(os.getenv("ETA_MAX_SAMPLES", "500"))       # per (doctor, hour)
+ETA_MIN_SAMPLES = int(os.getenv("ETA_MIN_SAMPLES", "8"))         # before a bucket is trusted
+ETA_RECOMPUTE_SEC = float(os.getenv("ETA_RECOMPUTE_SEC", "30"))
+ETA_TARGET_COVERAGE = float(os.getenv("ETA_TARGET_COVERAGE", "0.8"))
+ETA_HISTORY_DAYS = int(os.getenv("ETA_HISTORY_DAYS", "7"))        # warm-up read per worker
+CLINIC_TZ = ZoneInfo(os.getenv("CLINIC_TIME_ZONE", "Asia/Kolkata"))
+
+# two-sided normal quantile for the target coverage (0.8 -> 1.2816)
+_Z = statistics.NormalDist().inv_cdf(0.5 + ETA_TARGET_COVERAGE / 2)
+
+ANY = "*"
+Bucket = Tuple[str, Any]  # (doctorId | "*", hour | "*")
+
+
+def _parse_ts(v: Any) -> Optional[datetime]:
+    if not v:
+        return None
+    try:
+        return datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def _minutes(a: Optional[datetime], b: Optional[datetime]) -> Optional[float]:
+    if a is None or b is None:
+        return None
+    d = (b - a).total_seconds() / 60.0
+    return d if d >= 0 else None
+
+
+def _summarize(samples: Iterable[float]) -> Tuple[float, float]:
+    """(mean, stdev) of a bucket; at most ETA_MAX_SAMPLES values."""
+    vals = list(samples)
+    return statistics.fmean(vals), statistics.stdev(vals) if len(vals) > 1 else 0.0
+
+
+class EtaModel:
+    def __init__(self):
+        self._samples: Dict[Bucket, Deque[float]] = {}
+        self._stats: Dict[Bucket, Tuple[float, float, int]] = {}  # mean, stdev, n
+        self._seen: Dict[str, bool] = {}  # tokenId -> recorded
+        self._dirty = False
+        self._computed_at = 0.0
+        self.scale = 1.0  # calibration factor on sigma
+        self._hits: Deque[int] = deque(maxlen=200)
+
+    # ---------- learning ----------
+    def _add(self, key: Bucket, minutes: float):
+        dq = self._samples.get(key)
+        if dq is None:
+            dq = self._samples[key] = deque(maxlen=ETA_MAX_SAMPLES)
+        dq.append(minutes)
+
+    def observe(self, token: Dict[str, Any]):
+        """Feed a token after any status change; idempotent per token and stage."""
+        tid = str(token.get("tokenId") or token.get("tokenNo") or "")
+        issued = _parse_ts(token.get("issuedAt"))
+        called = _parse_ts(token.get("calledAt"))
+        roomed = _parse_ts(token.get("roomedAt"))
+        done = _parse_ts(token.get("doneAt"))
+
+        if called and not self._seen.get(tid + "#called"):
+            self._seen[tid + "#called"] = True
+            self._check_band(token, _minutes(issued, called))
+
+        consult = _minutes(roomed, done)
+        if consult is not None and not self._seen.get(tid + "#done"):
+            self._seen[tid + "#done"] = True
+            doctor = str(token.get("doctorId") or ANY)
+            hour = roomed.astimezone(CLINIC_TZ).hour
+            for key in {(doctor, hour), (doctor, ANY), (ANY, hour), (ANY, ANY)}:
+                self._add(key, consult)
+            self._dirty = True
+
+    def _check_band(self, token: Dict[str, Any], waited: Optional[float]):
+        low, high = token.get("etaLow"), token.get("etaHigh")
+        if waited is None or low is None or high is None:
+            return
+        hit = int(float(low) <= waited <= float(high))
+        self._hits.append(hit)
+        # too many misses -> widen, comfortably covered -> tighten
+        rate = sum(self._hits) / len(self._hits)
+        if len(self._hits) >= 20:
+            self.scale *= 1.05 if rate < ETA_TARGET_COVERAGE else 0.99
+            self.scale = min(3.0, max(0.5, self.scale))
+
+    def _maybe_recompute(self, now: float):
+        if not self._dirty or now - self._computed_at < ETA_RECOMPUTE_SEC:
+            return
+        self.publish(now)
+
+    def publish(self, now: Optional[float] = None):
+        """Recompute bucket summaries from the samples (one pass over all buckets)."""
+        self._stats = {
+            key: (*_summarize(dq), len(dq)) for key, dq in self._samples.items() if dq
+        }
+        self._dirty = False
+        self._computed_at = now if now is not None else time.monotonic()
+        if len(self._seen) > 20 * ETA_MAX_SAMPLES:
+            self._seen.clear()  # bounded; re-observing an old token is harmless at this point
+
+    # ---------- answering ----------
+    def _bucket(self, doctor_id: Optional[str], hour: int) -> Tuple[float, float, int]:
+        doctor = str(doctor_id or ANY)
+        for key in ((doctor, hour), (doctor, ANY), (ANY, hour), (ANY, ANY)):
+            st = self._stats.get(key)
+            if st and st[2] >= ETA_MIN_SAMPLES:
+                return st
+        # prior: the old flat model, +/- 30%
+        return float(CONSULT_AVG_MIN), 0.3 * CONSULT_AVG_MIN, 0
+
+    def confidence(self) -> int:
+        if len(self._hits) < 20:
+            return 70  # prior until enough called tokens were scored
+        return int(round(100 * sum(self._hits) / len(self._hits)))
+
+    def estimate(self, num_ahead: int, doctor_id: Optional[str] = None,
+                 now: Optional[datetime] = None) -> Dict[str, Any]:
+        self._maybe_recompute(time.monotonic())
+        hour = (now or datetime.now(CLINIC_TZ)).astimezone(CLINIC_TZ).hour
+        mu, sigma, _ = self._bucket(doctor_id, hour)
+        n = max(0, int(num_ahead))
+        centre = n * mu
+        spread = _Z * self.scale * math.sqrt(max(n, 1)) * sigma
+        low = max(1, int(centre - spread))
+        high = max(low + 1, int(math.ceil(centre + spread + mu)))  # + own consult start slack
+        return {"etaLow": low, "etaHigh": high, "confidence": self.confidence()}
+
+
+model = EtaModel()
+
+
+
+async def bootstrap(tokens_table, lanes: Iterable[str], today: str):
+    """Learn from the previous ETA_HISTORY_DAYS days (one GSI2 partition per day and lane)."""
+    start = date.fromisoformat(today)
+    n = 0
+    try:
+        for back in range(1, ETA_HISTORY_DAYS + 1):
+            day = (start - timedelta(days=back)).isoformat()
+            for lane in lanes:
+                kw: Dict[str, Any] = {
+                    "IndexName": "GSI2",
+                    "KeyConditionExpression": Key("GSI2PK").eq(f"{day}#{lane}"),
+                }
+                while True:
+                    resp = await tokens_table.query(**kw)
+                    for it in resp.get("Items", []):
+                        model.observe(it)
+                        n += 1
+                    if not resp.get("LastEvaluatedKey"):
+                        break
+                    kw["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    except Exception:
+        log.warning("ETA history load stopped after %d tokens", n, exc_info=True)
+    model.publish()
+    log.info("ETA model warmed from %d tokens over %d days", n, ETA_HISTORY_DAYS)
@@ -0,0 +1,77 @@
+# backend/app/queue/lanes.py
+"""
+Lane assignment for check-in tokens.
+
+The old `abs(hash(doctor_id)) % len(LANES)` used Python's per-process salted
+hash, so two uvicorn workers could put the same doctor in different lanes.
+Here:
+
+- "hash" (default): consistent hashing of doctorId onto a ring of
+  QUEUE_LANE_VNODES virtual nodes per lane (md5, identical in every process).
+  Adding a lane moves only ~1/N of the doctors.
+- "shortest": the lane with the fewest active tokens right now (from the
+  in-process lane state); ties go to the doctor's ring order, so a quiet
+  clinic still behaves like "hash".
+"""
+import bisect
+import hashlib
+import os
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+QUEUE_LANES = [ln.strip() for ln in os.getenv("QUEUE_LANES", "A").split(",") if ln.strip()] or ["A"]
+QUEUE_LANE_MODE = os.getenv("QUEUE_LANE_MODE", "hash").strip().lower()
+QUEUE_LANE_VNODES = int(os.getenv("QUEUE_LANE_VNODES", "64"))
+
+
+def _h(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class LaneRing:
+    def __init__(self, lanes: List[str], vnodes: int = QUEUE_LANE_VNODES):
+        self.lanes = list(lanes)
+        ring: List[Tuple[int, str]] = sorted(
+            (_h(f"{lane}#{i}"), lane) for lane in self.lanes for i in range(vnodes)
+        )
+        self._points = [p for p, _ in ring]
+        self._owners = [ln for _, ln in ring]
+
+    def preference(self, key: str) -> List[str]:
+        """All lanes in ring order starting at `key`'s position (first = its home lane)."""
+        if len(self.lanes) == 1:
+            return list(self.lanes)
+        i = bisect.bisect(self._points, _h(key)) % len(self._points)
+        out: List[str] = []
+        n = len(self._owners)
+        for j in range(n):
+            ln = self._owners[(i + j) % n]
+            if ln not in out:
+                out.append(ln)
+                if len(out) == len(self.lanes):
+                    break
+        return out
+
+    def lane_for(self, key: Optional[str]) -> str:
+        if not key:
+            return self.lanes[0]
+        return self.preference(str(key))[0]
+
+
+ring = LaneRing(QUEUE_LANES)
+
+
+async def choose_lane(
+    day: str,
+    doctor_id: Optional[str],
+    active_count: Callable[[str, str], Awaitable[int]],
+) -> str:
+    """Lane for a new token; `active_count(day, lane)` reports live queue length."""
+    if QUEUE_LANE_MODE != "shortest" or len(ring.lanes) == 1:
+        return ring.lane_for(doctor_id)
+    order = ring.preference(str(doctor_id or ""))
+    best, best_n = order[0], None
+    for ln in order:
+        n = await active_count(day, ln)
+        if best_n is None or n < best_n:
+            best, best_n = ln, n
+    return best
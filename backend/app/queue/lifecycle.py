@@ -0,0 +1,273 @@
+# backend/app/queue/lifecycle.py
+"""
+Token lifecycle: call-next / room / complete / no-show.
+
+Every transition is one conditional write on the token (`#s IN (allowed
+from-statuses)`), so two doctors pressing "call next" at once can never claim
+the same patient: the loser gets ConditionalCheckFailed with the current
+item (ReturnValuesOnConditionCheckFailure=ALL_OLD), updates its lane state
+from it and moves on to the next waiting token.
+
+Leaving the line (done / no_show) also removes the sparse active-index keys
+and decrements the lane's `active` counter on the dayLane counter item in
+the same transaction; check-in increments it. GET /queue/lanes reads those
+counters for all lanes in one BatchGetItem, without touching the tokens.
+
+The new item is applied to the in-process lane state (position, wallboard
+and push channels update at once) and fed to the ETA model.
+
+Transitions are staff-only: they need the X-Staff-Key header
+(QUEUE_STAFF_API_KEY); the lane counts stay public like the other queue reads.
+"""
+import hmac
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Path, Query
+from pydantic import BaseModel, constr
+
+from app import fakes
+from app.db import aio
+from app.queue import eta
+from app.queue.engine import ACTIVE_STATUSES
+from app.queue.router import (
+    COUNTERS_TABLE_NAME, LANES, TOKENS_TABLE_NAME, _batch_get, _counter_key, _queue_day, _typed,
+    _untyped, engine, find_token, tbl_tokens,
+)
+from app.util.datetime import now_utc_iso
+
+log = logging.getLogger("queue-lifecycle")
+router = APIRouter(prefix="/queue", tags=["queue"])
+
+QUEUE_CALL_MAX_ATTEMPTS = int(os.getenv("QUEUE_CALL_MAX_ATTEMPTS", "5"))  # lost claims per call-next
+
+QUEUE_STAFF_API_KEY = fakes.secret("QUEUE_STAFF_API_KEY", "local-fake-staff-key")
+if not QUEUE_STAFF_API_KEY:
+    raise RuntimeError("QUEUE_STAFF_API_KEY must be set for the queue lifecycle API")
+
+# target status -> statuses it may be entered from
+TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    "called": ("waiting",),
+    "roomed": ("waiting", "called"),
+    "done": ("called", "roomed"),
+    "no_show": ("waiting", "called"),
+}
+# timestamp written on entering each status (eta.py reads calledAt / roomedAt / doneAt)
+STAMPS = {"called": "calledAt", "roomed": "roomedAt", "done": "doneAt", "no_show": "noShowAt"}
+
+
+class Conflict(Exception):
+    def __init__(self, current: Optional[Dict[str, Any]]):
+        self.current = current
+
+
+# --------------------- schemas ---------------------
+
+class CallNextReq(BaseModel):
+    lane: constr(min_length=1, max_length=8)
+    date: Optional[str] = None
+    doctorId: Optional[str] = None   # only this doctor's patients
+    room: Optional[str] = None
+
+class TransitionReq(BaseModel):
+    date: Optional[str] = None
+    room: Optional[str] = None
+
+class LifecycleResp(BaseModel):
+    tokenNo: str
+    lane: str
+    date: str
+    status: str
+    room: Optional[str] = None
+    patientId: str
+    appointmentId: str
+    active: int      # tokens still in line in this lane (this worker's view)
+
+class LaneCount(BaseModel):
+    lane: str
+    issued: int
+    active: int
+
+# --------------------- auth ------------------------
+
+def _check_staff_key(x_staff_key: str = Header(...)):
+    if not hmac.compare_digest(x_staff_key.strip().encode(), QUEUE_STAFF_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid staff key")
+
+# --------------------- helpers ---------------------
+
+async def _transition(t: Dict[str, Any], to: str, room: Optional[str] = None) -> Dict[str, Any]:
+    """Conditionally move token `t` to `to`; returns the new item or raises Conflict."""
+    allowed = TRANSITIONS[to]
+    now = now_utc_iso()
+    names = {"#s": "status"}
+    values: Dict[str, Any] = {":to": to, ":at": now}
+    sets = ["#s = :to", f"{STAMPS[to]} = :at"]
+    if room:
+        sets.append("room = :room")
+        values[":room"] = room
+    expr = "SET " + ", ".join(sets)
+    terminal = to not in ACTIVE_STATUSES
+    if terminal:
+        expr += " REMOVE activePK, activeSK"
+
+    froms = []
+    for i, st in enumerate(allowed):
+        values[f":f{i}"] = st
+        froms.append(f":f{i}")
+    cond = f"#s IN ({', '.join(froms)})"
+    if "waiting" in allowed:
+        cond += " OR attribute_not_exists(#s)"  # legacy rows default to waiting
+
+    new = {**t, "status": to, STAMPS[to]: now, **({"room": room} if room else {})}
+    if terminal:
+        new.pop("activePK", None)
+        new.pop("activeSK", None)
+
+    try:
+        if not terminal:
+            resp = await tbl_tokens.update_item(
+                Key={"tokenId": t["tokenId"]},
+                UpdateExpression=expr,
+                ConditionExpression=cond,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues="ALL_NEW",
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            )
+            return resp.get("Attributes") or new
+        # leaving the line: token + lane active counter together
+        await aio.dynamodb_client().transact_write_items(TransactItems=[
+            {"Update": {
+                "TableName": TOKENS_TABLE_NAME,
+                "Key": _typed({"tokenId": t["tokenId"]}),
+                "UpdateExpression": expr,
+                "ConditionExpression": cond,
+                "ExpressionAttributeNames": names,
+                "ExpressionAttributeValues": _typed(values),
+                "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+            }},
+            {"Update": {
+                "TableName": COUNTERS_TABLE_NAME,
+                "Key": _typed(_counter_key(t["date"], t["lane"])),
+                "UpdateExpression": "ADD active :minus",
+                "ExpressionAttributeValues": _typed({":minus": -1}),
+            }},
+        ])
+        return new
+    except ClientError as e:
+        code = e.response["Error"]["Code"]
+        if code == "ConditionalCheckFailedException":
+            old = e.response.get("Item")  # typed, even through the resource API
+            raise Conflict(_untyped(old) if old else None)
+        if code == "TransactionCanceledException":
+            reasons = e.response.get("CancellationReasons") or [{}]
+            if reasons[0].get("Code") == "ConditionalCheckFailed":
+                old = reasons[0].get("Item")
+                raise Conflict(_untyped(old) if old else None)
+        raise
+
+
+async def _applied(item: Dict[str, Any]) -> LifecycleResp:
+    state = await engine.apply(item)
+    eta.model.observe(item)
+    return LifecycleResp(
+        tokenNo=item["tokenNo"],
+        lane=item["lane"],
+        date=item["date"],
+        status=item.get("status", "waiting"),
+        room=item.get("room"),
+        patientId=item.get("patientId", ""),
+        appointmentId=item.get("appointmentId", ""),
+        active=len(state.active),
+    )
+
+
+async def _load_token(token_no: str, day: str) -> Dict[str, Any]:
+    t = await find_token(token_no, day)
+    if t is None:
+        raise HTTPException(status_code=404, detail="Token not found")
+    return t
+
+
+async def _move(token_no: str, to: str, body: Optional[TransitionReq]) -> LifecycleResp:
+    body = body or TransitionReq()
+    t = await _load_token(token_no, _queue_day(body.date))
+    try:
+        item = await _transition(t, to, body.room)
+    except Conflict as c:
+        if c.current:
+            await engine.apply(c.current)
+        status = (c.current or {}).get("status", "unknown")
+        raise HTTPException(status_code=409, detail=f"Token {token_no} is {status}; cannot mark {to}")
+    return await _applied(item)
+
+# --------------------- routes ----------------------
+
+@router.post("/call-next", response_model=LifecycleResp, dependencies=[Depends(_check_staff_key)])
+async def call_next(body: CallNextReq = Body(...)):
+    """Claim the lowest waiting token in a lane (optionally for one doctor) and mark it called."""
+    if body.lane not in LANES:
+        raise HTTPException(status_code=404, detail="Unknown lane")
+    day = _queue_day(body.date)
+    state = await engine.lane(day, body.lane)
+    refreshed = False
+    lost = 0
+    while True:
+        t = next(
+            (w for w in state.waiting_tokens() if not body.doctorId or w.get("doctorId") == body.doctorId),
+            None,
+        )
+        if t is None:
+            if refreshed:
+                raise HTTPException(status_code=404, detail="No waiting tokens")
+            # other workers may have checked patients in since our last read
+            state = await engine.refresh(day, body.lane)
+            refreshed = True
+            continue
+        try:
+            item = await _transition(t, "called", body.room)
+        except Conflict as c:
+            # someone else called (or cancelled) it first: learn its status and try the next one
+            log.info("call-next lost %s in %s#%s", t.get("tokenNo"), day, body.lane)
+            if c.current:
+                state.upsert(c.current)
+            lost += 1
+            if lost >= QUEUE_CALL_MAX_ATTEMPTS:
+                # patients are still waiting; other desks keep winning them
+                raise HTTPException(status_code=409, detail="Other desks are calling from this lane; try again")
+            continue
+        return await _applied(item)
+
+
+@router.post("/tokens/{tokenNo}/room", response_model=LifecycleResp, dependencies=[Depends(_check_staff_key)])
+async def room_token(tokenNo: str = Path(..., min_length=2), body: Optional[TransitionReq] = Body(None)):
+    return await _move(tokenNo, "roomed", body)
+
+
+@router.post("/tokens/{tokenNo}/complete", response_model=LifecycleResp, dependencies=[Depends(_check_staff_key)])
+async def complete_token(tokenNo: str = Path(..., min_length=2), body: Optional[TransitionReq] = Body(None)):
+    return await _move(tokenNo, "done", body)
+
+
+@router.post("/tokens/{tokenNo}/no-show", response_model=LifecycleResp, dependencies=[Depends(_check_staff_key)])
+async def no_show_token(tokenNo: str = Path(..., min_length=2), body: Optional[TransitionReq] = Body(None)):
+    return await _move(tokenNo, "no_show", body)
+
+
+@router.get("/lanes", response_model=List[LaneCount])
+async def lane_counts(date: Optional[str] = Query(None)):
+    """Issued / still-in-line counts per lane from the dayLane counters (one BatchGetItem)."""
+    day = _queue_day(date)
+    rows = await _batch_get({
+        COUNTERS_TABLE_NAME: {"Keys": [_typed(_counter_key(day, ln)) for ln in LANES]},
+    })
+    by_id = {r["counterId"]: r for r in rows.get(COUNTERS_TABLE_NAME, [])}
+    out = []
+    for ln in LANES:
+        r = by_id.get(_counter_key(day, ln)["counterId"], {})
+        # tokens issued before the counter tracked `active` can push it below zero
+        out.append(LaneCount(lane=ln, issued=int(r.get("seq", 0)), active=max(0, int(r.get("active", 0)))))
+    return out
@@ -0,0 +1,272 @@
+# backend/app/queue/push.py
+"""
+Push channels for queue status and the wallboard (SSE + WebSocket).
+
+Clients subscribe to a token ("A12") or a lane and receive a message only
+when what they would see changes. Fan-out is driven by the queue engine:
+every local token write or lane refresh marks the lane dirty, and one flush
+per event-loop tick recomputes the lane payload once and each watched
+token's position (a bisect) before waking the subscribers whose view
+changed. Each subscriber holds only its latest message, so a slow phone
+never queues up stale positions.
+
+While a lane has subscribers this worker re-reads it every
+QUEUE_PUSH_REFRESH_SEC, so changes made by other workers reach them too:
+one active-index query per lane per interval, independent of the subscriber
+count. A token that another worker moved out of the line (done / no_show)
+drops out of that snapshot; its subscribers get the final status from one
+find_token lookup instead.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Set, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.queue.engine import ACTIVE_STATUSES, LaneState
+from app.queue.router import LANES, _queue_day, engine, find_token, lane_now_next, token_status
+
+log = logging.getLogger("queue-push")
+router = APIRouter(tags=["queue"])
+
+QUEUE_PUSH_REFRESH_SEC = float(os.getenv("QUEUE_PUSH_REFRESH_SEC", "5"))
+QUEUE_PUSH_HEARTBEAT_SEC = float(os.getenv("QUEUE_PUSH_HEARTBEAT_SEC", "15"))
+
+LaneKey = Tuple[str, str]
+
+
+class _Sub:
+    """One connected client; keeps only the newest message."""
+
+    __slots__ = ("kind", "token_no", "last", "latest", "event", "final", "lookup")
+
+    def __init__(self, kind: str, token_no: Optional[str] = None):
+        self.kind = kind  # "token" | "lane"
+        self.token_no = token_no
+        self.last: Optional[Dict[str, Any]] = None
+        self.latest: Optional[Dict[str, Any]] = None
+        self.event = asyncio.Event()
+        self.final = False  # token left the line and that status was offered
+        self.lookup: Optional[asyncio.Task] = None
+
+    def offer(self, payload: Optional[Dict[str, Any]]):
+        if payload is None or payload == self.last:
+            return
+        if self.kind == "token" and payload.get("status") not in ACTIVE_STATUSES:
+            self.final = True
+        self.last = payload
+        self.latest = payload
+        self.event.set()
+
+    async def next(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Newest payload, or None on heartbeat timeout."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self.event.clear()
+        payload, self.latest = self.latest, None
+        return payload
+
+
+class Broker:
+    def __init__(self):
+        self._subs: Dict[LaneKey, Set[_Sub]] = {}
+        self._dirty: Set[LaneKey] = set()
+        self._flush_scheduled = False
+        self._refreshers: Dict[LaneKey, asyncio.Task] = {}
+        engine.listeners.append(self.lane_changed)
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subs.values())
+
+    # ---------- engine hook ----------
+    def lane_changed(self, st: LaneState):
+        key = (st.day, st.lane)
+        if key not in self._subs:
+            return
+        self._dirty.add(key)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+    def _flush(self):
+        self._flush_scheduled = False
+        dirty, self._dirty = self._dirty, set()
+        for key in dirty:
+            st = engine.get(*key)
+            subs = self._subs.get(key)
+            if st is None or not subs:
+                continue
+            lane_payload = None
+            for sub in list(subs):
+                if sub.kind == "lane":
+                    if lane_payload is None:
+                        lane_payload = lane_now_next(st)
+                    sub.offer(lane_payload)
+                else:
+                    t = st.token(sub.token_no)
+                    if t is not None:
+                        sub.offer(token_status(st, t))
+                    elif not sub.final and sub.lookup is None:
+                        # finished on another worker: the refresh dropped it from the active set
+                        sub.lookup = asyncio.get_running_loop().create_task(self._lookup(key, sub))
+
+    async def _lookup(self, key: LaneKey, sub: _Sub):
+        try:
+            t = await find_token(sub.token_no, key[0])
+            st = engine.get(*key)
+            if t is not None and st is not None and sub in self._subs.get(key, ()):
+                sub.offer(token_status(st, t))
+        except Exception:
+            log.warning("push lookup failed for %s in %s#%s", sub.token_no, *key, exc_info=True)
+        finally:
+            sub.lookup = None
+
+    # ---------- subscriptions ----------
+    async def subscribe(self, day: str, lane: str, sub: _Sub) -> LaneState:
+        st = await engine.lane(day, lane)
+        key = (day, lane)
+        self._subs.setdefault(key, set()).add(sub)
+        if key not in self._refreshers:
+            self._refreshers[key] = asyncio.create_task(self._refresh_loop(key))
+        # initial snapshot
+        if sub.kind == "lane":
+            sub.offer(lane_now_next(st))
+        else:
+            t = st.token(sub.token_no)
+            if t is not None:
+                sub.offer(token_status(st, t))
+        return st
+
+    def unsubscribe(self, day: str, lane: str, sub: _Sub):
+        key = (day, lane)
+        subs = self._subs.get(key)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if sub.lookup is not None:
+            sub.lookup.cancel()
+        if not subs:
+            self._subs.pop(key, None)
+            task = self._refreshers.pop(key, None)
+            if task:
+                task.cancel()
+
+    async def _refresh_loop(self, key: LaneKey):
+        while key in self._subs:
+            await asyncio.sleep(QUEUE_PUSH_REFRESH_SEC)
+            try:
+                await engine.refresh(*key)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("push refresh failed for %s#%s", *key, exc_info=True)
+
+
+broker = Broker()
+
+
+async def _resolve(token_no: Optional[str], lane: Optional[str], date: Optional[str]) -> Tuple[str, str, _Sub]:
+    """Validate the subscription target -> (day, lane, subscriber)."""
+    day = _queue_day(date)
+    if token_no:
+        t = await find_token(token_no, day)
+        if t is None:
+            raise HTTPException(status_code=404, detail="Token not found")
+        return t["date"], t["lane"], _Sub("token", token_no)
+    if lane:
+        if lane not in LANES:
+            raise HTTPException(status_code=404, detail="Unknown lane")
+        return day, lane, _Sub("lane")
+    raise HTTPException(status_code=400, detail="tokenNo or lane required")
+
+
+# --------------------- SSE ----------------------
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+async def _sse_stream(request: Request, day: str, lane: str, sub: _Sub, event: str):
+    await broker.subscribe(day, lane, sub)
+    try:
+        while True:
+            payload = await sub.next(QUEUE_PUSH_HEARTBEAT_SEC)
+            if await request.is_disconnected():
+                break
+            yield _sse(event, payload) if payload is not None else ": ping\n\n"
+    finally:
+        broker.unsubscribe(day, lane, sub)
+
+
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+@router.get("/queue/stream")
+async def queue_stream(
+    request: Request, tokenNo: str = Query(..., min_length=2), date: Optional[str] = Query(None),
+):
+    """SSE: `status` events (same body as /queue/status) whenever the token's view changes."""
+    day, lane, sub = await _resolve(tokenNo, None, date)
+    return StreamingResponse(
+        _sse_stream(request, day, lane, sub, "status"),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
+
+
+@router.get("/wallboard/stream")
+async def wallboard_stream(request: Request, lane: str = Query(...), date: Optional[str] = Query(None)):
+    """SSE: `now-next` events (one /wallboard/now-next item) whenever the lane changes."""
+    day, ln, sub = await _resolve(None, lane, date)
+    return StreamingResponse(
+        _sse_stream(request, day, ln, sub, "now-next"),
+        media_type="text/event-stream",
+        headers=_SSE_HEADERS,
+    )
+
+
+# --------------------- WebSocket ----------------------
+
+@router.websocket("/queue/ws")
+async def queue_ws(
+    ws: WebSocket,
+    tokenNo: Optional[str] = Query(None),
+    lane: Optional[str] = Query(None),
+    date: Optional[str] = Query(None),
+):
+    """WebSocket: {"type": "status"|"now-next", "data": {...}} on change, {"type": "ping"} otherwise."""
+    try:
+        day, ln, sub = await _resolve(tokenNo, lane, date)
+    except HTTPException as e:
+        await ws.close(code=4404 if e.status_code == 404 else 4400, reason=str(e.detail))
+        return
+    await ws.accept()
+    kind = "status" if sub.kind == "token" else "now-next"
+    await broker.subscribe(day, ln, sub)
+    try:
+        async with anyio.create_task_group() as tg:
+
+            async def _drain():
+                # clients don't send anything we need; this just notices the close
+                try:
+                    while True:
+                        await ws.receive_text()
+                except WebSocketDisconnect:
+                    pass
+                tg.cancel_scope.cancel()
+
+            tg.start_soon(_drain)
+            while True:
+                payload = await sub.next(QUEUE_PUSH_HEARTBEAT_SEC)
+                msg = {"type": kind, "data": payload} if payload is not None else {"type": "ping"}
+                await ws.send_text(json.dumps(msg, default=str, separators=(",", ":")))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        broker.unsubscribe(day, ln, sub)
@@ -1,15 +1,22 @@
-import os, uuid, logging
-from typing import Optional, Dict, Any, List
-from datetime import datetime, timezone
+import os, logging, hashlib, time
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, timedelta
 import json
 
-import boto3
-from boto3.dynamodb.conditions import Key, Attr
-from botocore.exceptions import ClientError
-from fastapi import APIRouter, HTTPException, Query, Body
-from pydantic import BaseModel, Field, constr
+import asyncio
 
-from app.db.dynamo import appointments_table
+import anyio
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+from fastapi import APIRouter, HTTPException, Query, Body, Header, Response
+from pydantic import BaseModel, constr
+
+from app import metrics
+from app.db import aio
+from app.db.dynamo import DDB_TABLE_APPOINTMENTS
+from app.queue import eta, lanes
+from app.queue.engine import QueueEngine, active_keys, parse_token_key, parse_token_no, token_key
 from app.util.datetime import now_utc_iso
 from zoneinfo import ZoneInfo
 from app.notifications.whatsapp import send_doctor_checkin_confirmation
@@ -22,20 +29,18 @@ TOKENS_TABLE_NAME   = os.getenv("DDB_TABLE_TOKENS",   "medmitra_tokens")
 COUNTERS_TABLE_NAME = os.getenv("DDB_TABLE_COUNTERS", "medmitra_counters")
 
 AVG_CONSULT_MIN = int(os.getenv("CONSULT_AVG_MIN", "10"))   # simple ETA model
-LANES = (os.getenv("QUEUE_LANES", "A").split(","))          # default single lane "A"
-
-DYNAMODB_ENDPOINT = (os.getenv("DYNAMODB_LOCAL_URL") or "").strip() or None
-
-def _ddb():
-    kw = {"region_name": AWS_REGION}
-    if DYNAMODB_ENDPOINT:
-        kw["endpoint_url"] = DYNAMODB_ENDPOINT
-    ddb = boto3.resource("dynamodb", **kw)
-    return ddb
-
-ddb = _ddb()
-tbl_tokens   = ddb.Table(TOKENS_TABLE_NAME)
-tbl_counters = ddb.Table(COUNTERS_TABLE_NAME)
+LANES = lanes.QUEUE_LANES                                    # QUEUE_LANES, default single lane "A"
+QUEUE_ISSUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_ISSUE_MAX_ATTEMPTS", "5"))  # counter races per check-in
+QUEUE_BATCH_MAX = int(os.getenv("QUEUE_BATCH_MAX", "40"))   # appointments per issue-batch (2 keys each per BatchGet)
+QUEUE_BATCH_TX = 49  # appointments per TransactWriteItems: 2 actions each + the lane counter, <= 100
+QUEUE_DAYS_BACK = int(os.getenv("QUEUE_DAYS_BACK", "7"))    # oldest day status / wallboard reads may ask for
+QUEUE_MISS_TTL_SEC = float(os.getenv("QUEUE_MISS_TTL_SEC", "5"))  # unknown tokens answer 404 from memory this long
+QUEUE_MISS_MAX = 10000
+
+tbl_tokens   = aio.table(TOKENS_TABLE_NAME)
+tbl_counters = aio.table(COUNTERS_TABLE_NAME)
+engine = QueueEngine(tbl_tokens)
+_ser, _deser = TypeSerializer(), TypeDeserializer()
 
 # --------------------- helpers ---------------------
 
@@ -43,49 +48,199 @@ def _today_local(date_iso: Optional[str]) -> str:
     # date is in appointment_details.dateISO (local clinic date)
     return (date_iso or datetime.now().date().isoformat())
 
-def _lane_for_doctor(doctor_id: Optional[str]) -> str:
-    if not LANES:
-        return "A"
-    if not doctor_id:
-        return LANES[0]
-    # stable-ish distribution if you add lanes later
+def _queue_day(date_iso: Optional[str]) -> str:
+    """
+    A client-supplied day (default today), checked before it reaches the
+    engine: YYYY-MM-DD from QUEUE_DAYS_BACK days ago to tomorrow, else 400.
+    Every other string would hydrate and keep a lane state of its own.
+    """
+    day = _today_local(date_iso).strip()
     try:
-        idx = abs(hash(str(doctor_id))) % len(LANES)
-        return LANES[idx]
-    except Exception:
-        return LANES[0]
-
-def _next_seq_for(day: str, lane: str) -> int:
-    counter_id = f"dayLane:{day}#{lane}"
+        d = datetime.strptime(day, "%Y-%m-%d").date()
+    except ValueError:
+        d = None
+    if d is None or len(day) != 10:
+        raise HTTPException(status_code=400, detail="Invalid date (YYYY-MM-DD)")
+    today = datetime.now().date()
+    if not -QUEUE_DAYS_BACK <= (d - today).days <= 1:
+        raise HTTPException(status_code=400, detail="Date out of range")
+    return day
+
+async def _active_count(day: str, lane: str) -> int:
+    return len((await engine.lane(day, lane)).active)
+
+async def _reserve_seqs(day: str, lane: str, n: int = 1) -> int:
+    """Atomically take `n` consecutive seqs from the lane counter; returns the first."""
+    resp = await tbl_counters.update_item(
+        Key=_counter_key(day, lane),
+        UpdateExpression="ADD seq :n",
+        ExpressionAttributeValues={":n": n},
+        ReturnValues="UPDATED_NEW",
+    )
+    return int(resp["Attributes"]["seq"]) - n + 1
+
+def _counter_key(day: str, lane: str) -> Dict[str, Any]:
+    return {"counterId": f"dayLane:{day}#{lane}"}
+
+def _typed(d: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _ser.serialize(v) for k, v in d.items()}
+
+def _untyped(d: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: _deser.deserialize(v) for k, v in d.items()}
+
+async def _batch_get(request: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """BatchGetItem (<= 100 keys) until nothing is unprocessed -> {table: items}."""
+    rows: Dict[str, List[Dict[str, Any]]] = {}
+    while request:
+        resp = await aio.dynamodb_client().batch_get_item(RequestItems=request)
+        for name, items in resp.get("Responses", {}).items():
+            rows.setdefault(name, []).extend(_untyped(i) for i in items)
+        request = resp.get("UnprocessedKeys") or {}
+    return rows
+
+async def _issue_reads(
+    patient_id: str, appointment_id: str, today: str,
+) -> Tuple[Optional[Dict[str, Any]], Dict[str, int]]:
+    """One BatchGetItem -> (appointment, {lane: counter seq} for today)."""
+    rows = await _batch_get({
+        DDB_TABLE_APPOINTMENTS: {
+            "Keys": [_typed({"patientId": patient_id, "appointmentId": appointment_id})],
+            "ConsistentRead": True,
+        },
+        COUNTERS_TABLE_NAME: {"Keys": [_typed(_counter_key(today, ln)) for ln in LANES], "ConsistentRead": True},
+    })
+    appt = next(iter(rows.get(DDB_TABLE_APPOINTMENTS, [])), None)
+    seqs = {c["counterId"].rsplit("#", 1)[1]: int(c.get("seq", 0)) for c in rows.get(COUNTERS_TABLE_NAME, [])}
+    return appt, {ln: seqs.get(ln, 0) for ln in LANES}
+
+async def _token_for(appt: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The token an appointment's back-reference points at: lane state first, else one get_item."""
+    key = appt.get("tokenId")
+    if not key:
+        return None
+    parsed = parse_token_key(key)
+    if parsed:
+        t = (await engine.lane(parsed[0], parse_token_no(parsed[1])[0])).token(parsed[1])
+        if t is not None:
+            return t
+    item = (await tbl_tokens.get_item(Key={"tokenId": key})).get("Item")
+    if item is not None and "seq" in item:
+        (await engine.lane(item["date"], item["lane"])).remember(item)
+    return item
+
+async def _read_counter(day: str, lane: str) -> int:
+    resp = await tbl_counters.get_item(Key=_counter_key(day, lane), ConsistentRead=True)
+    return int((resp.get("Item") or {}).get("seq", 0))
+
+def _token_put(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {"Put": {
+        "TableName": TOKENS_TABLE_NAME,
+        "Item": _typed(item),
+        "ConditionExpression": "attribute_not_exists(tokenId)",
+    }}
+
+def _appointment_ref(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Back-reference on the appointment; its condition is what makes check-in idempotent."""
+    return {"Update": {
+        "TableName": DDB_TABLE_APPOINTMENTS,
+        "Key": _typed({"patientId": item["patientId"], "appointmentId": item["appointmentId"]}),
+        "UpdateExpression": "SET tokenId = :tid, tokenNo = :tno, tokenIssuedAt = :at",
+        "ConditionExpression": "attribute_exists(appointmentId) AND attribute_not_exists(tokenId)",
+        "ExpressionAttributeValues": _typed({
+            ":tid": item["tokenId"], ":tno": item["tokenNo"], ":at": item["issuedAt"],
+        }),
+    }}
+
+def _cancel_codes(e: ClientError) -> List[Optional[str]]:
+    if e.response["Error"]["Code"] != "TransactionCanceledException":
+        raise e
+    return [r.get("Code") for r in e.response.get("CancellationReasons", [])]
+
+async def _issue_write(item: Dict[str, Any], cur_seq: int) -> Optional[str]:
+    """
+    Counter cur_seq -> item.seq, token put and appointment back-reference in one
+    transaction. None on success; "retry" when the counter / seq moved under us;
+    "exists" when the appointment already has a token (or changed).
+    """
+    counter: Dict[str, Any] = {
+        "TableName": COUNTERS_TABLE_NAME,
+        "Key": _typed(_counter_key(item["date"], item["lane"])),
+        "UpdateExpression": "SET seq = :next ADD active :one",  # active: see app/queue/lifecycle.py
+        "ExpressionAttributeValues": _typed({":next": item["seq"], ":one": 1}),
+    }
+    if cur_seq:
+        counter["ConditionExpression"] = "seq = :cur"
+        counter["ExpressionAttributeValues"][":cur"] = _ser.serialize(cur_seq)
+    else:
+        counter["ConditionExpression"] = "attribute_not_exists(seq)"
     try:
-        resp = tbl_counters.update_item(
-            Key={"counterId": counter_id},
-            UpdateExpression="ADD seq :one",
-            ExpressionAttributeValues={":one": 1},
-            ReturnValues="UPDATED_NEW",
+        await aio.dynamodb_client().transact_write_items(
+            TransactItems=[{"Update": counter}, _token_put(item), _appointment_ref(item)],
         )
-        return int(resp["Attributes"]["seq"])
+        return None
     except ClientError as e:
-        # first time → upsert with seq=1
-        if e.response["Error"]["Code"] == "ValidationException":
-            tbl_counters.put_item(Item={"counterId": counter_id, "seq": 1})
-            return 1
+        codes = _cancel_codes(e)
+        if len(codes) > 2 and codes[2] == "ConditionalCheckFailed":
+            return "exists"
+        if any(c in ("ConditionalCheckFailed", "TransactionConflict") for c in codes):
+            return "retry"
         raise
 
-def _count_ahead(day: str, lane: str, my_seq: int) -> int:
-    resp = tbl_tokens.query(
-        IndexName="GSI2",
-        KeyConditionExpression=Key("GSI2PK").eq(f"{day}#{lane}") & Key("GSI2SK").between(0, my_seq-1),
-        FilterExpression=Attr("status").is_in(["waiting","called","roomed"])
-    )
-    return len(resp.get("Items", []))
-
-def _estimate_eta(num_ahead: int) -> Dict[str, Any]:
-    # simplest: linear on number ahead; widen range by +/- 20%
-    low = max(1, int(num_ahead * AVG_CONSULT_MIN))
-    high = max(low+1, int((num_ahead + 1) * AVG_CONSULT_MIN * 1.2))
-    conf = 70 if num_ahead < 3 else 60  # toy confidence
-    return {"etaLow": low, "etaHigh": high, "confidence": conf}
+async def _issue_block(items: List[Dict[str, Any]]) -> List[str]:
+    """
+    Token puts + back-references for pre-reserved seqs of one lane,
+    QUEUE_BATCH_TX appointments per transaction, each with `ADD active :n` on
+    the lane counter for the tokens it writes. Returns the appointmentIds that
+    already had a token; their reserved seqs are simply left unused.
+    """
+    taken: List[str] = []
+    for i in range(0, len(items), QUEUE_BATCH_TX):
+        chunk = items[i:i + QUEUE_BATCH_TX]
+        for attempt in range(QUEUE_ISSUE_MAX_ATTEMPTS):
+            if not chunk:
+                break
+            actions = [a for it in chunk for a in (_token_put(it), _appointment_ref(it))]
+            actions.append({"Update": {  # active: see app/queue/lifecycle.py
+                "TableName": COUNTERS_TABLE_NAME,
+                "Key": _typed(_counter_key(chunk[0]["date"], chunk[0]["lane"])),
+                "UpdateExpression": "ADD active :n",
+                "ExpressionAttributeValues": _typed({":n": len(chunk)}),
+            }})
+            try:
+                await aio.dynamodb_client().transact_write_items(TransactItems=actions)
+                break
+            except ClientError as e:
+                codes = _cancel_codes(e)
+            # drop appointments that got a token meanwhile and retry the rest
+            lost = {chunk[j // 2]["appointmentId"] for j, c in enumerate(codes[:2 * len(chunk)])
+                    if c == "ConditionalCheckFailed" and j % 2 == 1}
+            if not lost and "TransactionConflict" not in codes:
+                raise HTTPException(status_code=409, detail="Token numbers already in use; please retry")
+            taken.extend(lost)
+            chunk = [it for it in chunk if it["appointmentId"] not in lost]
+            await asyncio.sleep(0.05 * 2 ** attempt)
+        else:
+            raise HTTPException(status_code=503, detail="Queue is busy; please retry")
+    return taken
+
+async def _count_ahead(day: str, lane: str, my_seq: int) -> int:
+    # answered from the in-process lane state (see app/queue/engine.py)
+    return (await engine.lane(day, lane)).position(my_seq)
+
+def _estimate_eta(num_ahead: int, doctor_id: Optional[str] = None) -> Dict[str, Any]:
+    # learned per-doctor / per-hour bands (app/queue/eta.py); flat CONSULT_AVG_MIN until warmed
+    _warm_eta_history()
+    return eta.model.estimate(num_ahead, doctor_id)
+
+_eta_history_task = None
+
+def _warm_eta_history():
+    """Kick off the one-time ETA history load for this worker (background)."""
+    global _eta_history_task
+    if _eta_history_task is None and eta.ETA_HISTORY_DAYS > 0:
+        _eta_history_task = asyncio.get_running_loop().create_task(
+            eta.bootstrap(tbl_tokens, LANES, _today_local(None))
+        )
 
 def _get_appointment_details(appt: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -102,6 +257,50 @@ def _get_appointment_details(appt: Dict[str, Any]) -> Dict[str, Any]:
             return {}
     return {}
 
+def _appointment_slot(appt: Dict[str, Any]) -> Tuple[str, Optional[str], str]:
+    """(day, doctorId, timeSlot) of an appointment (robust to string or map appointment_details)."""
+    details = _get_appointment_details(appt)
+    date_iso = _today_local(appt.get("dateISO") or details.get("dateISO"))
+    doctor_id = appt.get("doctorId") or details.get("doctorId")
+    # NEW: extract time slot once and reuse (doctor and lab flows)
+    collection = appt.get("collection") or {}
+    time_slot = (
+        appt.get("timeSlot")
+        or details.get("timeSlot")
+        or collection.get("preferredSlot")
+        or ""
+    )
+    return date_iso, doctor_id, str(time_slot or "")
+
+def _token_item(
+    patient_id: str, appointment_id: str, date_iso: str, lane: str, seq: int,
+    doctor_id: Optional[str], time_slot: str, eta: Dict[str, Any],
+) -> Dict[str, Any]:
+    issued_at = now_utc_iso()
+    token_no = f"{lane}{seq}"
+    return {
+        "tokenId": token_key(date_iso, token_no),
+        "tokenNo": token_no,
+        "patientId": patient_id,
+        "appointmentId": appointment_id,
+        "doctorId": str(doctor_id or ""),
+        "date": date_iso,
+        "lane": lane,
+        "seq": int(seq),
+        "status": "waiting",
+        "issuedAt": issued_at,
+        "etaLow": eta["etaLow"],
+        "etaHigh": eta["etaHigh"],
+        "timeSlot": time_slot,  # <── NEW
+        "GSI1PK": appointment_id,
+        "GSI1SK": issued_at,
+        "GSI2PK": f"{date_iso}#{lane}",
+        "GSI2SK": int(seq),
+        "GSI3PK": token_no,
+        "GSI3SK": issued_at,
+        **active_keys(date_iso, lane, seq),  # sparse index: removed when the token leaves the line
+    }
+
 # --------------------- schemas ---------------------
 
 class IssueTokenReq(BaseModel):
@@ -110,6 +309,7 @@ class IssueTokenReq(BaseModel):
 
 class IssueTokenResp(BaseModel):
     tokenNo: str
+    tokenKey: Optional[str] = None  # day-scoped id for the slip / QR (GET /queue/status?tokenKey=)
     lane: str
     position: int
     etaLow: int
@@ -119,87 +319,200 @@ class IssueTokenResp(BaseModel):
     patientId: str
     status: str = "waiting"
 
+class IssueBatchReq(BaseModel):
+    items: List[IssueTokenReq]
+
+class IssueBatchResp(BaseModel):
+    tokens: List[IssueTokenResp]            # in request order, one per found appointment
+    notFound: List[str] = []                # appointmentIds with no appointment row
+
 # --------------------- routes ----------------------
 
+def _issued(t: Dict[str, Any], state, body: IssueTokenReq) -> IssueTokenResp:
+    pos = state.position(int(t["seq"]))
+    eta = _estimate_eta(pos, t.get("doctorId"))
+    return IssueTokenResp(
+        tokenNo=t["tokenNo"],
+        tokenKey=t["tokenId"] if parse_token_key(t.get("tokenId", "")) else None,
+        lane=t["lane"],
+        position=pos,
+        etaLow=eta["etaLow"],
+        etaHigh=eta["etaHigh"],
+        confidence=eta["confidence"],
+        appointmentId=body.appointmentId,
+        patientId=body.patientId,
+        status=t.get("status", "waiting"),
+    )
+
 @router.post("/kiosk/checkin/issue", response_model=IssueTokenResp)
-def issue_token(body: IssueTokenReq = Body(...)):
-    """Create a token (idempotent per appointment). Works for any appointment in the shared table."""
-    # 0) Find appointment
-    appt_tbl = appointments_table()
-    appt_resp = appt_tbl.get_item(Key={"patientId": body.patientId, "appointmentId": body.appointmentId})
-    appt = appt_resp.get("Item")
+async def issue_token(body: IssueTokenReq = Body(...)):
+    """
+    Create a token (idempotent per appointment). Works for any appointment in the shared table.
+
+    Two DynamoDB calls on a warm lane: one BatchGetItem (appointment + today's
+    lane counters) and one TransactWriteItems (counter bump + token put +
+    appointment back-reference, all conditional).
+    """
+    today = _today_local(None)
+
+    # 0) Appointment and lane counters in one read
+    appt, counters = await _issue_reads(body.patientId, body.appointmentId, today)
     if not appt:
         raise HTTPException(status_code=404, detail="Appointment not found")
 
     # 1) If token already exists for this appointment → return it
-    existing = tbl_tokens.query(
-        IndexName="GSI1",
-        KeyConditionExpression=Key("GSI1PK").eq(body.appointmentId),
-        Limit=1, ScanIndexForward=False
-    ).get("Items", [])
-    if existing:
-        t = existing[0]
-        pos = _count_ahead(t["date"], t["lane"], int(t["seq"]))
-        eta = _estimate_eta(pos)
-        return IssueTokenResp(
-            tokenNo=t["tokenNo"],
-            lane=t["lane"],
-            position=pos,
-            etaLow=eta["etaLow"],
-            etaHigh=eta["etaHigh"],
-            confidence=eta["confidence"],
-            appointmentId=body.appointmentId,
-            patientId=body.patientId,
-            status=t.get("status", "waiting"),
-        )
+    existing = await _token_for(appt)
+    if existing is not None:
+        return _issued(existing, await engine.lane(existing["date"], existing["lane"]), body)
+
+    # Day & lane + timeSlot
+    date_iso, doctor_id, time_slot = _appointment_slot(appt)
+    lane = await lanes.choose_lane(date_iso, doctor_id, _active_count)  # QUEUE_LANE_MODE
+    state = await engine.lane(date_iso, lane)
+
+    # tokens issued before the back-reference existed are only known to the lane state
+    t = state.for_appointment(body.appointmentId)
+    if t is not None:
+        return _issued(t, state, body)
+
+    # counters were read for today's lanes; an appointment for another day costs one more read
+    cur_seq = counters.get(lane) if date_iso == today else None
+    if cur_seq is None:
+        cur_seq = await _read_counter(date_iso, lane)
+
+    # 2) Allocate next sequence and persist token + back-reference (one transaction)
+    async with state.issue_lock:
+        for attempt in range(QUEUE_ISSUE_MAX_ATTEMPTS):
+            # our own earlier writes may be newer than what the batch read saw
+            cur_seq = max(cur_seq, state.last_seq)
+            seq = cur_seq + 1
+
+            # 3) Count ahead and ETA
+            ahead = state.position(seq)
+            eta = _estimate_eta(ahead, doctor_id)
+
+            # 4) Persist token
+            item = _token_item(body.patientId, body.appointmentId, date_iso, lane, seq, doctor_id, time_slot, eta)
+            failed = await _issue_write(item, cur_seq)
+            if failed is None:
+                break
+            if failed == "exists":
+                # another kiosk issued this appointment's token first (or the appointment changed)
+                fresh = (await aio.table(DDB_TABLE_APPOINTMENTS).get_item(
+                    Key={"patientId": body.patientId, "appointmentId": body.appointmentId}, ConsistentRead=True,
+                )).get("Item")
+                raced = await _token_for(fresh) if fresh else None
+                if raced is None:
+                    raise HTTPException(status_code=409, detail="Appointment changed during check-in; please retry")
+                return _issued(raced, await engine.lane(raced["date"], raced["lane"]), body)
+            # another worker took the seq: re-read the counter and try again
+            log.info("Counter race on %s#%s at seq %d (attempt %d)", date_iso, lane, seq, attempt + 1)
+            cur_seq = await _read_counter(date_iso, lane)
+        else:
+            raise HTTPException(status_code=503, detail="Queue is busy; please retry")
+        state.upsert(item)
+
+    await _send_checkin_confirmation(appt, item)
 
-    # 2) Compute day & lane + timeSlot (robust to string or map appointment_details)
-    details = _get_appointment_details(appt)
-    date_iso = _today_local(appt.get("dateISO") or details.get("dateISO"))
-    doctor_id = appt.get("doctorId") or details.get("doctorId")
-    # NEW: extract time slot once and reuse (doctor and lab flows)
-    collection = appt.get("collection") or {}
-    time_slot = (
-        appt.get("timeSlot")
-        or details.get("timeSlot")
-        or collection.get("preferredSlot")
-        or ""
+    return IssueTokenResp(
+        tokenNo=item["tokenNo"],
+        tokenKey=item["tokenId"],
+        lane=lane,
+        position=ahead,
+        etaLow=eta["etaLow"],
+        etaHigh=eta["etaHigh"],
+        confidence=eta["confidence"],
+        appointmentId=body.appointmentId,
+        patientId=body.patientId,
+        status="waiting",
     )
-    lane = _lane_for_doctor(doctor_id)
 
-    # 3) Allocate next sequence (atomic)
-    seq = _next_seq_for(date_iso, lane)
-    token_no = f"{lane}{seq}"
 
-    # 4) Count ahead and ETA
-    ahead = _count_ahead(date_iso, lane, seq)
-    eta = _estimate_eta(ahead)
+async def _read_appointments(reqs: List[IssueTokenReq]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    rows = await _batch_get({DDB_TABLE_APPOINTMENTS: {
+        "Keys": [_typed({"patientId": r.patientId, "appointmentId": r.appointmentId}) for r in reqs],
+        "ConsistentRead": True,
+    }})
+    return {(a["patientId"], a["appointmentId"]): a for a in rows.get(DDB_TABLE_APPOINTMENTS, [])}
 
-    # 5) Persist token (NEW: include timeSlot)
-    item = {
-        "tokenId": str(uuid.uuid4()),
-        "tokenNo": token_no,
-        "patientId": body.patientId,
-        "appointmentId": body.appointmentId,
-        "doctorId": str(doctor_id or ""),
-        "date": date_iso,
-        "lane": lane,
-        "seq": int(seq),
-        "status": "waiting",
-        "issuedAt": now_utc_iso(),
-        "etaLow": eta["etaLow"],
-        "etaHigh": eta["etaHigh"],
-        "timeSlot": str(time_slot or ""),  # <── NEW
-        "GSI1PK": body.appointmentId,
-        "GSI1SK": now_utc_iso(),
-        "GSI2PK": f"{date_iso}#{lane}",
-        "GSI2SK": int(seq),
-        "GSI3PK": token_no,
-        "GSI3SK": now_utc_iso(),
-    }
-    tbl_tokens.put_item(Item=item)
 
-    # --- WhatsApp check-in confirmation (doctor only for now) ---
+@router.post("/kiosk/checkin/issue-batch", response_model=IssueBatchResp)
+async def issue_token_batch(body: IssueBatchReq = Body(...)):
+    """
+    Front-desk check-in of many appointments at once (a family, a pre-booked block).
+
+    One BatchGetItem for the appointments, one `ADD seq :n` per lane
+    reserving a contiguous range, and one TransactWriteItems per
+    QUEUE_BATCH_TX new tokens (token put + appointment back-reference each,
+    plus the lane's active count, as in single check-in). Appointments that already have a token get it back.
+    """
+    reqs = list({r.appointmentId: r for r in body.items}.values())
+    if not reqs:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(reqs) > QUEUE_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {QUEUE_BATCH_MAX} appointments per batch")
+
+    appts = await _read_appointments(reqs)
+    found: Dict[str, Dict[str, Any]] = {}  # appointmentId -> token
+    not_found: List[str] = []
+    fresh: Dict[Tuple[str, str], List[Tuple[IssueTokenReq, Dict[str, Any]]]] = {}
+    for r in reqs:
+        appt = appts.get((r.patientId, r.appointmentId))
+        if appt is None:
+            not_found.append(r.appointmentId)
+            continue
+        t = await _token_for(appt)
+        if t is None:
+            date_iso, doctor_id, _ = _appointment_slot(appt)
+            lane = await lanes.choose_lane(date_iso, doctor_id, _active_count)
+            t = (await engine.lane(date_iso, lane)).for_appointment(r.appointmentId)
+            if t is None:
+                fresh.setdefault((date_iso, lane), []).append((r, appt))
+                continue
+        found[r.appointmentId] = t
+
+    new_tokens: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []  # (appointment, token)
+    raced: List[IssueTokenReq] = []
+    for (date_iso, lane), group in fresh.items():
+        state = await engine.lane(date_iso, lane)
+        first = await _reserve_seqs(date_iso, lane, len(group))
+        ahead = state.position(first)
+        items = []
+        for i, (r, appt) in enumerate(group):
+            _, doctor_id, time_slot = _appointment_slot(appt)
+            eta = _estimate_eta(ahead + i, doctor_id)
+            items.append(_token_item(r.patientId, r.appointmentId, date_iso, lane, first + i,
+                                     doctor_id, time_slot, eta))
+        taken = set(await _issue_block(items))
+        for (r, appt), item in zip(group, items):
+            if r.appointmentId in taken:
+                raced.append(r)
+                continue
+            state.upsert(item)
+            found[item["appointmentId"]] = item
+            new_tokens.append((appt, item))
+
+    # checked in elsewhere while this batch was running: return that token
+    if raced:
+        for appt in (await _read_appointments(raced)).values():
+            t = await _token_for(appt)
+            if t is not None:
+                found[appt["appointmentId"]] = t
+
+    async with anyio.create_task_group() as tg:
+        for appt, item in new_tokens:
+            tg.start_soon(_send_checkin_confirmation, appt, item)
+
+    tokens = []
+    for r in reqs:
+        t = found.get(r.appointmentId)
+        if t is not None:
+            tokens.append(_issued(t, await engine.lane(t["date"], t["lane"]), r))
+    return IssueBatchResp(tokens=tokens, notFound=not_found)
+
+
+async def _send_checkin_confirmation(appt: Dict[str, Any], token: Dict[str, Any]):
+    """Queue the WhatsApp check-in confirmation (doctor only for now); never fails the check-in."""
     try:
         record_type = (appt.get("recordType") or "").lower()
 
@@ -210,7 +523,7 @@ def issue_token(body: IssueTokenReq = Body(...)):
             tz = ZoneInfo(os.getenv("CLINIC_TIME_ZONE", "Asia/Kolkata"))
 
             # Extract date/time similar to reminder lambda
-            details_local = details
+            details_local = _get_appointment_details(appt)
             collection = appt.get("collection") or {}
             date_iso_full = (
                 appt.get("dateISO")
@@ -239,62 +552,175 @@ def issue_token(body: IssueTokenReq = Body(...)):
                     or appt.get("clinicName")
                     or "Clinic"
                 )
-                send_doctor_checkin_confirmation(
+                await aio.run_blocking(
+                    send_doctor_checkin_confirmation,
                     phone_e164=phone,
                     patient_name=contact.get("name") or "",
                     when_local=when_local,
                     doctor_name=doctor_name,
                     clinic_name=clinic_name,
-                    token_no=token_no,
+                    token_no=token["tokenNo"],
+                    message_id=f"checkin#{token['tokenId']}",
                 )
             # If you also want a different wording for lab check in, you can
             # add an elif record_type == "lab": branch here and call a lab-specific helper.
     except Exception:
         log.warning("Failed to send WhatsApp check-in confirmation", exc_info=True)
 
-    return IssueTokenResp(
-        tokenNo=token_no,
-        lane=lane,
-        position=ahead,
-        etaLow=eta["etaLow"],
-        etaHigh=eta["etaHigh"],
-        confidence=eta["confidence"],
-        appointmentId=body.appointmentId,
-        patientId=body.patientId,
-        status="waiting",
-    )
-
 
 class StatusResp(BaseModel):
     tokenNo: str
+    tokenKey: Optional[str] = None
     position: int
     etaLow: int
     etaHigh: int
     confidence: int
     status: str
 
+class StatusBatchReq(BaseModel):
+    tokens: List[str]  # tokenKeys ("2025-01-31#A12") or today's tokenNos ("A12")
+
+class StatusBatchResp(BaseModel):
+    items: List[StatusResp]
+    notFound: List[str] = []
+
+def _token_ref(ref: str, date: Optional[str] = None) -> Tuple[str, str]:
+    """tokenKey or tokenNo (+ date, default today) -> (day, tokenNo); 400 on a bad or out-of-range day."""
+    parsed = parse_token_key(ref)
+    day, token_no = parsed if parsed else (date, ref.strip())
+    return _queue_day(day), token_no
+
 @router.get("/queue/status", response_model=StatusResp)
-def queue_status(tokenNo: str = Query(..., min_length=2)):
-    res = tbl_tokens.query(
-        IndexName="GSI3",
-        KeyConditionExpression=Key("GSI3PK").eq(tokenNo),
-        Limit=1,
-        ScanIndexForward=False,
-    )
-    items = res.get("Items", [])
-    if not items:
+async def queue_status(
+    tokenNo: Optional[str] = Query(None, min_length=2),
+    tokenKey: Optional[str] = Query(None, min_length=12),
+    date: Optional[str] = Query(None),
+):
+    """Status of one token: `tokenKey` from the slip / QR, or `tokenNo` of `date` (default today)."""
+    if not (tokenKey or tokenNo):
+        raise HTTPException(status_code=400, detail="tokenNo or tokenKey required")
+    day, token_no = _token_ref(tokenKey or tokenNo, date)
+    t = await find_token(token_no, day)
+    if t is None:
         raise HTTPException(status_code=404, detail="Token not found")
-    t = items[0]
-    pos = _count_ahead(t["date"], t["lane"], int(t["seq"]))
-    eta = _estimate_eta(pos)
-    return StatusResp(
-        tokenNo=tokenNo,
-        position=pos,
-        etaLow=eta["etaLow"],
-        etaHigh=eta["etaHigh"],
-        confidence=eta["confidence"],
-        status=t.get("status", "waiting"),
-    )
+    state = await engine.lane(t["date"], t["lane"])
+    return StatusResp(**token_status(state, t))
+
+
+@router.post("/queue/status/batch", response_model=StatusBatchResp)
+async def queue_status_batch(body: StatusBatchReq = Body(...)):
+    """
+    Status of many tokens (a family's slips, a front-desk screen). Live
+    tokens come from the lane state; the rest are one BatchGetItem by key.
+    """
+    refs = list(dict.fromkeys(r.strip() for r in body.tokens if r and r.strip()))
+    if len(refs) > 100:
+        raise HTTPException(status_code=400, detail="At most 100 tokens per request")
+
+    found: Dict[str, Dict[str, Any]] = {}
+    keys: Dict[str, str] = {}  # ref -> tokenId still to read
+    for ref in refs:
+        try:
+            day, token_no = _token_ref(ref)
+        except HTTPException:
+            continue  # reported in notFound
+        parsed = parse_token_no(token_no)
+        t = (await engine.lane(day, parsed[0])).token(token_no) if parsed and parsed[0] in LANES else None
+        if t is not None:
+            found[ref] = t
+        elif not _known_missing(day, token_no):
+            keys[ref] = token_key(day, token_no)
+    if keys:
+        rows = await _batch_get({TOKENS_TABLE_NAME: {
+            "Keys": [_typed({"tokenId": k}) for k in set(keys.values())],
+        }})
+        by_id = {it["tokenId"]: it for it in rows.get(TOKENS_TABLE_NAME, [])}
+        for ref, k in keys.items():
+            t = by_id.get(k)
+            if t is not None:
+                (await engine.lane(t["date"], t["lane"])).remember(t)
+                found[ref] = t
+
+    items = []
+    for ref in refs:
+        t = found.get(ref)
+        if t is not None:
+            items.append(StatusResp(**token_status(await engine.lane(t["date"], t["lane"]), t)))
+    return StatusBatchResp(items=items, notFound=[r for r in refs if r not in found])
+
+
+# (day, tokenNo) -> monotonic expiry of a "no such token" answer, so a kiosk
+# polling a mistyped ref doesn't cost a get_item + GSI3 query every time
+_missing: Dict[Tuple[str, str], float] = {}
+
+def _known_missing(day: str, token_no: str) -> bool:
+    return _missing.get((day, token_no), 0.0) > time.monotonic()
+
+def _note_missing(day: str, token_no: str):
+    if QUEUE_MISS_TTL_SEC <= 0:
+        return
+    now = time.monotonic()
+    if len(_missing) >= QUEUE_MISS_MAX:
+        for k in [k for k, exp in _missing.items() if exp <= now]:
+            del _missing[k]
+        while len(_missing) >= QUEUE_MISS_MAX:
+            del _missing[next(iter(_missing))]  # oldest first
+    _missing[(day, token_no)] = now + QUEUE_MISS_TTL_SEC
+
+async def find_token(token_no: str, day: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Token `token_no` of `day` (default today). Live tokens are served from the
+    lane state; anything else is one get_item on the day-scoped key. Tokens
+    written before day-scoped keys fall back to GSI3, restricted to that day.
+    A miss is remembered for QUEUE_MISS_TTL_SEC.
+    """
+    day = _today_local(day)
+    parsed = parse_token_no(token_no)
+    if parsed and parsed[0] in LANES:
+        t = (await engine.lane(day, parsed[0])).token(token_no)
+        if t is not None:
+            return t
+    if _known_missing(day, token_no):
+        return None
+    t = (await tbl_tokens.get_item(Key={"tokenId": token_key(day, token_no)})).get("Item")
+    if t is None:
+        # GSI3SK is issuedAt (UTC ISO); a local day lies within a day either side of it in UTC
+        d = datetime.strptime(day, "%Y-%m-%d")
+        kw: Dict[str, Any] = {
+            "IndexName": "GSI3",
+            "KeyConditionExpression": Key("GSI3PK").eq(token_no) & Key("GSI3SK").between(
+                (d - timedelta(days=1)).date().isoformat(), (d + timedelta(days=2)).date().isoformat(),
+            ),
+            "FilterExpression": Attr("date").eq(day),
+            "ScanIndexForward": False,
+        }
+        while t is None:
+            res = await tbl_tokens.query(**kw)
+            t = next(iter(res.get("Items", [])), None)
+            if not res.get("LastEvaluatedKey"):
+                break
+            kw["ExclusiveStartKey"] = res["LastEvaluatedKey"]
+        if t is None:
+            _note_missing(day, token_no)
+            return None
+    # issued by another worker since our last refresh, or no longer active: remember it
+    (await engine.lane(t["date"], t["lane"])).remember(t)
+    return t
+
+
+def token_status(state, t: Dict[str, Any]) -> Dict[str, Any]:
+    """StatusResp fields for token `t` from its lane state (also used by app.queue.push)."""
+    pos = state.position(int(t["seq"]))
+    eta = _estimate_eta(pos, t.get("doctorId"))
+    return {
+        "tokenNo": t["tokenNo"],
+        "tokenKey": t["tokenId"] if parse_token_key(t.get("tokenId", "")) else None,
+        "position": pos,
+        "etaLow": eta["etaLow"],
+        "etaHigh": eta["etaHigh"],
+        "confidence": eta["confidence"],
+        "status": t.get("status", "waiting"),
+    }
 
 class NowNextLane(BaseModel):
     lane: str
@@ -303,37 +729,87 @@ class NowNextLane(BaseModel):
     avg_wait: int
     tokenTimes: Dict[str, str] = {}  # NEW
 
+# (day, lanes) -> (lane versions, body, etag). A lane's version changes on every
+# token write this worker makes and on every refresh from GSI2, so the body is
+# rebuilt once per change no matter how many TVs poll; the ETag is a content
+# hash, so a refresh that found nothing new still answers 304.
+_wallboard_cache: Dict[Tuple[str, Tuple[str, ...]], Tuple[Tuple[int, ...], bytes, str]] = {}
+
+WALLBOARD_CACHE = metrics.register(metrics.Counter(
+    "clinic_wallboard_cache_total", "Wallboard responses by cache outcome.", ("result",),
+))
+
+
 @router.get("/wallboard/now-next")
-def wallboard_now_next(date: Optional[str] = Query(None), lane: Optional[str] = Query(None)):
-    day = date or datetime.now().date().isoformat()
-    lanes = [lane] if lane else LANES
-    out: List[Dict[str, Any]] = []
-    for ln in lanes:
-        q = tbl_tokens.query(
-            IndexName="GSI2",
-            KeyConditionExpression=Key("GSI2PK").eq(f"{day}#{ln}"),
-            FilterExpression=Attr("status").is_in(["waiting","called","roomed"]),
-            Limit=20,
-        )
-        arr = sorted(q.get("Items", []), key=lambda x: int(x.get("seq", 0)))
-        waiting = [i["tokenNo"] for i in arr if i.get("status") == "waiting"]
-
-        # NEW: build token → timeSlot map (for waiting tokens only)
-        token_times: Dict[str, str] = {}
-        for i in arr:
-            if i.get("status") == "waiting":
-                tno = i.get("tokenNo")
-                ts = (i.get("timeSlot") or "").strip()
-                if tno and ts:
-                    token_times[tno] = ts
-
-        out.append(
-            {
-                "lane": ln,
-                "now": waiting[:1],
-                "next": waiting[1:6],
-                "avg_wait": AVG_CONSULT_MIN,
-                "tokenTimes": token_times,  # NEW
-            }
-        )
-    return {"items": out}
+async def wallboard_now_next(
+    date: Optional[str] = Query(None),
+    lane: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    day = _queue_day(date)
+    if lane and lane not in LANES:
+        raise HTTPException(status_code=404, detail="Unknown lane")
+    wanted = [lane] if lane else LANES
+
+    async def _lane_state(ln: str, results: Dict[str, Any]):
+        results[ln] = await engine.lane(day, ln)
+
+    # cold lanes hydrate from independent GSI2 partitions; do them concurrently
+    states: Dict[str, Any] = {}
+    async with anyio.create_task_group() as tg:
+        for ln in wanted:
+            tg.start_soon(_lane_state, ln, states)
+
+    key = (day, tuple(wanted))
+    versions = tuple(states[ln].version for ln in wanted)
+    cached = _wallboard_cache.get(key)
+    if cached and cached[0] == versions:
+        _, body, etag = cached
+        result = "hit"
+    else:
+        body = json.dumps(
+            {"items": [lane_now_next(states[ln]) for ln in wanted]},
+            default=str, separators=(",", ":"),
+        ).encode("utf-8")
+        etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+        # past days only (the engine's rollover cutoff): a board showing tomorrow keeps today's entries
+        today = _today_local(None)
+        for stale in [k for k in _wallboard_cache if k[0] < today]:
+            _wallboard_cache.pop(stale, None)
+        _wallboard_cache[key] = (versions, body, etag)
+        result = "rebuild"
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+        WALLBOARD_CACHE.inc("not_modified")
+        return Response(status_code=304, headers=headers)
+    WALLBOARD_CACHE.inc(result)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def lane_now_next(state) -> Dict[str, Any]:
+    """Wallboard entry for one lane (also pushed by app.queue.push)."""
+    arr = state.waiting_tokens(20)
+    waiting = [i["tokenNo"] for i in arr if i.get("status") == "waiting"]
+
+    # NEW: build token → timeSlot map (for waiting tokens only)
+    token_times: Dict[str, str] = {}
+    for i in arr:
+        if i.get("status") == "waiting":
+            tno = i.get("tokenNo")
+            ts = (i.get("timeSlot") or "").strip()
+            if tno and ts:
+                token_times[tno] = ts
+
+    # "now" = tokens called to a room (app/queue/lifecycle.py); lanes nobody
+    # advances through the API keep showing the head of the line
+    called = [i["tokenNo"] for i in state.called_tokens()]
+    now, nxt = (called, waiting[:5]) if called else (waiting[:1], waiting[1:6])
+
+    return {
+        "lane": state.lane,
+        "now": now,
+        "next": nxt,
+        "avg_wait": AVG_CONSULT_MIN,
+        "tokenTimes": token_times,  # NEW
+    }
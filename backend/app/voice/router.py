@@ -5,10 +5,11 @@ import subprocess
 import logging
 from typing import Optional
 
-import boto3
 import requests
 from fastapi import APIRouter, HTTPException, UploadFile, File, Query
 
+from app.db import clients
+
 log = logging.getLogger("clinic-os.voice")
 router = APIRouter()
 
@@ -18,12 +19,8 @@ AWS_REGION = os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION", "us-west
 AUDIO_BUCKET_NAME = os.getenv("AUDIO_BUCKET_NAME", "medmitra-audio-bucket")
 
 # ---------- AWS S3 ----------
-s3_client = boto3.client(
-    "s3",
-    region_name=AWS_REGION,
-    aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-    aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-)
+# credentials come from the default chain (AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY)
+s3_client = clients.s3(AWS_REGION)
 
 def presign_s3(key: str, expires: int = 3600) -> Optional[str]:
     try:
@@ -0,0 +1,106 @@
+# backend/loadtest/bench_clients.py
+"""
+Micro-benchmark: per-request overhead of building a fresh boto3 resource
+(what the routers used to do) vs. pulling from app.db.clients.
+
+Runs fully offline: a tiny local HTTP stub answers DynamoDB GetItem with "{}",
+so the numbers include request signing + connection handling but no WAN.
+
+    cd backend && python -m loadtest.bench_clients -n 300
+"""
+import argparse
+import os
+import socket
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+
+import boto3  # noqa: E402
+
+
+class _DynamoStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # keep-alive + small writes would otherwise stall on delayed ACKs
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        body = b"{}"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-amz-json-1.0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub() -> str:
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _DynamoStub)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{srv.server_address[1]}"
+
+
+def _time(fn, n: int):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {
+        "mean": statistics.fmean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("-n", type=int, default=200, help="iterations per case")
+    ap.add_argument("--endpoint", default=None, help="DynamoDB endpoint (default: local stub)")
+    args = ap.parse_args()
+
+    endpoint = args.endpoint or _start_stub()
+    os.environ["DYNAMODB_LOCAL_URL"] = endpoint
+    from app.db import clients  # import after endpoint is set
+
+    region = clients.AWS_REGION
+    key = {"patientId": "p", "appointmentId": "a"}
+
+    def per_call_build():
+        boto3.resource("dynamodb", region_name=region, endpoint_url=endpoint).Table("bench")
+
+    def per_call_get():
+        boto3.resource("dynamodb", region_name=region, endpoint_url=endpoint).Table("bench").get_item(Key=key)
+
+    def pooled_build():
+        clients.table("bench")
+
+    def pooled_get():
+        clients.table("bench").get_item(Key=key)
+
+    pooled_get()  # warm the registry once, like the first request after boot
+
+    rows = [
+        ("construct: boto3.resource per call", _time(per_call_build, args.n)),
+        ("construct: clients.table()", _time(pooled_build, args.n)),
+        ("get_item: boto3.resource per call", _time(per_call_get, args.n)),
+        ("get_item: clients.table()", _time(pooled_get, args.n)),
+    ]
+    print(f"endpoint={endpoint} n={args.n} (ms)")
+    print(f"{'case':40s} {'mean':>8s} {'p50':>8s} {'p95':>8s}")
+    for name, r in rows:
+        print(f"{name:40s} {r['mean']:8.3f} {r['p50']:8.3f} {r['p95']:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# backend/loadtest/bench_twilio.py
+"""
+Throughput benchmark: Twilio Messages sends via the sync SDK vs. the pooled
+async transport (app/notifications/twilio_async.py).
+
+Runs fully offline against a local Twilio stand-in that answers
+POST /2010-04-01/Accounts/{sid}/Messages.json after --latency-ms (Twilio's
+API round trip from ap-south-1 is ~150-300 ms). Plain HTTP, so the
+keep-alive numbers leave out the TLS handshakes a real pool also saves.
+
+    cd backend && python -m loadtest.bench_twilio -n 400 -c 20 --latency-ms 150
+    cd backend && python -m loadtest.bench_twilio --base https://api.twilio.com   # real account, careful
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List
+
+SID = os.getenv("TWILIO_ACCOUNT_SID") or "ACbench00000000000000000000000000"
+TOKEN = os.getenv("TWILIO_AUTH_TOKEN") or "bench"
+
+
+class _StandIn(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the default backlog of 5 drops SYNs under -c 20 and skews everything by 1s
+    latency = 0.0
+    connections = 0
+    lock = threading.Lock()
+
+
+class _TwilioStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        time.sleep(self.server.latency)
+        body = json.dumps({"sid": "SMbench", "status": "queued"}).encode()
+        self.send_response(201)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _start_stub(latency_ms: float) -> _StandIn:
+    srv = _StandIn(("127.0.0.1", 0), _TwilioStub)
+    srv.latency = latency_ms / 1000.0
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+
+def _summary(lat_ms: List[float], wall: float) -> Dict[str, float]:
+    lat_ms.sort()
+    return {
+        "msg/s": len(lat_ms) / wall,
+        "p50": lat_ms[len(lat_ms) // 2],
+        "p95": lat_ms[max(0, int(len(lat_ms) * 0.95) - 1)],
+    }
+
+
+def _sdk_client(base: str):
+    from twilio.rest import Client
+
+    from app import metrics
+
+    c = Client(SID, TOKEN, http_client=metrics.twilio_http_client())
+    c.api.base_url = base
+    return c
+
+
+def _run_sync(send: Callable[[], None], n: int, threads: int):
+    lat: List[float] = []
+    lock = threading.Lock()
+
+    def one(_):
+        t0 = time.perf_counter()
+        send()
+        with lock:
+            lat.append((time.perf_counter() - t0) * 1000.0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(n)))
+    return _summary(lat, time.perf_counter() - t0)
+
+
+async def _run_async(send, n: int, senders: int):
+    """`senders` coroutines share n sends, like the outbox workers / concurrent routes."""
+    lat: List[float] = []
+    left = [n]
+
+    async def sender():
+        while left[0] > 0:
+            left[0] -= 1
+            t0 = time.perf_counter()
+            await send()
+            lat.append((time.perf_counter() - t0) * 1000.0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(sender() for _ in range(senders)))
+    return _summary(lat, time.perf_counter() - t0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("-n", type=int, default=200, help="messages per case")
+    ap.add_argument("-c", type=int, default=20, help="concurrency (threads / pool connections)")
+    ap.add_argument("--latency-ms", type=float, default=100.0, help="stand-in response delay")
+    ap.add_argument("--base", default=None, help="Twilio API base (default: local stand-in)")
+    args = ap.parse_args()
+
+    srv = None if args.base else _start_stub(args.latency_ms)
+    base = args.base or f"http://127.0.0.1:{srv.server_address[1]}"
+
+    from app.notifications import twilio_async
+
+    msg = {"to": "+910000000000", "from_": "+10000000000", "body": "bench"}
+    rows = []
+
+    def conns_since(before: int) -> str:
+        return str(srv.connections - before) if srv else "-"
+
+    sdk = _sdk_client(base)
+    c0 = srv.connections if srv else 0
+    rows.append(("sdk sync, sequential", _run_sync(lambda: sdk.messages.create(**msg), min(args.n, 50), 1),
+                 conns_since(c0)))
+    c0 = srv.connections if srv else 0
+    rows.append((f"sdk sync, {args.c} threads", _run_sync(lambda: sdk.messages.create(**msg), args.n, args.c),
+                 conns_since(c0)))
+
+    async def fresh_session():
+        c = twilio_async.AsyncTwilio(SID, TOKEN, base_url=base, pool=1)
+        try:
+            await c.messages.create(**msg)
+        finally:
+            await c.close()
+
+    async def pooled_cases():
+        out = []
+        c0 = srv.connections if srv else 0
+        out.append((f"async, {args.c} senders, session per send", await _run_async(fresh_session, args.n, args.c), conns_since(c0)))
+        pooled = twilio_async.AsyncTwilio(SID, TOKEN, base_url=base, pool=args.c)
+        await pooled.messages.create(**msg)  # warm one connection, like the first send after boot
+        c0 = srv.connections if srv else 0
+        out.append((f"async pooled, {args.c} senders",
+                    await _run_async(lambda: pooled.messages.create(**msg), args.n, args.c), conns_since(c0)))
+        await pooled.close()
+        return out
+
+    rows.extend(asyncio.run(pooled_cases()))
+
+    print(f"base={base} n={args.n} c={args.c} latency={args.latency_ms}ms (per-message ms)")
+    print(f"{'case':36s} {'msg/s':>8s} {'p50':>8s} {'p95':>8s} {'conns':>6s}")
+    for name, r, conns in rows:
+        print(f"{name:36s} {r['msg/s']:8.1f} {r['p50']:8.1f} {r['p95']:8.1f} {conns:>6s}")
+
+
+if __name__ == "__main__":
+    main()
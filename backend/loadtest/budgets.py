@@ -0,0 +1,182 @@
+# backend/loadtest/budgets.py
+"""
+Downstream call budgets per kiosk route, checked against the in-memory fakes.
+
+Walks the kiosk funnel once, sequentially, and counts DynamoDB / Cognito / S3 /
+SNS / Twilio calls made while serving each request. Exits non-zero when any
+route goes over its declared budget, so a router change that adds round trips
+fails CI before it shows up as production latency:
+
+    cd backend && python -m loadtest.budgets
+
+tests/test_budgets.py runs the same check under pytest.
+
+Lower a budget in BUDGETS when a change removes calls; never raise one without
+saying why in the commit.
+"""
+import argparse
+import os
+import datetime as dt
+import sys
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from loadtest import inproc
+
+# route -> service -> max calls per request
+BUDGETS: Dict[str, Dict[str, int]] = {
+    # phone -> patient from the patients table PhoneIndex (one Query) instead of Cognito ListUsers,
+    # one conditional session write; the SMS and its delivery-status write run after the response
+    # (TestClient counts background tasks with the request)
+    "POST /kiosk/identify/send-otp": {"dynamodb": 3, "sns": 1, "twilio": 1},
+    # one conditional DeleteItem checks the code hash, TTL and attempts and consumes the session
+    "POST /kiosk/identify/verify-otp": {"dynamodb": 1},
+    # same phone again: served from app/auth/identity_cache.py
+    "POST /kiosk/identify/send-otp (repeat)": {"dynamodb": 2, "sns": 1, "twilio": 1},
+    "GET /appointments/availability": {"dynamodb": 1},
+    # WhatsApp goes through the outbox: one PutItem per message in the request,
+    # the Twilio call happens in the dispatcher (budgeted per message below)
+    "POST /appointments/book": {"dynamodb": 2, "s3": 1},
+    "POST /kiosk/appointments/attach": {"dynamodb": 6},
+    # BatchGetItem + TransactWriteItems + outbox put; the first check-in of the
+    # run also hydrates the lane state (one active-index query per TTL)
+    "POST /kiosk/checkin/issue": {"dynamodb": 4},
+    "POST /kiosk/checkin/issue (repeat)": {"dynamodb": 1},
+    # 2 new + 1 already issued: BatchGetItem + one ADD seq per lane + one TransactWriteItems
+    # (token puts, back-references and the active count) + 2 outbox puts
+    "POST /kiosk/checkin/issue-batch": {"dynamodb": 5},
+    # warm lane: served from app/queue/engine.py
+    "GET /queue/status": {"dynamodb": 0},
+    "POST /queue/status/batch": {"dynamodb": 0},
+    "GET /wallboard/now-next": {"dynamodb": 0},
+    # background, per queued message: StatusDue query share + claim + send + finish
+    "outbox dispatch (per message)": {"dynamodb": 3, "twilio": 1},
+}
+
+# SMS goes out through either SNS or Twilio depending on SMS_PROVIDER; both are budgeted
+# above, but one OTP must never cost more than one message.
+SMS_SERVICES = ("sns", "twilio")
+
+
+def _by_service(before: Dict[Tuple[str, str], int], after: Dict[Tuple[str, str], int]) -> Counter:
+    out: Counter = Counter()
+    for (svc, _op), n in after.items():
+        d = n - before.get((svc, _op), 0)
+        if d:
+            out[svc] += d
+    return out
+
+
+def measure() -> Dict[str, Counter]:
+    from fastapi.testclient import TestClient
+
+    from app import fakes
+    from app.main import app
+
+    patient = fakes.seed_patients(1, prefix="+9198765")[0]
+    local = patient["phone"][3:]
+    day = dt.date.today().isoformat()
+    used: Dict[str, Counter] = {}
+
+    with TestClient(app) as http:
+        def call(route: str, method: str, path: str, **kw):
+            before = fakes.stats()
+            resp = http.request(method, "/api" + path, **kw)
+            used[route] = _by_service(before, fakes.stats())
+            if resp.status_code != 200:
+                raise SystemExit(f"{route}: HTTP {resp.status_code} {resp.text[:200]}")
+            return resp.json()
+
+        sent = call("POST /kiosk/identify/send-otp", "POST", "/kiosk/identify/send-otp",
+                    json={"mobile": local})
+        code = inproc.otp_code(sent["normalizedPhone"], sent["otpSessionId"])
+        who = call("POST /kiosk/identify/verify-otp", "POST", "/kiosk/identify/verify-otp",
+                   json={"mobile": local, "code": code, "otpSessionId": sent["otpSessionId"]})
+        pid = who["patientId"]
+        call("POST /kiosk/identify/send-otp (repeat)", "POST", "/kiosk/identify/send-otp",
+             json={"mobile": local})
+        call("GET /appointments/availability", "GET", "/appointments/availability",
+             params={"type": "doctor", "resourceId": "doc-1", "date": day})
+        appt = call("POST /appointments/book", "POST", "/appointments/book",
+                    json={"patientId": pid, "contact": {"phone": patient["phone"]},
+                          "appointment_details": {"dateISO": day, "timeSlot": "10:00", "doctorId": "doc-1"}})
+        aid = appt["appointmentId"]
+        call("POST /kiosk/appointments/attach", "POST", "/kiosk/appointments/attach",
+             json={"patientId": pid, "appointmentId": aid,
+                   "kiosk": {"reason": "budget", "payment": {"mode": "pay_later"}}})
+        tok = call("POST /kiosk/checkin/issue", "POST", "/kiosk/checkin/issue",
+                   json={"patientId": pid, "appointmentId": aid})
+        call("POST /kiosk/checkin/issue (repeat)", "POST", "/kiosk/checkin/issue",
+             json={"patientId": pid, "appointmentId": aid})
+        family = [
+            http.post("/api/appointments/book", json={
+                "patientId": pid, "contact": {"phone": patient["phone"]},
+                "appointment_details": {"dateISO": day, "timeSlot": slot, "doctorId": "doc-1"},
+            }).json()["appointmentId"]
+            for slot in ("10:15", "10:30")
+        ]
+        batch = call("POST /kiosk/checkin/issue-batch", "POST", "/kiosk/checkin/issue-batch",
+                     json={"items": [{"patientId": pid, "appointmentId": a} for a in [aid, *family]]})
+        call("GET /queue/status", "GET", "/queue/status", params={"tokenKey": tok["tokenKey"]})
+        call("POST /queue/status/batch", "POST", "/queue/status/batch",
+             json={"tokens": [t["tokenKey"] for t in batch["tokens"]]})
+        call("GET /wallboard/now-next", "GET", "/wallboard/now-next", params={"date": day})
+
+        from app.notifications.outbox import dispatcher
+        before = fakes.stats()
+        outcomes = http.portal.call(dispatcher.drain)
+        n = sum(outcomes.values())
+        if not n or outcomes.get("sent", 0) != n:
+            raise SystemExit(f"outbox dispatch: {outcomes}")
+        total = _by_service(before, fakes.stats())
+        used["outbox dispatch (per message)"] = Counter({s: -(-c // n) for s, c in total.items()})
+    return used
+
+
+def check(used: Dict[str, Counter]) -> List[str]:
+    failures = []
+    for route, budget in BUDGETS.items():
+        got = used.get(route)
+        if got is None:
+            failures.append(f"{route}: not exercised")
+            continue
+        for svc, n in got.items():
+            limit = budget.get(svc, 0)
+            if n > limit:
+                failures.append(f"{route}: {svc} {n} calls > budget {limit}")
+        sms = sum(got.get(s, 0) for s in SMS_SERVICES)
+        if route.endswith("/send-otp") and sms > 1:
+            failures.append(f"{route}: {sms} SMS sends for one OTP")
+    return failures
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.parse_args(argv)
+
+    inproc.use_fakes(0)
+    # the ETA history warm-up is a one-time background read per worker, not per request
+    os.environ["ETA_HISTORY_DAYS"] = "0"
+    # drained explicitly after the funnel so background sends don't land in a route's count
+    os.environ["OUTBOX_WORKERS"] = "0"
+    os.environ["REMINDERS_ENABLED"] = "0"
+    used = measure()
+
+    services = sorted({s for b in BUDGETS.values() for s in b} | {s for u in used.values() for s in u})
+    print(f"{'route':40s} " + " ".join(f"{s:>12s}" for s in services))
+    for route, budget in BUDGETS.items():
+        got = used.get(route, Counter())
+        cells = [f"{got.get(s, 0)}/{budget.get(s, 0)}" for s in services]
+        print(f"{route:40s} " + " ".join(f"{c:>12s}" for c in cells))
+
+    failures = check(used)
+    if failures:
+        print("\nOVER BUDGET:", file=sys.stderr)
+        for f in failures:
+            print("  " + f, file=sys.stderr)
+        sys.exit(1)
+    print("\nall routes within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# backend/loadtest/inproc.py
+"""
+Boot the FastAPI app in this process against the in-memory fakes.
+
+Everything here must run before any `app.*` module is imported: routers read
+their configuration (table names, secrets, CLINIC_BACKEND) at import time.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Optional
+
+
+def use_fakes(latency_ms: Optional[float] = None):
+    os.environ["CLINIC_BACKEND"] = "memory"
+    if latency_ms is not None:
+        os.environ["FAKE_LATENCY_MS"] = str(latency_ms)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(port: Optional[int] = None) -> str:
+    """Start uvicorn on a daemon thread; returns the base URL once it accepts connections."""
+    import uvicorn
+
+    from app.main import app
+
+    logging.getLogger().setLevel(logging.WARNING)  # per-request INFO lines would dominate the run
+    port = port or _free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    deadline = time.time() + 15
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError("uvicorn did not start within 15s")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def otp_code(phone: str, session_id: str, timeout: float = 5.0) -> Optional[str]:
+    """
+    Peek at the OTP the kiosk just 'sent' (not counted). Only a hash is stored,
+    so wait for the session's background SMS and read the code from the fake
+    provider's outbox.
+    """
+    from app.fakes import registry, twilio as fake_twilio
+    from app.kiosk.otp import DDB_TABLE_OTP, IDENTIFY
+
+    deadline = time.time() + timeout
+    while True:
+        item = registry.store().get_item(DDB_TABLE_OTP, {"phone": phone, "sessionId": IDENTIFY})
+        if not item or item.get("otpSessionId") != session_id:
+            return None
+        if item.get("delivery") != "queued":
+            break
+        if time.time() > deadline:
+            return None
+        time.sleep(0.01)
+    if item.get("delivery") != "sent":
+        return None
+    texts = [m["Message"] for m in registry.client("sns").sent if m["PhoneNumber"] == phone]
+    texts += [m["body"] or "" for m in list(fake_twilio.sent) if m["to"] == phone]
+    for text in reversed(texts):
+        code = text.split(" ", 1)[0]
+        if code.isdigit():
+            return code
+    return None
@@ -0,0 +1,270 @@
+# backend/loadtest/rush.py
+"""
+Clinic morning-rush load generator: replays the kiosk funnel end to end.
+
+Each simulated patient arrives on a Poisson process (--rate per second) and walks
+send-otp -> verify-otp -> availability -> book -> attach -> checkin/issue, then polls
+/queue/status. Wallboard TVs (--tvs) poll /wallboard/now-next the whole time.
+
+By default the app is booted in-process on the in-memory fakes (CLINIC_BACKEND=memory),
+which also lets us read OTPs and report downstream call counts:
+
+    cd backend && python -m loadtest.rush --rate 20 --duration 30 --latency-ms 8
+
+Against a running stack pass --base-url and --patients (JSON list of
+{"phone", "sub"}); OTP verification is skipped there since codes go out by SMS.
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional
+
+import aiohttp
+
+from loadtest import inproc
+
+SLOT_TIMES = [f"{h:02d}:{m:02d}" for h in range(9, 18) for m in range(0, 60, 5)]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.status: Dict[str, Counter] = defaultdict(Counter)
+        self.funnels = Counter()
+
+    def add(self, route: str, ms: float, status: int):
+        self.samples[route].append(ms)
+        self.status[route][status] += 1
+
+    @staticmethod
+    def _pct(sorted_ms: List[float], p: float) -> float:
+        if not sorted_ms:
+            return 0.0
+        idx = min(len(sorted_ms) - 1, max(0, int(round(p / 100.0 * len(sorted_ms))) - 1))
+        return sorted_ms[idx]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        rows = []
+        for route in sorted(self.samples):
+            ms = sorted(self.samples[route])
+            codes = self.status[route]
+            errors = sum(n for code, n in codes.items() if code == 0 or code >= 500)
+            rows.append({
+                "route": route,
+                "n": len(ms),
+                "p50": self._pct(ms, 50),
+                "p95": self._pct(ms, 95),
+                "p99": self._pct(ms, 99),
+                "max": ms[-1],
+                "errors": errors,
+                "error_rate": errors / len(ms),
+                "status": dict(sorted(codes.items())),
+            })
+        return rows
+
+
+class Target:
+    def __init__(self, base_url: str, patients: List[Dict[str, str]],
+                 otp_lookup: Optional[Callable[[str, str], Optional[str]]] = None):
+        self.base = base_url.rstrip("/") + "/api"
+        self.patients = patients
+        self.otp_lookup = otp_lookup
+        self._next = 0
+
+    def next_patient(self) -> Dict[str, str]:
+        p = self.patients[self._next % len(self.patients)]
+        self._next += 1
+        return p
+
+
+async def _call(http: aiohttp.ClientSession, rec: Recorder, route: str, method: str, url: str, **kw):
+    t0 = time.perf_counter()
+    try:
+        async with http.request(method, url, **kw) as resp:
+            body = await resp.read()
+            status = resp.status
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        rec.add(route, (time.perf_counter() - t0) * 1000.0, 0)
+        return 0, None
+    rec.add(route, (time.perf_counter() - t0) * 1000.0, status)
+    try:
+        return status, json.loads(body) if body else None
+    except ValueError:
+        return status, None
+
+
+async def patient_flow(http, rec: Recorder, tgt: Target, args, day: str):
+    p = tgt.next_patient()
+    phone = p["phone"]
+    local = phone[3:] if phone.startswith("+91") else phone.lstrip("+")
+
+    if tgt.otp_lookup:
+        st, body = await _call(http, rec, "POST /kiosk/identify/send-otp", "POST",
+                               f"{tgt.base}/kiosk/identify/send-otp", json={"mobile": local})
+        if st != 200:
+            rec.funnels["abandoned:send-otp"] += 1
+            return
+        await asyncio.sleep(args.think)
+        code = tgt.otp_lookup(body["normalizedPhone"], body["otpSessionId"])
+        st, body = await _call(http, rec, "POST /kiosk/identify/verify-otp", "POST",
+                               f"{tgt.base}/kiosk/identify/verify-otp",
+                               json={"mobile": local, "code": code, "otpSessionId": body["otpSessionId"]})
+        if st != 200:
+            rec.funnels["abandoned:verify-otp"] += 1
+            return
+        patient_id = body["patientId"]
+    else:
+        patient_id = p["sub"]
+
+    doctor = f"doc-{random.randrange(args.doctors) + 1}"
+    await asyncio.sleep(args.think)
+    st, body = await _call(http, rec, "GET /appointments/availability", "GET",
+                           f"{tgt.base}/appointments/availability",
+                           params={"type": "doctor", "resourceId": doctor, "date": day})
+    booked = set((body or {}).get("booked") or [])
+    free = [t for t in SLOT_TIMES if t not in booked] or SLOT_TIMES
+
+    appointment_id = None
+    for slot in random.sample(free, min(3, len(free))):
+        st, body = await _call(http, rec, "POST /appointments/book", "POST",
+                               f"{tgt.base}/appointments/book",
+                               json={"patientId": patient_id,
+                                     "contact": {"phone": phone},
+                                     "appointment_details": {"dateISO": day, "timeSlot": slot,
+                                                             "doctorId": doctor}})
+        if st == 200:
+            appointment_id = body["appointmentId"]
+            break
+        if st != 409:
+            break
+    if not appointment_id:
+        rec.funnels["abandoned:book"] += 1
+        return
+
+    st, _ = await _call(http, rec, "POST /kiosk/appointments/attach", "POST",
+                        f"{tgt.base}/kiosk/appointments/attach",
+                        json={"patientId": patient_id, "appointmentId": appointment_id,
+                              "kiosk": {"reason": "rush", "device": "loadtest",
+                                        "payment": {"mode": "pay_later"}}})
+    if st != 200:
+        rec.funnels["abandoned:attach"] += 1
+        return
+
+    st, body = await _call(http, rec, "POST /kiosk/checkin/issue", "POST",
+                           f"{tgt.base}/kiosk/checkin/issue",
+                           json={"patientId": patient_id, "appointmentId": appointment_id})
+    if st != 200:
+        rec.funnels["abandoned:issue"] += 1
+        return
+    rec.funnels["checked_in"] += 1
+
+    token = body["tokenNo"]
+    for _ in range(args.polls):
+        await asyncio.sleep(args.poll_interval)
+        await _call(http, rec, "GET /queue/status", "GET", f"{tgt.base}/queue/status",
+                    params={"tokenNo": token})
+
+
+async def tv_loop(http, rec: Recorder, tgt: Target, args, day: str, stop: asyncio.Event):
+    await asyncio.sleep(random.uniform(0, args.tv_interval))
+    while not stop.is_set():
+        await _call(http, rec, "GET /wallboard/now-next", "GET", f"{tgt.base}/wallboard/now-next",
+                    params={"date": day})
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=args.tv_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run(tgt: Target, args) -> Recorder:
+    rec = Recorder()
+    day = args.date or dt.date.today().isoformat()
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    conn = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(timeout=timeout, connector=conn) as http:
+        stop = asyncio.Event()
+        tvs = [asyncio.create_task(tv_loop(http, rec, tgt, args, day, stop)) for _ in range(args.tvs)]
+        flows = []
+        t_end = time.perf_counter() + args.duration
+        while time.perf_counter() < t_end:
+            flows.append(asyncio.create_task(patient_flow(http, rec, tgt, args, day)))
+            await asyncio.sleep(random.expovariate(args.rate))
+        await asyncio.gather(*flows, return_exceptions=True)
+        stop.set()
+        await asyncio.gather(*tvs, return_exceptions=True)
+    rec.funnels["arrived"] = len(flows)
+    return rec
+
+
+def _print_report(rec: Recorder, wall_s: float, downstream: Optional[Dict] = None):
+    print(f"\n{'route':36s} {'n':>6s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s} {'err%':>6s}  status")
+    for r in rec.summary():
+        print(f"{r['route']:36s} {r['n']:6d} {r['p50']:8.1f} {r['p95']:8.1f} {r['p99']:8.1f} "
+              f"{r['max']:8.1f} {100 * r['error_rate']:6.2f}  {r['status']}")
+    print(f"\nfunnel: {dict(rec.funnels)}  wall={wall_s:.1f}s")
+    if downstream:
+        arrived = max(1, rec.funnels["arrived"])
+        print(f"\n{'downstream call':40s} {'total':>8s} {'/patient':>9s}")
+        for (svc, op), n in sorted(downstream.items()):
+            print(f"{svc + ' ' + op:40s} {n:8d} {n / arrived:9.2f}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rate", type=float, default=10.0, help="patient arrivals per second")
+    ap.add_argument("--duration", type=float, default=20.0, help="seconds of arrivals")
+    ap.add_argument("--doctors", type=int, default=6)
+    ap.add_argument("--tvs", type=int, default=4, help="wallboard screens polling")
+    ap.add_argument("--tv-interval", type=float, default=2.0)
+    ap.add_argument("--polls", type=int, default=5, help="/queue/status polls per patient")
+    ap.add_argument("--poll-interval", type=float, default=1.0)
+    ap.add_argument("--think", type=float, default=0.2, help="seconds between kiosk screens")
+    ap.add_argument("--connections", type=int, default=500)
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--date", default=None, help="appointment day (default: today)")
+    ap.add_argument("--latency-ms", type=float, default=None, help="fake per-call latency (in-process only)")
+    ap.add_argument("--base-url", default=None, help="hit a running stack instead of booting in-process")
+    ap.add_argument("--patients", default=None, help="JSON file of [{phone, sub}] for --base-url runs")
+    ap.add_argument("--json", default=None, help="write the summary to this file")
+    args = ap.parse_args(argv)
+
+    downstream_fn = None
+    if args.base_url:
+        if not args.patients:
+            ap.error("--base-url needs --patients")
+        with open(args.patients) as f:
+            tgt = Target(args.base_url, json.load(f))
+    else:
+        inproc.use_fakes(args.latency_ms)
+        base = inproc.serve()
+        from app import fakes
+
+        n = max(1, int(args.rate * args.duration * 1.2))
+        tgt = Target(base, fakes.seed_patients(n), otp_lookup=inproc.otp_code)
+        fakes.reset_stats()
+        downstream_fn = fakes.stats
+        print(f"in-process app at {base} (fakes, {n} patients seeded)", file=sys.stderr)
+
+    t0 = time.perf_counter()
+    rec = asyncio.run(run(tgt, args))
+    wall = time.perf_counter() - t0
+    downstream = downstream_fn() if downstream_fn else None
+    _print_report(rec, wall, downstream)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "routes": rec.summary(),
+                "funnel": dict(rec.funnels),
+                "wall_s": wall,
+                "downstream": {f"{s}:{o}": n for (s, o), n in (downstream or {}).items()},
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# backend/scripts/backfill_active_index.py
+"""
+Backfill the sparse active-token index (QUEUE_ACTIVE_INDEX) on the tokens table.
+
+Tokens written before the index existed lack activePK / activeSK. This scans
+the table and:
+  * sets activePK = date#lane, activeSK = seq on waiting / called / roomed tokens,
+  * removes them from tokens that have already left the line.
+Each write is conditioned on the status seen by the scan, so a token that
+changes concurrently is left to the live code path. Safe to re-run.
+
+    cd backend && python -m scripts.backfill_active_index --dry-run
+    cd backend && python -m scripts.backfill_active_index --segments 8 [--date 2025-01-31]
+"""
+import argparse
+import logging
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.db import clients  # noqa: E402
+from app.queue.engine import ACTIVE_STATUSES, active_keys  # noqa: E402
+
+log = logging.getLogger("backfill-active-index")
+
+TOKENS_TABLE_NAME = os.getenv("DDB_TABLE_TOKENS", "medmitra_tokens")
+
+
+def _fix(tbl, item, dry_run: bool, stats: Counter, lock: threading.Lock):
+    status = item.get("status") or "waiting"
+    has_keys = "activePK" in item
+    active = status in ACTIVE_STATUSES
+    if active == has_keys:
+        outcome = "ok"
+    elif not all(k in item for k in ("date", "lane", "seq")):
+        outcome = "skipped_incomplete"
+    elif dry_run:
+        outcome = "would_set" if active else "would_remove"
+    else:
+        try:
+            if active:
+                keys = active_keys(item["date"], item["lane"], int(item["seq"]))
+                tbl.update_item(
+                    Key={"tokenId": item["tokenId"]},
+                    UpdateExpression="SET activePK = :pk, activeSK = :sk",
+                    ConditionExpression="#s = :s OR (attribute_not_exists(#s) AND :s = :w)",
+                    ExpressionAttributeNames={"#s": "status"},
+                    ExpressionAttributeValues={
+                        ":pk": keys["activePK"], ":sk": keys["activeSK"], ":s": status, ":w": "waiting",
+                    },
+                )
+                outcome = "set"
+            else:
+                tbl.update_item(
+                    Key={"tokenId": item["tokenId"]},
+                    UpdateExpression="REMOVE activePK, activeSK",
+                    ConditionExpression="#s = :s",
+                    ExpressionAttributeNames={"#s": "status"},
+                    ExpressionAttributeValues={":s": status},
+                )
+                outcome = "removed"
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            outcome = "changed_concurrently"
+    with lock:
+        stats[outcome] += 1
+
+
+def _segment(seg: int, total: int, args, stats: Counter, lock: threading.Lock):
+    tbl = clients.table(TOKENS_TABLE_NAME)
+    kw = {
+        "ProjectionExpression": "tokenId, #s, #d, lane, seq, activePK",
+        "ExpressionAttributeNames": {"#s": "status", "#d": "date"},
+        "Segment": seg,
+        "TotalSegments": total,
+    }
+    if args.date:
+        kw["FilterExpression"] = Attr("date").eq(args.date)
+    while True:
+        resp = tbl.scan(**kw)
+        for item in resp.get("Items", []):
+            _fix(tbl, item, args.dry_run, stats, lock)
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            break
+        kw["ExclusiveStartKey"] = lek
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    ap.add_argument("--date", default=None, help="only tokens of this YYYY-MM-DD")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    stats: Counter = Counter()
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=args.segments) as pool:
+        futures = [pool.submit(_segment, i, args.segments, args, stats, lock) for i in range(args.segments)]
+        for f in futures:
+            f.result()
+    log.info("%s on %s: %s", "dry run" if args.dry_run else "backfill", TOKENS_TABLE_NAME, dict(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# backend/scripts/backfill_patient_phones.py
+"""
+Sync Cognito users' phones into the patients table phone index (PATIENTS_PHONE_INDEX).
+
+Walk-ins registered at the kiosk get phoneE164 / phoneVerified from
+walkin_register; patient-portal users only exist in Cognito. This pages
+through ListUsers and, for every user with a phone_number, sets
+phoneE164 / phoneVerified on the patients item keyed by their sub, creating
+a minimal item (name, mobile, source "cognito") where none exists; fields
+a walk-in registration already wrote are kept. Items that already match are
+not rewritten, so re-running (e.g. nightly, to pick up newly verified
+phones) is cheap and safe.
+
+    cd backend && python -m scripts.backfill_patient_phones --dry-run
+    cd backend && python -m scripts.backfill_patient_phones [--page-delay 0.25] [--workers 8]
+"""
+import argparse
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app import fakes  # noqa: E402
+from app.auth.phone_index import DDB_TABLE_PATIENTS, phone_key  # noqa: E402
+from app.db import clients  # noqa: E402
+
+log = logging.getLogger("backfill-patient-phones")
+
+COGNITO_USER_POOL_ID = fakes.secret("COGNITO_USER_POOL_ID", "local_fake_pool")
+ATTRIBUTES = ["sub", "phone_number", "phone_number_verified", "given_name", "family_name", "name"]
+
+
+def _sync(tbl, user, dry_run: bool, stats: Counter, lock: threading.Lock):
+    attrs = {a["Name"]: a["Value"] for a in user.get("Attributes", [])}
+    sub = attrs.get("sub") or user.get("Username")
+    phone = phone_key(attrs.get("phone_number") or "")
+    verified = str(attrs.get("phone_number_verified", "")).lower() == "true"
+    if not sub or not phone:
+        outcome = "skipped_no_phone"
+    elif dry_run:
+        outcome = "would_sync"
+    else:
+        first = (attrs.get("given_name") or "").strip()
+        last = (attrs.get("family_name") or "").strip()
+        full = (attrs.get("name") or f"{first} {last}").strip()
+        try:
+            tbl.update_item(
+                Key={"patientId": sub},
+                UpdateExpression=(
+                    "SET phoneE164 = :p, phoneVerified = :v, mobile = if_not_exists(mobile, :p), "
+                    "firstName = if_not_exists(firstName, :f), lastName = if_not_exists(lastName, :l), "
+                    "fullName = if_not_exists(fullName, :n), #src = if_not_exists(#src, :src), "
+                    "createdAt = if_not_exists(createdAt, :now)"
+                ),
+                ConditionExpression="attribute_not_exists(phoneE164) OR phoneE164 <> :p OR phoneVerified <> :v",
+                ExpressionAttributeNames={"#src": "source"},
+                ExpressionAttributeValues={
+                    ":p": phone, ":v": verified, ":f": first, ":l": last, ":n": full, ":src": "cognito",
+                    ":now": datetime.now(timezone.utc).isoformat(),
+                },
+            )
+            outcome = "synced"
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            outcome = "unchanged"
+    with lock:
+        stats[outcome] += 1
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--page-delay", type=float, default=0.25,
+                    help="seconds between ListUsers pages (the API allows only a few calls/sec per pool)")
+    ap.add_argument("--workers", type=int, default=8, help="parallel DynamoDB writers")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    cognito = clients.cognito()
+    tbl = clients.table(DDB_TABLE_PATIENTS)
+    stats: Counter = Counter()
+    lock = threading.Lock()
+    kw = {"UserPoolId": COGNITO_USER_POOL_ID, "AttributesToGet": ATTRIBUTES, "Limit": 60}
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        while True:
+            resp = cognito.list_users(**kw)
+            futures = [pool.submit(_sync, tbl, u, args.dry_run, stats, lock) for u in resp.get("Users", [])]
+            for f in futures:
+                f.result()
+            token = resp.get("PaginationToken")
+            if not token:
+                break
+            kw["PaginationToken"] = token
+            time.sleep(args.page_delay)
+    log.info("%s on %s: %s", "dry run" if args.dry_run else "backfill", DDB_TABLE_PATIENTS, dict(stats))
+
+
+if __name__ == "__main__":
+    main()
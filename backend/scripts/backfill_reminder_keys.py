@@ -0,0 +1,125 @@
+# backend/scripts/backfill_reminder_keys.py
+"""
+Backfill reminderDay / reminderAt (REMINDER_INDEX) on upcoming appointments.
+
+Bookings written before the 2h reminder scheduler, or by the Lambda writers,
+lack the index keys. This scans the appointments table and sets them on
+live (not cancelled) doctor and lab bookings from --from-date on that have
+a concrete HH:mm slot. Each write is conditioned on the status seen by the
+scan and on the keys still being absent, so a booking cancelled or rebooked
+concurrently is left to the live code path. Safe to re-run.
+
+    cd backend && python -m scripts.backfill_reminder_keys --dry-run
+    cd backend && python -m scripts.backfill_reminder_keys --segments 8 [--from-date 2025-01-31]
+"""
+import argparse
+import json
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.db import clients  # noqa: E402
+from app.db.dynamo import DDB_TABLE_APPOINTMENTS  # noqa: E402
+from app.notifications.reminders import CLINIC_TZ, reminder_keys  # noqa: E402
+
+log = logging.getLogger("backfill-reminder-keys")
+
+
+def _slot(item):
+    """(dateISO, timeSlot) of a doctor or lab booking."""
+    date_key = item.get("dateKey")
+    if date_key and "#" in date_key:
+        return tuple(date_key.split("#", 1))
+    details = item.get("appointment_details") or {}
+    if isinstance(details, str):
+        try:
+            details = json.loads(details)
+        except ValueError:
+            details = {}
+    collection = item.get("collection") or {}
+    return (
+        details.get("dateISO") or collection.get("preferredDateISO"),
+        details.get("timeSlot") or collection.get("preferredSlot"),
+    )
+
+
+def _fix(tbl, item, args, stats: Counter, lock: threading.Lock):
+    status = item.get("status")
+    date_iso, time_slot = _slot(item)
+    keys = reminder_keys(date_iso, time_slot)
+    if "reminderDay" in item:
+        outcome = "ok"
+    elif str(status or "").upper() in ("CANCELLED", "CANCELED"):
+        outcome = "skipped_cancelled"
+    elif not keys:
+        outcome = "skipped_no_slot"
+    elif keys["reminderDay"] < args.from_date:
+        outcome = "skipped_past"
+    elif args.dry_run:
+        outcome = "would_set"
+    else:
+        try:
+            tbl.update_item(
+                Key={"patientId": item["patientId"], "appointmentId": item["appointmentId"]},
+                UpdateExpression="SET reminderDay = :d, reminderAt = :t",
+                ConditionExpression="attribute_not_exists(reminderDay) AND "
+                                    "(#s = :s OR (attribute_not_exists(#s) AND :s = :none))",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={
+                    ":d": keys["reminderDay"], ":t": keys["reminderAt"], ":s": status or "", ":none": "",
+                },
+            )
+            outcome = "set"
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+            outcome = "changed_concurrently"
+    with lock:
+        stats[outcome] += 1
+
+
+def _segment(seg: int, total: int, args, stats: Counter, lock: threading.Lock):
+    tbl = clients.table(DDB_TABLE_APPOINTMENTS)
+    kw = {
+        "ProjectionExpression": "patientId, appointmentId, #s, dateKey, appointment_details, #c, reminderDay",
+        "ExpressionAttributeNames": {"#s": "status", "#c": "collection"},
+        "Segment": seg,
+        "TotalSegments": total,
+    }
+    while True:
+        resp = tbl.scan(**kw)
+        for item in resp.get("Items", []):
+            _fix(tbl, item, args, stats, lock)
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            break
+        kw["ExclusiveStartKey"] = lek
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--segments", type=int, default=4, help="parallel scan segments")
+    ap.add_argument("--from-date", default=datetime.now(CLINIC_TZ).date().isoformat(),
+                    help="first YYYY-MM-DD to backfill (default: today)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    stats: Counter = Counter()
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=args.segments) as pool:
+        futures = [pool.submit(_segment, i, args.segments, args, stats, lock) for i in range(args.segments)]
+        for f in futures:
+            f.result()
+    log.info("%s on %s: %s", "dry run" if args.dry_run else "backfill", DDB_TABLE_APPOINTMENTS, dict(stats))
+
+
+if __name__ == "__main__":
+    main()
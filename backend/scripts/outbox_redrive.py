@@ -0,0 +1,77 @@
+# backend/scripts/outbox_redrive.py
+"""
+Requeue dead-lettered notifications from the outbox (DDB_TABLE_OUTBOX).
+
+Reads status "dead" from the StatusDue index and puts each item back to
+pending, due now, with its attempt count reset; a running dispatcher picks
+them up on its next poll. Each write is conditioned on the item still being
+dead, so re-running (or racing another redrive) never sends twice.
+
+    cd backend && python -m scripts.outbox_redrive --dry-run
+    cd backend && python -m scripts.outbox_redrive [--kind whatsapp.send_doctor_checkin_confirmation] [--limit 500]
+"""
+import argparse
+import logging
+import time
+from collections import Counter
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.db import clients  # noqa: E402
+from app.notifications.outbox import DDB_TABLE_OUTBOX, DEAD, OUTBOX_INDEX, PENDING  # noqa: E402
+
+log = logging.getLogger("outbox-redrive")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--kind", default=None, help="only this message kind")
+    ap.add_argument("--limit", type=int, default=0, help="stop after this many (0 = all)")
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    tbl = clients.table(DDB_TABLE_OUTBOX)
+    stats: Counter = Counter()
+    kw = {"IndexName": OUTBOX_INDEX, "KeyConditionExpression": Key("status").eq(DEAD)}
+    done = False
+    while not done:
+        resp = tbl.query(**kw)
+        for item in resp.get("Items", []):
+            if args.kind and item.get("kind") != args.kind:
+                continue
+            if args.limit and stats["requeued"] + stats["would_requeue"] >= args.limit:
+                done = True
+                break
+            if args.dry_run:
+                log.info("would requeue %s (%s): %s", item["messageId"], item.get("kind"), item.get("lastError"))
+                stats["would_requeue"] += 1
+                continue
+            try:
+                tbl.update_item(
+                    Key={"messageId": item["messageId"]},
+                    UpdateExpression="SET #s = :pending, dueAt = :now, attempts = :zero",
+                    ConditionExpression="#s = :dead",
+                    ExpressionAttributeNames={"#s": "status"},
+                    ExpressionAttributeValues={
+                        ":pending": PENDING, ":now": int(time.time()), ":zero": 0, ":dead": DEAD,
+                    },
+                )
+                stats["requeued"] += 1
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                stats["changed_concurrently"] += 1
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            break
+        kw["ExclusiveStartKey"] = lek
+    log.info("%s on %s: %s", "dry run" if args.dry_run else "redrive", DDB_TABLE_OUTBOX, dict(stats))
+
+
+if __name__ == "__main__":
+    main()
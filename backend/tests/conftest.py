@@ -0,0 +1,30 @@
+# backend/tests/conftest.py
+"""
+The suite runs the app in-process against the in-memory fakes (app/fakes),
+like loadtest/budgets.py, so it needs no AWS / Twilio credentials:
+
+    cd backend && pip install -r requirements-dev.txt && python -m pytest -q
+
+Routers read their configuration at import time, so the environment is set
+here, before any test module imports `app`.
+"""
+import os
+
+from loadtest import inproc
+
+inproc.use_fakes(0)
+os.environ["ETA_HISTORY_DAYS"] = "0"   # no history warm-up read on startup
+os.environ["OUTBOX_WORKERS"] = "0"     # tests drain the outbox themselves
+os.environ["REMINDERS_ENABLED"] = "0"  # tests drive the scheduler directly
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def http():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,6 @@
+from loadtest import budgets
+
+
+def test_kiosk_funnel_within_call_budgets():
+    used = budgets.measure()
+    assert budgets.check(used) == []
@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+from app.db import aio, clients
+from app.queue.engine import LaneState, QueueEngine, parse_token_key, parse_token_no, token_key
+from app.queue.router import TOKENS_TABLE_NAME, _token_item
+
+ETA = {"etaLow": 0, "etaHigh": 15}
+
+
+def _tok(day, seq, status="waiting", lane="A", appt=None):
+    item = _token_item(f"p{seq}", appt or f"e-{day}-{seq}", day, lane, seq, "d1", "10:00", ETA)
+    item["status"] = status
+    if status not in ("waiting", "called", "roomed"):
+        item.pop("activePK")
+        item.pop("activeSK")
+    return item
+
+
+def test_position_counts_active_tokens_ahead():
+    st = LaneState("2025-01-01", "A")
+    st.load([_tok("2025-01-01", s) for s in (1, 2, 4, 7)], time.monotonic())
+    assert [st.position(s) for s in (1, 4, 7, 8)] == [0, 2, 3, 4]
+    st.upsert(_tok("2025-01-01", 2, "done"))
+    assert st.position(7) == 2  # finished tokens leave the line
+    st.upsert(_tok("2025-01-01", 4, "called"))
+    assert st.position(7) == 2  # called tokens are still ahead
+    assert [t["tokenNo"] for t in st.waiting_tokens()] == ["A1", "A7"]
+    assert [t["tokenNo"] for t in st.called_tokens()] == ["A4"]
+
+
+def test_lookups_and_versions():
+    st = LaneState("2025-01-01", "A")
+    v = st.version
+    st.upsert(_tok("2025-01-01", 3, appt="appt-3"))
+    assert st.version > v
+    assert st.token("A3")["seq"] == 3
+    assert st.for_appointment("appt-3")["tokenNo"] == "A3"
+    assert st.last_seq == 3
+
+
+def test_refresh_keeps_newer_local_writes():
+    st = LaneState("2025-01-01", "A")
+    started = time.monotonic()
+    st.upsert(_tok("2025-01-01", 5))  # written while the snapshot was being read
+    st.load([_tok("2025-01-01", 1)], started)
+    assert st.active == [1, 5]
+    st.load([_tok("2025-01-01", 1)], time.monotonic())
+    assert st.active == [1]  # older than the next snapshot: the table wins
+
+
+def test_hydrates_from_the_active_index_only():
+    day = "2025-02-01"
+    tbl = clients.table(TOKENS_TABLE_NAME)
+    for item in (_tok(day, 1, "done"), _tok(day, 2), _tok(day, 3, "called")):
+        tbl.put_item(Item=item)
+
+    async def run():
+        st = await QueueEngine(aio.table(TOKENS_TABLE_NAME)).lane(day, "A")
+        return st.active, st.token("A1")
+
+    active, finished = asyncio.run(run())
+    assert active == [2, 3]
+    assert finished is None
+
+
+def test_evict_before_drops_earlier_days():
+    async def run():
+        eng = QueueEngine(aio.table(TOKENS_TABLE_NAME))
+        await eng.lane("2025-03-01", "A")
+        await eng.lane("2025-03-02", "A")
+        eng.evict_before("2025-03-02")
+        return eng
+
+    eng = asyncio.run(run())
+    assert eng.get("2025-03-01", "A") is None
+    assert eng.get("2025-03-02", "A") is not None
+
+
+def test_rollover_runs_when_a_lane_is_created():
+    async def run():
+        eng = QueueEngine(aio.table(TOKENS_TABLE_NAME))
+        eng._lanes[("2000-01-01", "A")] = LaneState("2000-01-01", "A")
+        await eng.lane("2025-03-03", "A")  # first lane seen today: rolls over
+        return eng
+
+    eng = asyncio.run(run())
+    assert eng.get("2000-01-01", "A") is None
+
+
+def test_token_keys():
+    assert token_key("2025-01-31", "A12") == "2025-01-31#A12"
+    assert parse_token_key("2025-01-31#A12") == ("2025-01-31", "A12")
+    assert parse_token_key("0b6c9a3e-uuid") is None
+    assert parse_token_no("B7") == ("B", 7)
+    assert parse_token_no("7B") is None
@@ -0,0 +1,96 @@
+import asyncio
+import uuid
+from datetime import date
+
+from app import fakes
+from app.db import clients
+from app.db.dynamo import DDB_TABLE_APPOINTMENTS
+from app.queue import router
+from app.queue.router import COUNTERS_TABLE_NAME, IssueTokenReq, _counter_key
+from loadtest.budgets import _by_service
+
+
+def _appointment(day=None) -> IssueTokenReq:
+    """An appointment with no contact, so check-in queues no confirmation."""
+    req = IssueTokenReq(patientId="issue-patient", appointmentId=f"issue-{uuid.uuid4().hex[:12]}")
+    clients.table(DDB_TABLE_APPOINTMENTS).put_item(Item={
+        "patientId": req.patientId, "appointmentId": req.appointmentId, "recordType": "doctor",
+        "status": "BOOKED", "dateISO": day or date.today().isoformat(), "timeSlot": "10:00", "doctorId": "doc-issue",
+    })
+    return req
+
+
+def _issue_all(http, reqs):
+    async def run():
+        return await asyncio.gather(*(router.issue_token(r) for r in reqs))
+    return http.portal.call(run)
+
+
+def _counter(day=None) -> int:
+    item = clients.table(COUNTERS_TABLE_NAME).get_item(
+        Key=_counter_key(day or date.today().isoformat(), "A"),
+    ).get("Item") or {}
+    return int(item.get("seq", 0))
+
+
+def test_concurrent_taps_get_one_token(http):
+    req = _appointment()
+    before = _counter()
+    tokens = _issue_all(http, [req] * 5)
+    assert len({t.tokenNo for t in tokens}) == 1
+    assert _counter() == before + 1
+    appt = clients.table(DDB_TABLE_APPOINTMENTS).get_item(
+        Key={"patientId": req.patientId, "appointmentId": req.appointmentId},
+    )["Item"]
+    assert appt["tokenId"] == tokens[0].tokenKey
+
+
+def test_concurrent_appointments_get_distinct_seqs(http):
+    reqs = [_appointment() for _ in range(8)]
+    before = _counter()
+    tokens = _issue_all(http, reqs)
+    seqs = sorted(int(t.tokenNo[1:]) for t in tokens)
+    assert seqs == list(range(before + 1, before + 9))
+    assert _counter() == before + 8
+
+
+def test_counter_race_with_another_worker_retries(http, monkeypatch):
+    req = _appointment()
+    real = router._issue_write
+    results = []
+
+    async def racing(item, cur_seq):
+        if not results:
+            # another worker takes the next seq between our read and our write
+            clients.table(COUNTERS_TABLE_NAME).update_item(
+                Key=_counter_key(item["date"], item["lane"]),
+                UpdateExpression="ADD seq :one",
+                ExpressionAttributeValues={":one": 1},
+            )
+        results.append(await real(item, cur_seq))
+        return results[-1]
+
+    monkeypatch.setattr(router, "_issue_write", racing)
+    before = _counter()
+    (token,) = _issue_all(http, [req])
+    assert results == ["retry", None]
+    assert token.tokenNo == f"A{before + 2}"
+    assert _counter() == before + 2
+
+
+def test_issue_is_two_dynamodb_calls_on_a_warm_lane(http):
+    _issue_all(http, [_appointment()])  # warm today's lane
+    req = _appointment()
+
+    before = fakes.stats()
+    assert http.post("/api/kiosk/checkin/issue", json=req.dict()).status_code == 200
+    assert _by_service(before, fakes.stats())["dynamodb"] == 2  # BatchGetItem + TransactWriteItems
+
+    before = fakes.stats()
+    assert http.post("/api/kiosk/checkin/issue", json=req.dict()).status_code == 200
+    assert _by_service(before, fakes.stats())["dynamodb"] == 1  # repeat: the read only
+
+
+def test_unknown_appointment_is_404(http):
+    r = http.post("/api/kiosk/checkin/issue", json={"patientId": "nobody-here", "appointmentId": "no-such-appt"})
+    assert r.status_code == 404
@@ -0,0 +1,73 @@
+import uuid
+
+from app.db import clients
+from app.db.dynamo import DDB_TABLE_APPOINTMENTS
+from app.queue import router
+from app.queue.router import COUNTERS_TABLE_NAME, IssueTokenReq, _counter_key
+
+
+def _appointment(day: str) -> IssueTokenReq:
+    req = IssueTokenReq(patientId="batch-patient", appointmentId=f"batch-{uuid.uuid4().hex[:12]}")
+    clients.table(DDB_TABLE_APPOINTMENTS).put_item(Item={
+        "patientId": req.patientId, "appointmentId": req.appointmentId, "recordType": "doctor",
+        "status": "BOOKED", "dateISO": day, "timeSlot": "10:00", "doctorId": "doc-batch",
+    })
+    return req
+
+
+def _counter(day: str):
+    item = clients.table(COUNTERS_TABLE_NAME).get_item(Key=_counter_key(day, "A")).get("Item") or {}
+    return int(item.get("seq", 0)), int(item.get("active", 0))
+
+
+def _batch(http, reqs):
+    return http.post("/api/kiosk/checkin/issue-batch", json={"items": [r.dict() for r in reqs]})
+
+
+def test_batch_issues_new_tokens_and_returns_existing_ones(http):
+    day = "2031-01-01"
+    done = _appointment(day)
+    first = http.post("/api/kiosk/checkin/issue", json=done.dict()).json()
+    new = [_appointment(day), _appointment(day)]
+    missing = IssueTokenReq(patientId="batch-patient", appointmentId="batch-missing")
+
+    r = _batch(http, [done, *new, missing])
+    assert r.status_code == 200
+    body = r.json()
+    assert [t["appointmentId"] for t in body["tokens"]] == [done.appointmentId, *(n.appointmentId for n in new)]
+    assert body["tokens"][0]["tokenNo"] == first["tokenNo"]
+    assert [t["tokenNo"] for t in body["tokens"][1:]] == ["A2", "A3"]
+    assert body["notFound"] == ["batch-missing"]
+    # only tokens actually written count as active
+    assert _counter(day) == (3, 3)
+
+    again = _batch(http, [done, *new]).json()
+    assert [t["tokenNo"] for t in again["tokens"]] == ["A1", "A2", "A3"]
+    assert _counter(day) == (3, 3)
+
+
+def test_appointment_checked_in_elsewhere_mid_batch(http, monkeypatch):
+    day = "2031-01-02"
+    reqs = [_appointment(day) for _ in range(3)]
+    real = router._reserve_seqs
+
+    async def reserve_then_race(d, lane, n):
+        first = await real(d, lane, n)
+        await router.issue_token(reqs[1])  # another kiosk, after our reservation
+        return first
+
+    monkeypatch.setattr(router, "_reserve_seqs", reserve_then_race)
+    body = _batch(http, reqs).json()
+    tokens = {t["appointmentId"]: t["tokenNo"] for t in body["tokens"]}
+    assert set(tokens) == {r.appointmentId for r in reqs}
+    assert tokens[reqs[1].appointmentId] == "A4"  # the single check-in's token, after the reserved range
+    seq, active = _counter(day)
+    assert seq == 4
+    assert active == 3  # 2 from the batch + 1 from the single check-in; the unused seq A2 isn't counted
+
+
+def test_batch_limits(http):
+    assert _batch(http, []).status_code == 400
+    many = [IssueTokenReq(patientId="batch-patient", appointmentId=f"limit-{i:04d}")
+            for i in range(router.QUEUE_BATCH_MAX + 1)]
+    assert _batch(http, many).status_code == 400
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from app.queue import lanes
+from app.queue.lanes import LaneRing
+
+DOCTORS = [f"doc-{i}" for i in range(400)]
+
+
+def test_assignment_is_the_same_in_every_process():
+    ring = LaneRing(["A", "B", "C"])
+    here = [ring.lane_for(d) for d in DOCTORS[:50]]
+    code = (
+        "from app.queue.lanes import LaneRing; r = LaneRing(['A', 'B', 'C']); "
+        f"print(','.join(r.lane_for(f'doc-{{i}}') for i in range(50)))"
+    )
+    env = {**os.environ, "PYTHONHASHSEED": "12345"}  # str hash() would differ; md5 must not
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=backend, env=env,
+                         capture_output=True, text=True, check=True)
+    assert out.stdout.strip().split(",") == here
+
+
+def test_every_lane_gets_doctors():
+    ring = LaneRing(["A", "B", "C"])
+    counts = {ln: 0 for ln in ring.lanes}
+    for d in DOCTORS:
+        counts[ring.lane_for(d)] += 1
+    assert all(n > len(DOCTORS) / 3 * 0.5 for n in counts.values()), counts
+
+
+def test_adding_a_lane_moves_only_its_share():
+    before, after = LaneRing(["A", "B", "C"]), LaneRing(["A", "B", "C", "D"])
+    moved = [d for d in DOCTORS if before.lane_for(d) != after.lane_for(d)]
+    assert all(after.lane_for(d) == "D" for d in moved)  # nobody moves between old lanes
+    assert len(moved) < len(DOCTORS) * 0.4
+
+
+def test_preference_lists_every_lane_once():
+    ring = LaneRing(["A", "B", "C"])
+    pref = ring.preference("doc-7")
+    assert sorted(pref) == ["A", "B", "C"]
+    assert pref[0] == ring.lane_for("doc-7")
+    assert ring.lane_for(None) == "A"
+
+
+def _choose(monkeypatch, counts, doctor="doc-7"):
+    monkeypatch.setattr(lanes, "QUEUE_LANE_MODE", "shortest")
+    monkeypatch.setattr(lanes, "ring", LaneRing(["A", "B", "C"]))
+
+    async def active(day, lane):
+        return counts[lane]
+
+    return asyncio.run(lanes.choose_lane("2025-01-01", doctor, active))
+
+
+def test_shortest_mode_picks_the_emptiest_lane(monkeypatch):
+    assert _choose(monkeypatch, {"A": 5, "B": 1, "C": 3}) == "B"
+
+
+def test_shortest_mode_ties_follow_the_ring(monkeypatch):
+    home = LaneRing(["A", "B", "C"]).lane_for("doc-7")
+    assert _choose(monkeypatch, {"A": 2, "B": 2, "C": 2}) == home
+
+
+def test_hash_mode_ignores_queue_length(monkeypatch):
+    monkeypatch.setattr(lanes, "QUEUE_LANE_MODE", "hash")
+    monkeypatch.setattr(lanes, "ring", LaneRing(["A", "B", "C"]))
+
+    async def active(day, lane):
+        raise AssertionError("hash mode must not read lane state")
+
+    assert asyncio.run(lanes.choose_lane("2025-01-01", "doc-7", active)) == lanes.ring.lane_for("doc-7")
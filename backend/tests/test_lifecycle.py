@@ -0,0 +1,94 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app.db import clients
+from app.queue import lifecycle
+from app.queue.router import LANES, TOKENS_TABLE_NAME, _token_item
+
+STAFF = {"X-Staff-Key": "local-fake-staff-key"}
+LANE = LANES[0]
+
+
+def _day(back: int) -> str:
+    """Each test uses its own queue day so lane state never leaks between tests."""
+    return (date.today() - timedelta(days=back)).isoformat()
+
+
+def _issue(day: str, *seqs: int, doctor: str = "d1"):
+    eta = {"etaLow": 0, "etaHigh": 15}
+    tbl = clients.table(TOKENS_TABLE_NAME)
+    for seq in seqs:
+        tbl.put_item(Item=_token_item(f"p{seq}", f"a-{day}-{seq}", day, LANE, seq, doctor, "10:00", eta))
+
+
+def _call(http, day, **extra):
+    return http.post("/api/queue/call-next", json={"lane": LANE, "date": day, **extra}, headers=STAFF)
+
+
+def test_requires_staff_key(http):
+    day = _day(0)
+    assert http.post("/api/queue/call-next", json={"lane": LANE, "date": day}).status_code == 422
+    r = http.post("/api/queue/call-next", json={"lane": LANE, "date": day}, headers={"X-Staff-Key": "nope"})
+    assert r.status_code == 401
+
+
+def test_call_room_complete(http):
+    day = _day(1)
+    _issue(day, 2, 1)
+
+    r = _call(http, day, room="R1")
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["tokenNo"], body["status"], body["room"]) == (f"{LANE}1", "called", "R1")
+
+    r = http.post(f"/api/queue/tokens/{LANE}1/room", json={"date": day}, headers=STAFF)
+    assert r.json()["status"] == "roomed"
+    r = http.post(f"/api/queue/tokens/{LANE}1/complete", json={"date": day}, headers=STAFF)
+    assert r.json()["status"] == "done"
+    assert r.json()["active"] == 1  # A2 is still waiting
+
+    # done is terminal
+    r = http.post(f"/api/queue/tokens/{LANE}1/no-show", json={"date": day}, headers=STAFF)
+    assert r.status_code == 409
+    assert "is done" in r.json()["detail"]
+
+
+def test_call_next_filters_by_doctor(http):
+    day = _day(2)
+    _issue(day, 1, doctor="d1")
+    _issue(day, 2, doctor="d2")
+    assert _call(http, day, doctorId="d2").json()["tokenNo"] == f"{LANE}2"
+
+
+def test_call_next_finds_tokens_issued_elsewhere(http):
+    day = _day(3)
+    assert _call(http, day).status_code == 404
+    _issue(day, 1)  # another worker checks a patient in
+    assert _call(http, day).json()["tokenNo"] == f"{LANE}1"
+    assert _call(http, day).status_code == 404
+
+
+def test_call_next_gives_up_after_lost_claims(http, monkeypatch):
+    day = _day(4)
+    _issue(day, 1, 2)
+
+    async def _lost(t, to, room=None):
+        raise lifecycle.Conflict(None)
+
+    monkeypatch.setattr(lifecycle, "_transition", _lost)
+    r = _call(http, day)
+    assert r.status_code == 409
+    assert "try again" in r.json()["detail"]
+
+
+def test_unknown_lane_and_bad_day(http):
+    assert http.post("/api/queue/call-next", json={"lane": "ZZ"}, headers=STAFF).status_code == 404
+    assert _call(http, "2020-01-01").status_code == 400
+    assert _call(http, "not-a-day").status_code == 400
+
+
+@pytest.mark.parametrize("path", ["room", "complete", "no-show"])
+def test_unknown_token(http, path):
+    r = http.post(f"/api/queue/tokens/{LANE}999/{path}", json={"date": _day(5)}, headers=STAFF)
+    assert r.status_code == 404
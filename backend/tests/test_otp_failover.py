@@ -0,0 +1,67 @@
+import asyncio
+import time
+
+import pytest
+
+from app.kiosk import otp
+
+
+@pytest.fixture
+def senders(monkeypatch):
+    """Twilio primary with SNS failover, both replaced by stubs; returns the call log."""
+    calls = []
+    monkeypatch.setattr(otp, "SMS_PROVIDERS", ("twilio", "sns"))
+    monkeypatch.setattr(otp, "OTP_HEDGE_AFTER_MS", 50)
+
+    def install(twilio, sns):
+        async def _twilio(e164, text):
+            calls.append("twilio")
+            return await twilio()
+
+        async def _sns(e164, text):
+            calls.append("sns")
+            return await sns()
+
+        monkeypatch.setitem(otp._SENDERS, "twilio", _twilio)
+        monkeypatch.setitem(otp._SENDERS, "sns", _sns)
+        return calls
+
+    return install
+
+
+async def _ok(mid):
+    return mid
+
+
+async def _fail():
+    raise RuntimeError("provider down")
+
+
+async def _slow():
+    await asyncio.sleep(5)
+    return "late"
+
+
+def test_primary_answers(senders):
+    calls = senders(lambda: _ok("SM1"), lambda: _ok("sns-1"))
+    assert asyncio.run(otp.send_sms("+917770000100", "x")) == ("twilio", "SM1")
+    assert calls == ["twilio"]
+
+
+def test_fails_over_on_error(senders):
+    calls = senders(_fail, lambda: _ok("sns-1"))
+    assert asyncio.run(otp.send_sms("+917770000101", "x")) == ("sns", "sns-1")
+    assert calls == ["twilio", "sns"]
+
+
+def test_hedges_when_primary_is_slow(senders):
+    senders(_slow, lambda: _ok("sns-1"))
+    t0 = time.monotonic()
+    assert asyncio.run(otp.send_sms("+917770000102", "x")) == ("sns", "sns-1")
+    assert time.monotonic() - t0 < 1.0  # the slow send was cancelled, not awaited
+
+
+def test_raises_when_every_provider_fails(senders):
+    senders(_fail, _fail)
+    with pytest.raises(RuntimeError):
+        asyncio.run(otp.send_sms("+917770000103", "x"))
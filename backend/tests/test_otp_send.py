@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from fastapi import BackgroundTasks, HTTPException
+
+from app import fakes
+from app.db import clients
+from app.kiosk import identify, otp
+
+
+def _session(phone: str, flow: str = otp.IDENTIFY):
+    return clients.table(otp.DDB_TABLE_OTP).get_item(Key={"phone": phone, "sessionId": flow}).get("Item")
+
+
+@pytest.fixture
+def sms(monkeypatch):
+    """Replaces the provider send; returns the texts "sent", or raises when told to fail."""
+    sent, sms_fail = [], []
+
+    async def _send(phone, text):
+        if sms_fail:
+            raise RuntimeError("provider down")
+        sent.append((phone, text))
+        return "sns", f"mid-{len(sent)}"
+
+    monkeypatch.setattr(otp, "send_sms", _send)
+    return sent, sms_fail
+
+
+def test_session_is_returned_before_the_sms_goes_out(sms):
+    sent, _ = sms
+    (p,) = fakes.seed_patients(1, prefix="+9184000")
+    background = BackgroundTasks()
+    req = identify.SendOTPReq(mobile=p["phone"][3:])
+
+    resp = asyncio.run(identify.send_otp(req, background, None))
+    item = _session(p["phone"])
+    assert item["otpSessionId"] == resp.otpSessionId
+    assert item["delivery"] == "queued"
+    assert sent == []  # nothing sent while the kiosk waits
+
+    asyncio.run(background())
+    assert [ph for ph, _ in sent] == [p["phone"]]
+    item = _session(p["phone"])
+    assert (item["delivery"], item["providerMessageId"]) == ("sent", "mid-1")
+
+
+def test_resend_within_cooldown_is_429():
+    phone = "+917770004001"
+    otp.start_session_sync(phone, otp.WALKIN)
+    with pytest.raises(HTTPException) as e:
+        otp.start_session_sync(phone, otp.WALKIN)
+    assert e.value.status_code == 429
+    assert "seconds" in e.value.detail
+
+
+def test_late_delivery_does_not_touch_a_newer_session(sms):
+    phone = "+917770004002"
+    old, _ = otp.start_session_sync(phone, otp.WALKIN)
+    clients.table(otp.DDB_TABLE_OTP).update_item(  # let the kiosk resend at once
+        Key={"phone": phone, "sessionId": otp.WALKIN},
+        UpdateExpression="SET lastSendAt = :zero",
+        ExpressionAttributeValues={":zero": 0},
+    )
+    new, _ = otp.start_session_sync(phone, otp.WALKIN)
+    asyncio.run(otp.deliver(phone, otp.WALKIN, old, "x"))
+    item = _session(phone, otp.WALKIN)
+    assert item["otpSessionId"] == new
+    assert item["delivery"] == "queued"
+
+
+def test_failed_delivery_clears_cooldown(sms):
+    _, fail = sms
+    fail.append(True)
+    phone = "+917770004003"
+    sid, _ = otp.start_session_sync(phone, otp.WALKIN)
+    asyncio.run(otp.deliver(phone, otp.WALKIN, sid, "x"))
+    item = _session(phone, otp.WALKIN)
+    assert item["delivery"] == "failed"
+    assert "provider down" in item["deliveryError"]
+    assert int(item["lastSendAt"]) == 0
+    otp.start_session_sync(phone, otp.WALKIN)  # no 429
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from app.db import clients
+from app.kiosk import otp
+
+
+def _phone(n: int) -> str:
+    return f"+91777000{n:04d}"
+
+
+def _session(phone: str, flow: str = otp.WALKIN):
+    return clients.table(otp.DDB_TABLE_OTP).get_item(Key={"phone": phone, "sessionId": flow}).get("Item")
+
+
+def test_code_is_stored_only_as_hash():
+    phone = _phone(1)
+    sid, code = otp.start_session_sync(phone, otp.WALKIN)
+    item = _session(phone)
+    assert item["otpSessionId"] == sid
+    assert "code" not in item
+    assert item["codeHash"] == otp.code_hash(otp.WALKIN, phone, code)
+    assert len(code) == otp.OTP_LENGTH and code.isdigit()
+
+
+def test_consume_once():
+    phone = _phone(3)
+    sid, code = otp.start_session_sync(phone, otp.IDENTIFY, user_sub="sub-3")
+    assert otp.consume_sync(phone, otp.IDENTIFY, code, sid)["userSub"] == "sub-3"
+    with pytest.raises(otp.OTPRejected) as e:
+        otp.consume_sync(phone, otp.IDENTIFY, code, sid)
+    assert e.value.reason == otp.NOT_FOUND
+
+
+def test_flows_are_separate():
+    phone = _phone(4)
+    _, code = otp.start_session_sync(phone, otp.WALKIN)
+    with pytest.raises(otp.OTPRejected) as e:
+        otp.consume_sync(phone, otp.IDENTIFY, code)
+    assert e.value.reason == otp.NOT_FOUND
+
+
+def test_wrong_code_counts_attempts_until_locked():
+    phone = _phone(5)
+    sid, code = otp.start_session_sync(phone, otp.WALKIN)
+    wrong = "0" * otp.OTP_LENGTH if code != "0" * otp.OTP_LENGTH else "1" * otp.OTP_LENGTH
+    for i in range(otp.OTP_MAX_ATTEMPTS):
+        with pytest.raises(otp.OTPRejected) as e:
+            otp.consume_sync(phone, otp.WALKIN, wrong, sid)
+        assert e.value.reason == otp.MISMATCH
+        assert int(_session(phone)["attempts"]) == i + 1
+    with pytest.raises(otp.OTPRejected) as e:
+        otp.consume_sync(phone, otp.WALKIN, code, sid)
+    assert e.value.reason == otp.TOO_MANY_ATTEMPTS
+
+
+def test_stale_session_id_is_rejected():
+    phone = _phone(6)
+    _, code = otp.start_session_sync(phone, otp.WALKIN)
+    with pytest.raises(otp.OTPRejected) as e:
+        otp.consume_sync(phone, otp.WALKIN, code, "not-the-session")
+    assert e.value.reason == otp.NOT_FOUND
+
+
+def test_expired_code():
+    phone = _phone(7)
+    sid, code = otp.start_session_sync(phone, otp.WALKIN)
+    clients.table(otp.DDB_TABLE_OTP).update_item(
+        Key={"phone": phone, "sessionId": otp.WALKIN},
+        UpdateExpression="SET #ttl = :past",
+        ExpressionAttributeNames={"#ttl": "ttl"},
+        ExpressionAttributeValues={":past": int(time.time()) - 1},
+    )
+    with pytest.raises(otp.OTPRejected) as e:
+        otp.consume_sync(phone, otp.WALKIN, code, sid)
+    assert e.value.reason == otp.EXPIRED
@@ -0,0 +1,104 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime
+
+import pytest
+
+from app.db import clients
+from app.notifications import outbox
+
+KIND = "test-outbox"
+_behaviour = {}
+
+
+@outbox.handler(KIND)
+def _handler(key: str, when: datetime):
+    assert isinstance(when, datetime)  # args round-trip through the JSON encoding
+    result = _behaviour[key]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def _queue(result) -> str:
+    key = uuid.uuid4().hex
+    _behaviour[key] = result
+    message_id = f"{KIND}#{key}"
+    assert outbox.enqueue(KIND, {"key": key, "when": datetime(2025, 1, 1, 9, 0)}, message_id=message_id)
+    return message_id
+
+
+def _item(message_id: str):
+    return clients.table(outbox.DDB_TABLE_OUTBOX).get_item(Key={"messageId": message_id})["Item"]
+
+
+def _make_due(message_id: str):
+    clients.table(outbox.DDB_TABLE_OUTBOX).update_item(
+        Key={"messageId": message_id},
+        UpdateExpression="SET dueAt = :now",
+        ExpressionAttributeValues={":now": int(time.time())},
+    )
+
+
+def _deliver(message_id: str):
+    return asyncio.run(outbox.deliver(message_id))
+
+
+@pytest.mark.parametrize("result, status", [(True, outbox.SENT), (False, outbox.SKIPPED)])
+def test_delivered_once(result, status):
+    mid = _queue(result)
+    assert _deliver(mid) == status
+    item = _item(mid)
+    assert item["status"] == status
+    assert int(item["attempts"]) == 1
+    assert "dueAt" not in item  # off the StatusDue index
+    assert _deliver(mid) is None  # nothing left to claim
+
+
+def test_duplicate_message_id_is_a_noop():
+    mid = _queue(True)
+    key = mid.split("#", 1)[1]
+    assert outbox.enqueue(KIND, {"key": key, "when": datetime(2025, 1, 1)}, message_id=mid)
+    assert _deliver(mid) == outbox.SENT
+    assert outbox.enqueue(KIND, {"key": key, "when": datetime(2025, 1, 1)}, message_id=mid)
+    assert _item(mid)["status"] == outbox.SENT
+
+
+def test_transient_error_is_retried_later():
+    mid = _queue(RuntimeError("twilio 503"))
+    before = int(time.time())
+    assert _deliver(mid) == outbox.RETRY
+    item = _item(mid)
+    assert item["status"] == outbox.PENDING
+    assert int(item["dueAt"]) >= before + outbox.OUTBOX_BACKOFF_SEC
+    assert "twilio 503" in item["lastError"]
+    assert _deliver(mid) is None  # not due yet
+
+    _behaviour[mid.split("#", 1)[1]] = True
+    _make_due(mid)
+    assert _deliver(mid) == outbox.SENT
+    assert int(_item(mid)["attempts"]) == 2
+
+
+def test_permanent_error_goes_dead_at_once():
+    mid = _queue(outbox.PermanentError("invalid number"))
+    assert _deliver(mid) == outbox.DEAD
+    item = _item(mid)
+    assert item["status"] == outbox.DEAD
+    assert int(item["attempts"]) == 1
+    assert item["lastError"] == "invalid number"
+
+
+def test_dead_after_max_attempts():
+    mid = _queue(RuntimeError("still down"))
+    for _ in range(outbox.OUTBOX_MAX_ATTEMPTS - 1):
+        assert _deliver(mid) == outbox.RETRY
+        _make_due(mid)
+    assert _deliver(mid) == outbox.DEAD
+    assert int(_item(mid)["attempts"]) == outbox.OUTBOX_MAX_ATTEMPTS
+
+
+def test_unknown_kind_is_rejected_at_enqueue():
+    with pytest.raises(KeyError):
+        outbox.enqueue("no-such-kind", {})
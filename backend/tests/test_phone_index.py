@@ -0,0 +1,52 @@
+import asyncio
+
+from app import fakes
+from app.auth import phone_index
+from app.db import clients
+
+
+def _user_sub(user):
+    return next(a["Value"] for a in user["Attributes"] if a["Name"] == "sub")
+
+
+def test_unique_phone_is_found_in_the_index():
+    (p,) = fakes.seed_patients(1, prefix="+9181000")
+    user = phone_index.find_user_sync(p["phone"])
+    assert user["Source"] == "patients"
+    assert _user_sub(user) == p["sub"]
+    assert _user_sub(asyncio.run(phone_index.find_user(p["phone"]))) == p["sub"]
+
+
+def test_shared_phone_defers_to_cognito():
+    (p,) = fakes.seed_patients(1, prefix="+9182000")
+    # a family member registered at the kiosk on the same phone
+    clients.table(phone_index.DDB_TABLE_PATIENTS).put_item(Item={
+        "patientId": "family-member", "firstName": "Kid", "fullName": "Kid",
+        **phone_index.index_attrs(p["phone"], True),
+    })
+    assert phone_index.find_user_sync(p["phone"]) is None
+    assert asyncio.run(phone_index.find_user(p["phone"])) is None
+
+
+def test_unknown_or_empty_phone():
+    assert phone_index.find_user_sync("+918300000000") is None
+    assert phone_index.find_user_sync("") is None
+
+
+def test_unverified_index_hit_falls_back_to_cognito_for_every_caller(monkeypatch):
+    from app.appointments import router as appointments
+    from app.kiosk import identify
+
+    monkeypatch.setattr(phone_index, "KIOSK_REQUIRE_VERIFIED", True)
+    monkeypatch.setattr(identify, "KIOSK_REQUIRE_VERIFIED", True)
+    (p,) = fakes.seed_patients(1, prefix="+9185000", phone_index=False)
+    # a kiosk registration whose phone Cognito hasn't verified yet
+    clients.table(phone_index.DDB_TABLE_PATIENTS).put_item(Item={
+        "patientId": "kiosk-unverified", "firstName": "New", "fullName": "New",
+        **phone_index.index_attrs(p["phone"], False),
+    })
+
+    # the appointment list fills the shared cache first; identify must still see the verified user
+    assert appointments._cognito_identity_from_phone(p["phone"])[0] == p["sub"]
+    user = asyncio.run(identify._find_cognito_user_by_phone(p["phone"]))
+    assert _user_sub(user) == p["sub"]
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import date, timedelta
+
+from app.db import clients
+from app.queue import push
+from app.queue.router import TOKENS_TABLE_NAME, _token_item, engine
+
+ETA = {"etaLow": 0, "etaHigh": 15}
+
+
+def _tok(day, seq, status="waiting"):
+    item = _token_item(f"p{seq}", f"push-{day}-{seq}", day, "A", seq, "d1", "10:00", ETA)
+    item["status"] = status
+    if status not in ("waiting", "called", "roomed"):
+        item.pop("activePK")
+        item.pop("activeSK")
+    return item
+
+
+async def _next(sub):
+    return await sub.next(0.5)
+
+
+def test_lane_subscriber_hears_changes_once():
+    day = "2024-06-01"
+
+    async def run():
+        broker = push.Broker()
+        sub = push._Sub("lane")
+        await broker.subscribe(day, "A", sub)
+        assert (await _next(sub))["now"] == []
+
+        await engine.apply(_tok(day, 1))
+        assert (await _next(sub))["now"] == ["A1"]
+
+        st = engine.get(day, "A")
+        st.upsert(dict(st.token("A1")))  # new version, same view
+        await asyncio.sleep(0)
+        assert await sub.next(0.05) is None  # heartbeat, not a duplicate
+        broker.unsubscribe(day, "A", sub)
+        assert broker.subscriber_count() == 0
+
+    asyncio.run(run())
+
+
+def test_token_subscriber_follows_its_position():
+    day = "2024-06-02"
+
+    async def run():
+        await engine.apply(_tok(day, 1))
+        await engine.apply(_tok(day, 2))
+        broker = push.Broker()
+        sub = push._Sub("token", "A2")
+        await broker.subscribe(day, "A", sub)
+        assert (await _next(sub))["position"] == 1
+
+        await engine.apply(_tok(day, 1, "done"))
+        assert (await _next(sub))["position"] == 0
+        broker.unsubscribe(day, "A", sub)
+
+    asyncio.run(run())
+
+
+def test_final_status_after_another_worker_finishes_the_token():
+    day = "2024-06-03"
+    tbl = clients.table(TOKENS_TABLE_NAME)
+
+    async def run():
+        tbl.put_item(Item=_tok(day, 1))
+        broker = push.Broker()
+        sub = push._Sub("token", "A1")
+        await broker.subscribe(day, "A", sub)
+        assert (await _next(sub))["status"] == "waiting"
+
+        tbl.put_item(Item=_tok(day, 1, "done"))  # finished elsewhere: gone from the active index
+        await engine.refresh(day, "A")
+        assert (await _next(sub))["status"] == "done"
+        assert sub.final
+
+        await engine.refresh(day, "A")  # no second lookup once final
+        await asyncio.sleep(0)
+        assert sub.lookup is None
+        assert await sub.next(0.05) is None
+        broker.unsubscribe(day, "A", sub)
+
+    asyncio.run(run())
+
+
+def test_websocket_sends_the_lane_snapshot(http):
+    day = (date.today() + timedelta(days=1)).isoformat()
+    with http.websocket_connect(f"/api/queue/ws?lane=A&date={day}") as ws:
+        msg = ws.receive_json()
+    assert msg["type"] == "now-next"
+    assert msg["data"]["lane"] == "A"
+
+
+def test_websocket_rejects_unknown_targets(http):
+    from starlette.websockets import WebSocketDisconnect
+
+    for query in ("lane=ZZ", "tokenNo=A999", ""):
+        try:
+            with http.websocket_connect(f"/api/queue/ws?{query}") as ws:
+                ws.receive_json()
+        except WebSocketDisconnect as e:
+            assert e.code in (4400, 4404)
+        else:
+            raise AssertionError(f"{query!r} was accepted")
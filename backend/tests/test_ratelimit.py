@@ -0,0 +1,57 @@
+import asyncio
+
+from app.notifications import ratelimit
+from app.notifications.ratelimit import Bucket, Priority
+
+
+def test_burst_is_free_then_rate_limited():
+    async def run():
+        b = Bucket(rate=50, burst=3, reserve=0)
+        waits = [await b.acquire(Priority.OTP) for _ in range(4)]
+        assert waits[:3] == [0.0, 0.0, 0.0]
+        assert waits[3] > 0.0
+
+    asyncio.run(run())
+
+
+def test_waiters_are_served_by_priority():
+    async def run():
+        b = Bucket(rate=20, burst=1, reserve=0)
+        await b.acquire(Priority.OTP)  # empty the bucket
+        order = []
+
+        async def take(p):
+            await b.acquire(p)
+            order.append(p)
+
+        # queued lowest priority first; OTP still goes before the reminder
+        await asyncio.gather(*(take(p) for p in (Priority.REMINDER, Priority.BOOKING, Priority.OTP)))
+        assert order == [Priority.OTP, Priority.BOOKING, Priority.REMINDER]
+
+    asyncio.run(run())
+
+
+def test_reserve_is_kept_for_otp_and_checkin():
+    async def run():
+        b = Bucket(rate=0.001, burst=10, reserve=0.2)  # effectively no refill
+        for _ in range(8):
+            assert await b.acquire(Priority.REMINDER) == 0.0
+        reminder = asyncio.ensure_future(b.acquire(Priority.REMINDER))
+        await asyncio.sleep(0.01)
+        assert not reminder.done()  # the last 2 tokens are reserved
+        # OTP / check-in jump the queued reminder and get the reserve straight away
+        assert await asyncio.wait_for(b.acquire(Priority.OTP), 0.5) < 0.1
+        assert await asyncio.wait_for(b.acquire(Priority.CHECKIN), 0.5) < 0.1
+        assert not reminder.done()
+        reminder.cancel()
+
+    asyncio.run(run())
+
+
+def test_provider_keys_and_default_priority():
+    assert ratelimit.provider_key("twilio", "+15550001") == "twilio-sms:+15550001"
+    assert ratelimit.provider_key("twilio", "whatsapp:+91999") == "twilio-whatsapp:whatsapp:+91999"
+    assert ratelimit.provider_key("sns") == "sns"
+    with ratelimit.priority(Priority.OTP):
+        assert ratelimit._current.get() is Priority.OTP
+    assert ratelimit._current.get() is Priority.BOOKING
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from datetime import datetime
+
+from app.db import clients
+from app.db.dynamo import DDB_TABLE_APPOINTMENTS
+from app.notifications import reminders
+from app.notifications.reminders import CLINIC_TZ, ReminderScheduler, TimingWheel, reminder_keys
+
+
+# --------------------- timing wheel ---------------------
+
+def test_wheel_fires_in_due_order():
+    w = TimingWheel(now=0, slots=8, levels=2)
+    for key, at in [("c", 30), ("a", 3), ("b", 9), ("far", 500)]:  # 500 > 8**2 ticks: overflow
+        w.add(key, at, key.upper())
+    assert w.advance(2) == []
+    assert w.advance(10) == [("a", "A"), ("b", "B")]
+    assert w.advance(100) == [("c", "C")]
+    assert len(w) == 1
+    assert w.advance(500) == [("far", "FAR")]
+    assert len(w) == 0
+
+
+def test_wheel_moves_and_discards():
+    w = TimingWheel(now=0, slots=8, levels=2)
+    w.add("x", 5, 1)
+    w.add("x", 40, 2)  # moved later: the old bucket entry is stale
+    w.add("y", 6, 3)
+    w.discard("y")
+    assert "y" not in w
+    assert w.advance(20) == []
+    assert w.advance(40) == [("x", 2)]
+
+
+def test_wheel_past_due_fires_on_next_advance():
+    w = TimingWheel(now=100)
+    w.add("late", 10, None)
+    assert w.advance(100) == [("late", None)]
+
+
+def test_wheel_catches_up_after_a_long_stall():
+    w = TimingWheel(now=0, slots=4, levels=2)
+    w.add("a", 3, 1)
+    w.add("b", 1000, 2)
+    assert w.advance(900) == [("a", 1)]  # rebuilt instead of stepping 900 ticks
+    assert w.advance(1000) == [("b", 2)]
+
+
+# --------------------- booking keys ---------------------
+
+def test_reminder_keys():
+    keys = reminder_keys("2025-03-04", "09:30")
+    assert keys["reminderDay"] == "2025-03-04"
+    assert keys["reminderAt"] == int(datetime(2025, 3, 4, 9, 30, tzinfo=CLINIC_TZ).timestamp())
+    assert reminder_keys("2025-03-04", "Walk-in") == {}
+    assert reminder_keys(None, "09:30") == {}
+
+
+# --------------------- scheduler ---------------------
+
+def test_reload_does_not_replace_fired_reminders(monkeypatch):
+    sent = []
+    monkeypatch.setattr(reminders, "_send", lambda appt: sent.append(appt["appointmentId"]) or True)
+
+    now = time.time()
+    at = datetime.fromtimestamp(now + reminders.REMINDER_LEAD_MIN * 60 + 60, CLINIC_TZ)
+    appt = {
+        "patientId": "rem-p1",
+        "appointmentId": "rem-a1",
+        "status": "BOOKED",
+        "contact": {"phone": "+917770009999", "name": "R"},
+        **reminder_keys(at.date().isoformat(), at.strftime("%H:%M")),
+    }
+    clients.table(DDB_TABLE_APPOINTMENTS).put_item(Item=appt)
+
+    async def run():
+        s = ReminderScheduler()
+        s.wheel = TimingWheel(now)
+        assert await s.load(now) >= 1
+        assert "rem-a1" in s.wheel
+        due = [p for _, p in s.wheel.advance(int(appt["reminderAt"]) - reminders.REMINDER_LEAD_MIN * 60)]
+        counts = await s.fire([p for p in due if p["appointmentId"] == "rem-a1"])
+        assert counts == {"queued": 1}
+        # still inside the grace window: a reload must not queue it again
+        await s.load(now)
+        assert "rem-a1" not in s.wheel
+
+    asyncio.run(run())
+    assert sent == ["rem-a1"]
@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+
+from app import fakes
+from app.db import clients
+from app.queue import router
+from app.queue.router import TOKENS_TABLE_NAME, _token_item, engine
+from loadtest.budgets import _by_service
+
+ETA = {"etaLow": 0, "etaHigh": 15}
+
+
+def _day(back: int) -> str:
+    return (date.today() - timedelta(days=back)).isoformat()
+
+
+def _put(item):
+    clients.table(TOKENS_TABLE_NAME).put_item(Item=item)
+    return item
+
+
+def _status(http, **params):
+    before = fakes.stats()
+    r = http.get("/api/queue/status", params=params)
+    return r, _by_service(before, fakes.stats()).get("dynamodb", 0)
+
+
+def test_token_from_another_worker_is_one_get_item(http):
+    day = _day(3)
+    http.portal.call(engine.lane, day, "A")  # warm, before the other worker's write
+    _put(_token_item("st-p1", "st-a1", day, "A", 701, "d1", "10:00", ETA))
+
+    r, calls = _status(http, tokenKey=f"{day}#A701")
+    assert r.status_code == 200
+    assert (r.json()["tokenNo"], r.json()["status"]) == ("A701", "waiting")
+    assert calls == 1
+
+    r, calls = _status(http, tokenKey=f"{day}#A701")  # now in the lane state
+    assert r.status_code == 200
+    assert calls == 0
+
+
+def test_finished_token_reads_do_not_bump_the_lane_version(http):
+    day = _day(3)
+    item = _token_item("st-p2", "st-a2", day, "A", 702, "d1", "10:00", ETA)
+    item["status"] = "done"
+    item.pop("activePK")
+    item.pop("activeSK")
+    _put(item)
+    version = http.portal.call(engine.lane, day, "A").version
+
+    r, _ = _status(http, tokenNo="A702", date=day)
+    assert r.json()["status"] == "done"
+    assert engine.get(day, "A").version == version
+
+
+def test_legacy_token_falls_back_to_gsi3_for_that_day_only(http):
+    day, other = _day(4), _day(6)
+    legacy = {
+        "tokenId": "0f7d2c8e-legacy", "tokenNo": "A703", "date": day, "lane": "A", "seq": 703,
+        "status": "waiting", "patientId": "st-p3", "appointmentId": "st-a3",
+        "GSI3PK": "A703", "GSI3SK": f"{day}T04:30:00Z",
+    }
+    _put(legacy)
+    http.portal.call(engine.lane, day, "A")
+
+    r, calls = _status(http, tokenNo="A703", date=day)
+    assert r.status_code == 200
+    assert r.json()["tokenKey"] is None  # not a day-scoped id
+    assert calls == 2  # get_item miss + one bounded GSI3 query
+
+    r, _ = _status(http, tokenNo="A703", date=other)
+    assert r.status_code == 404
+
+
+def test_unknown_token_misses_are_cached(http, monkeypatch):
+    day = _day(5)
+    http.portal.call(engine.lane, day, "A")
+    r, calls = _status(http, tokenNo="A799", date=day)
+    assert r.status_code == 404
+    assert calls == 2
+
+    r, calls = _status(http, tokenNo="A799", date=day)
+    assert r.status_code == 404
+    assert calls == 0
+
+    monkeypatch.setitem(router._missing, (day, "A799"), 0.0)  # expired
+    _put(_token_item("st-p4", "st-a4", day, "A", 799, "d1", "10:00", ETA))
+    r, calls = _status(http, tokenNo="A799", date=day)
+    assert r.status_code == 200
+    assert calls == 1
+
+
+def test_batch_reports_bad_and_unknown_refs(http):
+    day = _day(5)
+    _put(_token_item("st-p5", "st-a5", day, "A", 705, "d1", "10:00", ETA))
+    r = http.post("/api/queue/status/batch", json={"tokens": [
+        f"{day}#A705", f"{day}#A798", "2001-01-01#A1", "A705",
+    ]})
+    body = r.json()
+    assert [i["tokenNo"] for i in body["items"]] == ["A705"]
+    assert body["notFound"] == [f"{day}#A798", "2001-01-01#A1", "A705"]  # "A705" is today's A705
+
+
+def test_bad_refs_are_400(http):
+    assert http.get("/api/queue/status", params={"tokenKey": "2001-01-01#A1"}).status_code == 400
+    assert http.get("/api/queue/status", params={"tokenNo": "A1", "date": "31-01-2025"}).status_code == 400
+    assert http.get("/api/queue/status").status_code == 400
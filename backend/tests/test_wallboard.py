@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+from app.queue import router
+from app.queue.router import _token_item, engine
+
+ETA = {"etaLow": 0, "etaHigh": 15}
+
+
+def _board(http, day, etag=None):
+    headers = {"If-None-Match": etag} if etag else {}
+    return http.get("/api/wallboard/now-next", params={"date": day, "lane": "A"}, headers=headers)
+
+
+def test_etag_and_304_until_the_lane_changes(http):
+    day = (date.today() - timedelta(days=6)).isoformat()
+    first = _board(http, day)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = _board(http, day, etag)
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert _board(http, day, f'"other", {etag}').status_code == 304
+
+    item = _token_item("wb-p1", "wb-a1", day, "A", 1, "d1", "10:00", ETA)
+    http.portal.call(engine.apply, item)
+    changed = _board(http, day, etag)
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["items"][0]["now"] == ["A1"]
+
+
+def test_body_is_reused_while_versions_match(http):
+    day = (date.today() - timedelta(days=7)).isoformat()
+    body = _board(http, day).content
+    key = (day, ("A",))
+    cached = router._wallboard_cache[key]
+    assert cached[1] == body
+    _board(http, day)
+    assert router._wallboard_cache[key] is cached  # not rebuilt
+
+
+def test_tomorrows_board_keeps_todays_cache(http):
+    today = date.today().isoformat()
+    tomorrow = (date.today() + timedelta(days=1)).isoformat()
+    _board(http, today)
+    cached = router._wallboard_cache[(today, ("A",))]
+    _board(http, tomorrow)
+    assert router._wallboard_cache.get((today, ("A",))) is cached
+
+    router._wallboard_cache[("2000-01-01", ("A",))] = cached
+    http.portal.call(engine.apply, _token_item("wb-p2", "wb-a2", tomorrow, "A", 1, "d1", "10:00", ETA))
+    _board(http, tomorrow)  # rebuilt: entries of past days go
+    assert ("2000-01-01", ("A",)) not in router._wallboard_cache
+    assert router._wallboard_cache.get((today, ("A",))) is cached